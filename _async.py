@@ -0,0 +1,66 @@
+import asyncio
+
+import ccxt.async_support as ccxt_async
+from _checks import check_isinstance_exchange, check_isinstance_list
+
+
+def to_async_exchange(exchange, config=None):
+    """
+    Returns the asyncio counterpart (ccxt.async_support) of an exchange.
+    Already loaded markets are shared, so no additional request is needed.
+
+    :param exchange: an exchange (as Exchange)
+    :param config: additional ccxt config (as dict)
+    :return: an async exchange
+    """
+    check_isinstance_exchange(exchange)
+
+    params = {'enableRateLimit': True}
+    params.update(config or {})
+    async_exchange = getattr(ccxt_async, exchange.id)(params)
+
+    if exchange.markets:
+        async_exchange.set_markets(exchange.markets, exchange.currencies)
+    return async_exchange
+
+
+def to_async_exchanges(exchanges, config=None):
+    """Returns the asyncio counterparts of a list of exchanges."""
+    check_isinstance_list(exchanges)
+    return [to_async_exchange(exchange, config) for exchange in exchanges]
+
+
+async def close_async_exchanges(exchanges):
+    """Closes the http sessions of the given async exchanges."""
+    await asyncio.gather(*[exchange.close() for exchange in exchanges],
+                         return_exceptions=True)
+
+
+def exchange_semaphores(exchanges, concurrency):
+    """
+    Returns a semaphore per exchange-id which limits the number of
+    requests that are in flight at the same time. The request spacing
+    itself is done by ccxt's rate limiter (enableRateLimit).
+    """
+    return {exchange.id: asyncio.Semaphore(concurrency)
+            for exchange in exchanges}
+
+
+async def gather_reporting(jobs):
+    """
+    Runs a dictionary of label: coroutine concurrently. Failing jobs are
+    reported and left out of the result instead of cancelling the others.
+
+    :param jobs: dictionary of label: coroutine
+    :return: dictionary of label: result
+    """
+    labels = list(jobs)
+    results = await asyncio.gather(*jobs.values(), return_exceptions=True)
+
+    out = {}
+    for label, result in zip(labels, results):
+        if isinstance(result, BaseException):
+            print("Failed {}: {!r}".format(label, result))
+        else:
+            out[label] = result
+    return out
@@ -2,21 +2,153 @@ import ccxt
 from ccxt.base.exchange import Exchange
 from _checks import *
 from exchange import *
+from export import market_field
 from ohlcv import *
 
-from pprint import pprint
+import html
+import json
 
 
-def pretty_exchanges():
+PAGE_SIZE = 50
+MAX_CELL_WIDTH = 24
+
+MARKET_COLUMNS = ('symbol', 'base', 'quote', 'type', 'active', 'taker',
+                  'maker', 'precision.amount', 'precision.price')
+
+
+# --------- [ Lazy Table ] ---------
+def _cell(value, width=MAX_CELL_WIDTH):
+    """Formats a single value, shortened to 'width' characters."""
+    if value is None:
+        text = ''
+    elif isinstance(value, float):
+        text = '{:g}'.format(value)
+    elif isinstance(value, (dict, list, tuple)):
+        text = json.dumps(value, default=str, separators=(',', ':'))
+    else:
+        text = str(value)
+    return text if len(text) <= width else text[:width - 1] + '…'
+
+
+class LazyTable:
+    """
+    A table over a sequence of rows that only formats the page that is
+    shown: rows are kept as they are (e.g. market dicts) and a column value
+    is read with getter(row, column) when its page is rendered. Column
+    widths are fitted per page. Prints as text in a terminal and as HTML
+    in a notebook.
+    """
+
+    def __init__(self, rows, columns, getter=market_field,
+                 page_size=PAGE_SIZE, max_width=MAX_CELL_WIDTH):
+        """
+        :param rows: a sequence of rows (supports len() and slicing)
+        :param columns: a list of column names
+        :param getter: function (row, column) returning a value
+        :param page_size: rows per page
+        :param max_width: maximal characters per cell
+        """
+        self.rows = rows
+        self.columns = list(columns)
+        self.getter = getter
+        self.page_size = page_size
+        self.max_width = max_width
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self.rows) // self.page_size))
+
+    def _cells(self, page):
+        start = page * self.page_size
+        return [[_cell(self.getter(row, column), self.max_width)
+                 for column in self.columns]
+                for row in self.rows[start:start + self.page_size]]
+
+    def page(self, page=0):
+        """Returns a page as text."""
+        cells = self._cells(page)
+        widths = [max([len(c)] + [len(row[i]) for row in cells])
+                  for i, c in enumerate(self.columns)]
+        lines = ['  '.join(c.ljust(w) for c, w in zip(self.columns, widths)),
+                 '  '.join('-' * w for w in widths)]
+        for row in cells:
+            lines.append('  '.join(v.ljust(w) for v, w in zip(row, widths))
+                         .rstrip())
+        lines.append('[page {}/{}, {} rows]'.format(page + 1, self.pages,
+                                                     len(self.rows)))
+        return '\n'.join(lines)
+
+    def show(self, page=0):
+        """Prints a page."""
+        print(self.page(page))
+
+    def __iter__(self):
+        """Yields all pages as text, one at a time."""
+        for page in range(self.pages):
+            yield self.page(page)
+
+    def __repr__(self):
+        return self.page(0)
+
+    def _repr_html_(self, page=0):
+        header = ''.join('<th>{}</th>'.format(html.escape(c))
+                         for c in self.columns)
+        body = ''.join('<tr>{}</tr>'.format(''.join(
+            '<td>{}</td>'.format(html.escape(v)) for v in row))
+            for row in self._cells(page))
+        return '<table><tr>{}</tr>{}</table><p>page {}/{}, {} rows</p>'.format(
+            header, body, page + 1, self.pages, len(self.rows))
+
+
+def _flatten(value, prefix=''):
+    """Flattens nested dicts into (dotted key, value) pairs."""
+    if isinstance(value, dict) and value:
+        items = []
+        for key, nested in value.items():
+            items += _flatten(nested, '{}{}.'.format(prefix, key))
+        return items
+    return [(prefix[:-1], value)]
+
+
+def market_table(exchange, markets=None, columns=MARKET_COLUMNS,
+                 page_size=PAGE_SIZE):
+    """
+    Returns a LazyTable of the markets of an exchange.
+
+    :param exchange: an exchange (as Exchange), markets loaded
+    :param markets: a list of trading-pairs (default: all, sorted)
+    :param columns: the market fields to show (dotted for nested fields)
+    :return: a LazyTable
+    """
+    check_isinstance_exchange(exchange)
+
+    if markets is None:
+        markets = sorted(exchange.markets)
+    rows = [exchange.markets[market] for market in markets]
+    return LazyTable(rows, columns, page_size=page_size)
+
+
+# --------- [ Printing ] ---------
+def pretty_exchanges(page=0, page_size=PAGE_SIZE):
     ex = get_all_exchange_ids()
-    pprint(ex)
+    LazyTable(ex, ['exchange'], lambda row, _: row, page_size).show(page)
     print("\nNumber of exchanges available: {}".format(len(ex)))
 
 
-def pretty_exchange(exchange):
-    """PPrints all exchange methods/properties."""
+def pretty_exchange(exchange, page=0, page_size=PAGE_SIZE):
+    """Prints a page of the exchange methods/properties."""
     check_isinstance_exchange(exchange)
-    pprint(dir(exchange))
+
+    def getter(name, column):
+        if column == 'name':
+            return name
+        value = getattr(exchange, name, None)
+        return 'method' if callable(value) else type(value).__name__
+
+    LazyTable(dir(exchange), ['name', 'kind'], getter, page_size).show(page)
 
 
 def search_exchange_properties(exchange, keyword):
@@ -28,18 +160,25 @@ def search_exchange_properties(exchange, keyword):
 
 
 def pretty_market(exchange, market):
-    """PPrints all properties of a specific trading pair."""
+    """Prints all properties of a specific trading pair as a table."""
     check_isinstance_exchange(exchange)
     check_isinstance_string(market)
 
-    pprint(exchange.market(market))
+    fields = _flatten(exchange.market(market))
+    LazyTable(fields, ['field', 'value'],
+              lambda row, column: row[0] if column == 'field' else row[1],
+              page_size=len(fields) or 1, max_width=60).show()
 
 
-def pretty_markets(exchange, markets):
-    """Pprints all properties of the specified trading pairs."""
+def pretty_markets(exchange, markets=None, columns=MARKET_COLUMNS, page=0,
+                   page_size=PAGE_SIZE):
+    """
+    Prints a page of a table of the specified trading pairs (default:
+    all). Only the shown page is formatted; use market_table to keep the
+    table and show other pages (table.show(page)).
+    """
     check_isinstance_exchange(exchange)
-    check_isinstance_list(markets)
+    if markets is not None:
+        check_isinstance_list(markets)
 
-    for market in markets:
-        pprint(exchange.markets[market])
-        print("\n----------------------------\n")
+    market_table(exchange, markets, columns, page_size).show(page)
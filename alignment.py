@@ -0,0 +1,153 @@
+from _checks import check_isinstance_list
+
+import numpy as np
+
+
+# --------- [ As-Of Lookup ] ---------
+def asof_indices(grid, timestamps, limit=None):
+    """
+    Returns, for every grid timestamp, the position of the latest
+    timestamp at or before it (one searchsorted for the whole grid).
+
+    :param grid: sorted array of timestamps to align to
+    :param timestamps: sorted array of timestamps of a series
+    :param limit: maximal age (in ms) of a value that is carried forward
+                  (None: no limit)
+    :return: array of positions, -1 where there is no value
+    """
+    grid = np.asarray(grid, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    positions = np.searchsorted(timestamps, grid, side='right') - 1
+    if limit is not None and len(timestamps):
+        age = grid - timestamps[np.maximum(positions, 0)]
+        positions[age > limit] = -1
+    return positions
+
+
+def _asof_column(grid, timestamps, values, limit):
+    positions = asof_indices(grid, timestamps, limit)
+    column = np.full(len(grid), np.nan)
+    found = positions >= 0
+    column[found] = values[positions[found]]
+    return column
+
+
+def align_series(series, grid=None, limit=None):
+    """
+    Aligns N series to a common time grid with an as-of lookup: every
+    grid row holds the latest value of each series at or before its
+    timestamp.
+
+    :param series: a list of (timestamps, values), both sorted by time
+    :param grid: timestamps to align to (default: union of all timestamps)
+    :param limit: maximal age (in ms) of a forward-filled value
+    :return: (grid, array of values (time x series), NaN where missing)
+    """
+    check_isinstance_list(series)
+
+    series = [(np.asarray(t, dtype=np.int64), np.asarray(v, dtype=np.float64))
+              for t, v in series]
+    if grid is None:
+        grid = np.unique(np.concatenate([t for t, _ in series])) \
+            if series else np.empty(0, dtype=np.int64)
+    grid = np.asarray(grid, dtype=np.int64)
+
+    aligned = np.empty((len(grid), len(series)))
+    for column, (timestamps, values) in enumerate(series):
+        aligned[:, column] = _asof_column(grid, timestamps, values, limit)
+    return grid, aligned
+
+
+# --------- [ Stored Series ] ---------
+def iter_aligned(store, keys, field='close', start=None, end=None, step=None,
+                 limit=None, window=None):
+    """
+    Aligns stored series window by window, so only one window of every
+    series is read (as memory-mapped views) at a time. The last value of
+    every series is carried into the next window, so forward filling
+    works across window borders.
+
+    :param store: a SeriesStore (e.g. OHLCVStore or TradeStore)
+    :param keys: a list of series keys, e.g.
+                 [('binance', 'BTC/USDT', '1m'), ('kraken', 'BTC/USDT', '1m')]
+    :param field: the record field to align (e.g. 'close' or 'price')
+    :param start: start of the time range in ms (default: first record)
+    :param end: end of the time range in ms (default: last record)
+    :param step: grid spacing in ms (None: union of the timestamps)
+    :param limit: maximal age (in ms) of a forward-filled value
+    :param window: time span in ms per yielded block (rounded down to
+                   whole steps, at least one step)
+    :return: generator of (grid, array of values (time x series))
+    """
+    check_isinstance_list(keys)
+
+    series = [store.series(*key) if store.has_series(*key) else None
+              for key in keys]
+    stored = [s for s in series if s is not None and len(s)]
+    if not stored:
+        return
+    if start is None:
+        start = min(s.first_timestamp for s in stored)
+    if end is None:
+        end = max(s.last_timestamp for s in stored)
+    if window is None:
+        window = step * (1 << 16) if step else 24 * 60 * 60 * 1000
+    elif window <= 0:
+        raise ValueError("window must be positive, got {}".format(window))
+    if step:
+        # whole steps per window, at least one
+        window = max(step, window - window % step)
+
+    # latest value before the current window, per series
+    carry = [None] * len(series)
+    for column, s in enumerate(series):
+        if s is not None:
+            lo, _ = s.locate(start, None)
+            if lo > 0:
+                record = s._record(lo - 1)
+                carry[column] = (np.array([record['timestamp']]),
+                                 np.array([record[field]], dtype=np.float64))
+
+    w = start
+    while w <= end:
+        w_end = min(w + window - 1, end)
+        parts = []
+        for column, s in enumerate(series):
+            records = s.read(w, w_end) if s is not None else None
+            timestamps = records['timestamp'] if records is not None \
+                else np.empty(0, dtype=np.int64)
+            values = records[field] if records is not None \
+                else np.empty(0)
+            if carry[column] is not None:
+                timestamps = np.concatenate((carry[column][0], timestamps))
+                values = np.concatenate((carry[column][1], values))
+            if records is not None and len(records):
+                carry[column] = (records['timestamp'][-1:].copy(),
+                                 records[field][-1:].copy())
+            parts.append((timestamps, values))
+
+        if step:
+            grid = np.arange(w, w_end + 1, step, dtype=np.int64)
+        else:
+            inside = [t[t >= w] for t, _ in parts]
+            grid = np.unique(np.concatenate(inside))
+        if len(grid):
+            yield align_series(parts, grid, limit)
+        w = w_end + 1
+
+
+def align_stored(store, keys, field='close', start=None, end=None, step=None,
+                 limit=None):
+    """
+    Aligns stored series over a whole time range (see iter_aligned).
+
+    :return: (grid, array of values (time x series))
+    """
+    grids, blocks = [], []
+    for grid, block in iter_aligned(store, keys, field, start, end, step,
+                                    limit):
+        grids.append(grid)
+        blocks.append(block)
+    if not grids:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(keys)))
+    return np.concatenate(grids), np.concatenate(blocks)
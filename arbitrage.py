@@ -0,0 +1,144 @@
+from _checks import check_isinstance_list, check_isinstance_string
+from trading_fees import get_taker_fee_from_exchanges
+
+import numpy as np
+
+
+# --------- [ Fees ] ---------
+def taker_fee_vector(exchanges, board, default=0.0):
+    """
+    Returns the taker fee of every exchange row of a QuoteBoard.
+    Exchanges without a known taker fee get the default.
+
+    :param exchanges: a list of exchanges (as Exchange)
+    :param board: a QuoteBoard
+    :param default: fee for unknown exchanges (e.g. 0.002)
+    :return: array of fees (one per board row)
+    """
+    check_isinstance_list(exchanges)
+
+    fees = get_taker_fee_from_exchanges(exchanges)
+    vector = np.full(len(board.exchange_ids), float(default))
+    for exchange_id, fee in fees.items():
+        if fee is not None and exchange_id in board.exchange_index:
+            vector[board.exchange_index[exchange_id]] = fee
+    return vector
+
+
+# --------- [ Spreads ] ---------
+def _net_quotes(board, fees=None):
+    """
+    Returns what selling gives / buying costs per unit after the taker
+    fee (E x S); missing quotes are -inf / inf.
+    """
+    if fees is None:
+        fees = np.zeros(len(board.exchange_ids))
+    fees = np.asarray(fees, dtype=np.float64)[:, None]
+    net_bid = np.where(np.isnan(board.bid), -np.inf, board.bid * (1 - fees))
+    net_ask = np.where(np.isnan(board.ask), np.inf, board.ask * (1 + fees))
+    return net_bid, net_ask
+
+
+def best_quotes(board, fees=None):
+    """
+    Reduces the board to the best fee-adjusted bid and ask of every
+    symbol over all exchanges.
+
+    :param board: a QuoteBoard
+    :param fees: taker fee per exchange row (None: no fees)
+    :return: arrays (sell exchange idx, net bid, buy exchange idx, net ask),
+             one value per symbol; symbols without quotes are NaN
+    """
+    net_bid, net_ask = _net_quotes(board, fees)
+    sell = np.argmax(net_bid, axis=0)
+    buy = np.argmin(net_ask, axis=0)
+    cols = np.arange(net_bid.shape[1])
+    best_bid = net_bid[sell, cols]
+    best_ask = net_ask[buy, cols]
+
+    best_bid[~np.isfinite(best_bid)] = np.nan
+    best_ask[~np.isfinite(best_ask)] = np.nan
+    return sell, best_bid, buy, best_ask
+
+
+def net_spreads(board, fees=None):
+    """
+    Returns the relative fee-adjusted spread between the best bid and the
+    best ask over all exchanges for every symbol. Positive values mean
+    buying at one exchange and selling at another is profitable.
+    """
+    _, best_bid, _, best_ask = best_quotes(board, fees)
+    return (best_bid - best_ask) / best_ask
+
+
+def spread_matrix(board, symbol, fees=None):
+    """
+    Returns the fee-adjusted spread of every (sell exchange, buy exchange)
+    combination of a symbol as an E x E matrix.
+
+    :param board: a QuoteBoard
+    :param symbol: a trading-pair (as str)
+    :param fees: taker fee per exchange row (None: no fees)
+    :return: matrix[sell, buy]
+    """
+    check_isinstance_string(symbol)
+
+    if fees is None:
+        fees = np.zeros(len(board.exchange_ids))
+    col = board.symbol_index[symbol]
+    net_bid = board.bid[:, col] * (1 - fees)
+    net_ask = board.ask[:, col] * (1 + fees)
+    return (net_bid[:, None] - net_ask[None, :]) / net_ask[None, :]
+
+
+def scan_arbitrage(board, fees=None, threshold=0.0):
+    """
+    Finds all symbols whose fee-adjusted spread exceeds the threshold.
+
+    :param board: a QuoteBoard
+    :param fees: taker fee per exchange row (None: no fees)
+    :param threshold: minimal relative profit (e.g. 0.001 for 0.1%)
+    :return: a list of opportunities (as dict), best first
+    """
+    sell, best_bid, buy, best_ask = best_quotes(board, fees)
+
+    # where the best bid and ask are at the same exchange, trade against
+    # the better of the best bid elsewhere and the best ask elsewhere
+    same = np.flatnonzero(sell == buy)
+    if len(same):
+        net_bid, net_ask = _net_quotes(board, fees)
+        net_bid, net_ask = net_bid[:, same], net_ask[:, same]
+        rows = np.arange(len(same))
+        net_bid[sell[same], rows] = -np.inf
+        net_ask[buy[same], rows] = np.inf
+        other_sell = np.argmax(net_bid, axis=0)
+        other_buy = np.argmin(net_ask, axis=0)
+        other_bid = net_bid[other_sell, rows]
+        other_ask = net_ask[other_buy, rows]
+        with np.errstate(invalid='ignore'):
+            by_bid = (other_bid - best_ask[same]) / best_ask[same]
+            by_ask = (best_bid[same] - other_ask) / other_ask
+        use_bid = ~(by_ask > by_bid)
+        sell[same] = np.where(use_bid, other_sell, sell[same])
+        buy[same] = np.where(use_bid, buy[same], other_buy)
+        best_bid[same] = np.where(use_bid, other_bid, best_bid[same])
+        best_ask[same] = np.where(use_bid, best_ask[same], other_ask)
+        best_bid[~np.isfinite(best_bid)] = np.nan
+        best_ask[~np.isfinite(best_ask)] = np.nan
+
+    with np.errstate(invalid='ignore'):
+        spread = (best_bid - best_ask) / best_ask
+        hits = np.flatnonzero(spread > threshold)
+    hits = hits[np.argsort(-spread[hits])]
+
+    opportunities = []
+    for col in hits:
+        opportunities.append({
+            'symbol': board.symbols[col],
+            'buy': board.exchange_ids[buy[col]],
+            'ask': float(board.ask[buy[col], col]),
+            'sell': board.exchange_ids[sell[col]],
+            'bid': float(board.bid[sell[col], col]),
+            'spread': float(spread[col]),
+        })
+    return opportunities
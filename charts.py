@@ -0,0 +1,276 @@
+from _checks import check_isinstance_string
+from storage import OHLCV_DTYPE
+
+import time
+
+from matplotlib import dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+
+
+PYRAMID_BASE = 8   # records per bucket of the next level
+
+
+# --------- [ Downsampling ] ---------
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: selects 'threshold' points of a line
+    that keep its visual shape. The first and the last point are kept,
+    from every bucket in between the point that spans the largest
+    triangle with the previously selected point and the mean of the
+    next bucket.
+
+    :param x: array of x values (e.g. timestamps), sorted
+    :param y: array of y values
+    :param threshold: number of points to keep
+    :return: array of the positions of the selected points
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[hi:edges[i + 2]].mean()
+            next_y = y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) -
+                      (x[a] - x[lo:hi]) * (next_y - y[a]))
+        if hi > lo and not np.isnan(area).all():
+            a = lo + int(np.nanargmax(area))
+        else:
+            a = lo   # empty or all-NaN bucket: its first point
+        selected[i + 1] = a
+    return selected
+
+
+def aggregate_records(records, starts):
+    """
+    Merges OHLCV records into buckets that begin at the given positions
+    (first open, highest high, lowest low, last close, summed volume).
+    """
+    ends = np.append(starts[1:], len(records)) - 1
+    merged = np.empty(len(starts), dtype=OHLCV_DTYPE)
+    merged['timestamp'] = records['timestamp'][starts]
+    merged['open'] = records['open'][starts]
+    merged['high'] = np.fmax.reduceat(records['high'], starts)
+    merged['low'] = np.fmin.reduceat(records['low'], starts)
+    merged['close'] = records['close'][ends]
+    merged['volume'] = np.add.reduceat(np.nan_to_num(records['volume']),
+                                       starts)
+    return merged
+
+
+def _as_ohlcv(records, field):
+    """Returns OHLCV records of a series (price series become flat candles)."""
+    if records.dtype == OHLCV_DTYPE:
+        return records
+    converted = np.empty(len(records), dtype=OHLCV_DTYPE)
+    converted['timestamp'] = records['timestamp']
+    for name in ('open', 'high', 'low', 'close'):
+        converted[name] = records[field]
+    converted['volume'] = records['amount'] if 'amount' in records.dtype.names \
+        else np.nan
+    return converted
+
+
+# --------- [ Level Pyramid ] ---------
+class SeriesPyramid:
+    """
+    Downsampled levels of a stored series for zooming: level k merges
+    PYRAMID_BASE ** k records into one candle (by position). A view picks
+    the coarsest level with enough buckets in the requested range and
+    reads only that slice; level 0 is the memory-mapped series itself.
+    Levels are extended incrementally when the series grows.
+    """
+
+    def __init__(self, series, field='close', base=PYRAMID_BASE,
+                 min_points=512):
+        """
+        :param series: a storage.ChunkedSeries (candles, trades, ...)
+        :param field: the price field of series without OHLC fields
+        :param base: records per bucket of the next level
+        :param min_points: the coarsest level keeps at least this many
+        """
+        self.series = series
+        self.field = field
+        self.base = base
+        self.min_points = min_points
+        self.levels = []
+        self._built = 0
+
+    def update(self):
+        """Extends the levels by the records appended since the last call."""
+        n = len(self.series)
+        if n == self._built:
+            return
+        depth = 0
+        while n // self.base ** (depth + 1) >= self.min_points:
+            depth += 1
+
+        # a new level is built from scratch, the others are extended
+        built = self._built if depth == len(self.levels) else 0
+        factor = self.base ** depth
+        # records from the start of the last (possibly open) coarsest bucket
+        first = (built // factor) * factor
+        if depth:
+            raw = _as_ohlcv(self.series.tail(n - first), self.field)
+        levels = []
+        for k in range(1, depth + 1):
+            f = self.base ** k
+            keep = built // f
+            starts = np.arange(keep * f - first, len(raw), f)
+            levels.append(np.concatenate((self.levels[k - 1][:keep] if keep
+                                          else raw[:0],
+                                          aggregate_records(raw, starts))))
+        self.levels = levels
+        self._built = n
+
+    def view(self, start=None, end=None, points=1000):
+        """
+        Returns at most 'points' candles covering [start, end].
+
+        :param start: start of the range in ms (None: first record)
+        :param end: end of the range in ms (None: last record)
+        :param points: number of buckets (e.g. the pixel width)
+        :return: OHLCV records
+        """
+        self.update()
+        records = None
+        for level in reversed(self.levels):
+            stamps = level['timestamp']
+            lo = 0 if start is None else \
+                max(0, int(np.searchsorted(stamps, start, side='right')) - 1)
+            hi = len(level) if end is None else \
+                int(np.searchsorted(stamps, end, side='right'))
+            if hi - lo >= points:
+                records = level[lo:hi]
+                break
+        if records is None:
+            records = _as_ohlcv(self.series.read(start, end), self.field)
+        if len(records) > points:
+            starts = np.unique(np.linspace(0, len(records), points + 1)
+                               .astype(np.intp)[:-1])
+            records = aggregate_records(records, starts)
+        return records
+
+
+# --------- [ Rendering ] ---------
+def _draw_candles(axes, candles):
+    x = mdates.date2num(candles['timestamp'].astype('datetime64[ms]'))
+    width = np.median(np.diff(x)) * 0.7 if len(x) > 1 else 1 / 1440
+    rising = candles['close'] >= candles['open']
+    colors = np.where(rising, 'tab:green', 'tab:red')
+    axes.vlines(x, candles['low'], candles['high'], colors=colors,
+                linewidth=0.6)
+    body = np.abs(candles['close'] - candles['open'])
+    axes.bar(x, np.where(body > 0, body, np.nan),
+             bottom=np.minimum(candles['open'], candles['close']),
+             width=width, color=colors, linewidth=0)
+
+
+def _draw_line(axes, candles, method, points):
+    x = mdates.date2num(candles['timestamp'].astype('datetime64[ms]'))
+    if method == 'lttb':
+        keep = lttb(x, candles['close'], points)
+        axes.plot(x[keep], candles['close'][keep], linewidth=0.8)
+    else:
+        # min/max envelope of the buckets and their closes
+        axes.fill_between(x, candles['low'], candles['high'], alpha=0.3,
+                          linewidth=0, step='post')
+        axes.plot(x, candles['close'], linewidth=0.8, drawstyle='steps-post')
+
+
+class ChartRenderer:
+    """
+    Renders candlestick and line charts of stored series without a
+    display. One SeriesPyramid is cached per series, so consecutive
+    charts of the same series (zooming, periodic refresh) only read the
+    requested slice of the matching level.
+    """
+
+    def __init__(self, store, size=(12, 5), dpi=100):
+        """
+        :param store: a SeriesStore (e.g. OHLCVStore or TradeStore)
+        :param size: figure size in inches
+        :param dpi: resolution of the images
+        """
+        self.store = store
+        self.size = size
+        self.dpi = dpi
+        self._pyramids = {}
+
+    def pyramid(self, *key, field='close'):
+        pyramid = self._pyramids.get((key, field))
+        if pyramid is None:
+            pyramid = SeriesPyramid(self.store.series(*key), field)
+            self._pyramids[(key, field)] = pyramid
+        return pyramid
+
+    def render(self, key, path, start=None, end=None, kind='candles',
+               method='minmax', field='close', title=None):
+        """
+        Renders a chart of a series to a PNG or SVG file.
+
+        :param key: the series key, e.g. ('binance', 'BTC/USDT', '1m')
+        :param path: the output file (.png or .svg)
+        :param start: start of the range in ms (None: first record)
+        :param end: end of the range in ms (None: last record)
+        :param kind: 'candles' or 'line'
+        :param method: downsampling of line charts ('minmax' or 'lttb')
+        :param field: the price field of series without OHLC fields
+        :param title: the title (default: the key)
+        :return: path
+        """
+        check_isinstance_string(path)
+        check_isinstance_string(kind)
+
+        if not self.store.has_series(*key):
+            print("No data for {}.".format(key))
+            return None
+
+        figure = Figure(figsize=self.size, dpi=self.dpi)
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot(1, 1, 1)
+        width = int(axes.get_position().width * self.size[0] * self.dpi)
+
+        pyramid = self.pyramid(*key, field=field)
+        if kind == 'candles':
+            # a candle needs a few pixels to be readable
+            candles = pyramid.view(start, end, max(1, width // 4))
+            _draw_candles(axes, candles)
+        else:
+            # lttb picks from a finer level than it shows
+            points = width * 4 if method == 'lttb' else width
+            candles = pyramid.view(start, end, points)
+            _draw_line(axes, candles, method, width)
+
+        axes.xaxis_date()
+        axes.set_title(title or ' '.join(str(k) for k in key))
+        axes.grid(alpha=0.3)
+        figure.autofmt_xdate()
+        figure.savefig(path, dpi=self.dpi, bbox_inches='tight')
+        return path
+
+    def render_many(self, jobs, **options):
+        """
+        Renders a batch of charts.
+
+        :param jobs: a list of (key, path)
+        :return: a list of the written files
+        """
+        start = time.time()
+        written = [self.render(key, path, **options) for key, path in jobs]
+        written = [path for path in written if path]
+        print("Rendered {} charts in {:.2f}s.".format(len(written),
+                                                      time.time() - start))
+        return written
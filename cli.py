@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# Queries run on a snapshot (see snapshot.py) and import neither ccxt nor
+# numpy; only 'build' loads exchanges.
+import argparse
+import json
+import os
+import sys
+import time
+
+from snapshot import Snapshot
+
+
+DEFAULT_SNAPSHOT = os.environ.get('VISUCCXT_SNAPSHOT', 'markets.vsnap')
+
+
+# --------- [ Commands ] ---------
+def _build(args):
+    from exchange import get_all_exchange_ids, get_exchanges_as_list, \
+        load_exchanges_from_pickle, load_markets_threaded
+    from snapshot import build_snapshot
+
+    if args.pickle:
+        exchanges = load_exchanges_from_pickle(args.pickle)
+    else:
+        unknown = sorted(set(args.exchanges) - set(get_all_exchange_ids()))
+        if unknown:
+            raise ValueError("Unknown exchange-ids: {}".format(
+                ', '.join(unknown)))
+        exchanges = load_markets_threaded(get_exchanges_as_list(
+            args.exchanges))
+    if not exchanges:
+        raise ValueError("No exchange could be loaded.")
+    build_snapshot(exchanges, args.snapshot)
+
+
+def _pair(snapshot, args):
+    if len(args.pairs) == 1:
+        return snapshot.exchanges_supporting_pair(args.pairs[0])
+    if args.any:
+        return snapshot.exchanges_supporting_pairs(args.pairs)
+    return snapshot.exchanges_supporting_mutual_pairs(args.pairs)
+
+
+def _mutual(snapshot, args):
+    if len(args.exchanges) == 1:
+        return snapshot.pairs_at_exchange(args.exchanges[0])
+    return snapshot.mutual_pairs(args.exchanges)
+
+
+def _fees(snapshot, args):
+    return {exchange_id: snapshot.fees(exchange_id, args.kind, args.currency)
+            for exchange_id in args.exchanges}
+
+
+def _search(snapshot, args):
+    return snapshot.search(args.term, args.kind, args.number_results)
+
+
+def _info(snapshot, args):
+    return {'path': snapshot.path,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S',
+                                     time.localtime(snapshot.created)),
+            'exchanges': len(snapshot.exchange_ids),
+            'pairs': len(snapshot)}
+
+
+def _print(result):
+    if isinstance(result, list):
+        for value in result:
+            print(value)
+    elif isinstance(result, dict) and all(
+            isinstance(v, dict) for v in result.values()):
+        for exchange_id, kinds in result.items():
+            for kind, currencies in sorted(kinds.items()):
+                for currency, fee in sorted(currencies.items()):
+                    print('{:<16} {:<9} {:<8} {:g}'.format(
+                        exchange_id, kind, currency or '-', fee))
+    else:
+        for key, value in result.items():
+            print('{}: {}'.format(key, value))
+
+
+def parser():
+    main = argparse.ArgumentParser(
+        prog='visuccxt', description='Market lookups on a prebuilt snapshot.')
+    main.add_argument('-s', '--snapshot', default=DEFAULT_SNAPSHOT,
+                      help='snapshot file (default: $VISUCCXT_SNAPSHOT or '
+                           '%(default)s)')
+    main.add_argument('--json', action='store_true', help='print JSON')
+    commands = main.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='load exchanges and write the '
+                                              'snapshot')
+    build.add_argument('exchanges', nargs='*', help='exchange-ids to load')
+    build.add_argument('--pickle', help='use exchanges saved with '
+                                        'safe_exchanges_to_pickle')
+
+    pair = commands.add_parser('pair', help='exchanges supporting pairs '
+                                            '(all of them, or --any)')
+    pair.add_argument('pairs', nargs='+')
+    pair.add_argument('--any', action='store_true')
+    pair.set_defaults(query=_pair)
+
+    mutual = commands.add_parser('mutual', help='pairs listed at all of the '
+                                                'exchanges')
+    mutual.add_argument('exchanges', nargs='+')
+    mutual.set_defaults(query=_mutual)
+
+    fees = commands.add_parser('fees', help='fees of exchanges')
+    fees.add_argument('exchanges', nargs='+')
+    fees.add_argument('--kind', choices=('maker', 'taker', 'deposit',
+                                         'withdraw'))
+    fees.add_argument('--currency')
+    fees.set_defaults(query=_fees)
+
+    search = commands.add_parser('search', help='fuzzy search of exchanges '
+                                                'or pairs')
+    search.add_argument('term')
+    search.add_argument('--kind', choices=('exchange', 'pair'),
+                        default='exchange')
+    search.add_argument('-n', '--number-results', type=int, default=5)
+    search.set_defaults(query=_search)
+
+    info = commands.add_parser('info', help='describe the snapshot')
+    info.set_defaults(query=_info)
+    return main
+
+
+def main(argv=None):
+    arguments = parser()
+    args = arguments.parse_args(argv)
+    if args.command == 'build':
+        if not args.exchanges and not args.pickle:
+            arguments.error("build needs exchange-ids to load or --pickle")
+        try:
+            _build(args)
+        except (OSError, ValueError) as e:
+            print("Cannot build snapshot: {}".format(e), file=sys.stderr)
+            return 1
+        return 0
+
+    try:
+        snapshot = Snapshot(args.snapshot)
+    except (OSError, ValueError) as e:
+        print("Cannot open snapshot: {} (create it with 'build')".format(e),
+              file=sys.stderr)
+        return 1
+    try:
+        result = args.query(snapshot, args)
+    except KeyError as e:
+        print("Not in the snapshot: {}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        snapshot.close()
+
+    if args.json:
+        print(json.dumps(result, indent=1))
+    else:
+        _print(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+from _checks import check_isinstance_list
+from ohlcv import timeframe_to_ms
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+
+
+MEMORY_BUDGET = 256 << 20   # bytes for return blocks of all workers
+BLOCK_SIZE = 128            # series per block
+
+
+# --------- [ Returns ] ---------
+def _series_bounds(store, series, timeframe):
+    """Returns the common time range [start, end] of the stored series."""
+    firsts, lasts = [], []
+    for key in series:
+        if store.has_series(*key, timeframe):
+            s = store.series(*key, timeframe)
+            if len(s):
+                firsts.append(s.first_timestamp)
+                lasts.append(s.last_timestamp)
+    if not firsts:
+        return None, None
+    return min(firsts), max(lasts)
+
+
+def load_returns(store, series, timeframe, start, end):
+    """
+    Reads the log returns of several series on a common time grid.
+    Candles missing on either side of a step leave a NaN return.
+
+    :param store: an OHLCVStore
+    :param series: a list of (exchange-id, symbol)
+    :param timeframe: a timeframe (e.g. '1h')
+    :param start: first grid timestamp (in ms, aligned to the timeframe)
+    :param end: last grid timestamp (in ms)
+    :return: array of returns (time x series), row t is the return from
+             t - 1 to t
+    """
+    period = timeframe_to_ms(timeframe)
+    n = (end - start) // period + 1
+    closes = np.full((n + 1, len(series)), np.nan)
+
+    for column, (exchange_id, symbol) in enumerate(series):
+        # one candle before start for the first return
+        candles = store.read(exchange_id, symbol, timeframe,
+                             start - period, end)
+        if not len(candles):
+            continue
+        rows = (candles['timestamp'] - (start - period)) // period
+        on_grid = candles['timestamp'] % period == start % period
+        closes[rows[on_grid], column] = candles['close'][on_grid]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_closes = np.log(closes)
+    return np.diff(log_closes, axis=0)
+
+
+# --------- [ Pairwise Correlation ] ---------
+def _moments(x, y):
+    """
+    Pairwise-complete sums of two return blocks with a few masked
+    matrix products: a pair of series only counts the rows where both
+    have a value.
+    """
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    x0, y0 = np.where(mx, x, 0.0), np.where(my, y, 0.0)
+    mx, my = mx.astype(np.float64), my.astype(np.float64)
+    return np.array([mx.T @ my,
+                     x0.T @ my,
+                     mx.T @ y0,
+                     (x0 * x0).T @ my,
+                     mx.T @ (y0 * y0),
+                     x0.T @ y0])
+
+
+def _finish(sums, min_periods):
+    n, sx, sy, sxx, syy, sxy = sums
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[n < min_periods] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlation_matrix(store, series, timeframe='1h', start=None, end=None,
+                       min_periods=30, memory_budget=MEMORY_BUDGET,
+                       block_size=BLOCK_SIZE, workers=None):
+    """
+    Correlation matrix of the log returns of many (exchange, symbol)
+    series, computed block by block: series are split into blocks of
+    'block_size' and time into windows small enough that the blocks all
+    workers hold at once stay within 'memory_budget'. The sums of every
+    block pair are accumulated over the windows, so only the result
+    (series x series) grows with the number of series. Block pairs run
+    in a thread pool, the matrix products release the GIL.
+
+    :param store: an OHLCVStore
+    :param series: a list of (exchange-id, symbol), e.g. from
+                   get_all_mutual_pairs_by_quote_at_exchanges
+    :param timeframe: the candle timeframe (e.g. '1h')
+    :param start: start of the time range in ms (default: first candle)
+    :param end: end of the time range in ms (default: last candle)
+    :param min_periods: minimal number of common returns of a pair,
+                        otherwise the correlation is NaN
+    :param memory_budget: bytes for return blocks (excluding the result)
+    :param block_size: number of series per block
+    :param workers: number of threads (default: number of cores)
+    :return: array of correlations (series x series)
+    """
+    check_isinstance_list(series)
+
+    series = [tuple(key) for key in series]
+    period = timeframe_to_ms(timeframe)
+    workers = workers or os.cpu_count() or 1
+
+    first, last = _series_bounds(store, series, timeframe)
+    start = first if start is None else start
+    end = last if end is None else end
+    result = np.full((len(series), len(series)), np.nan)
+    if start is None or end is None or end < start:
+        return result
+    start -= start % period
+
+    blocks = [slice(i, min(i + block_size, len(series)))
+              for i in range(0, len(series), block_size)]
+    pairs = [(a, b) for a in range(len(blocks)) for b in range(a, len(blocks))]
+
+    # every task holds two blocks and their masked copies (~8 arrays)
+    row_bytes = 8 * 8 * block_size * min(workers, len(pairs))
+    window = max(16, memory_budget // row_bytes) * period
+    windows = list(range(start, end + 1, window))
+
+    def run(pair):
+        a, b = pair
+        sums = 0
+        for w in windows:
+            w_end = min(w + window - period, end)
+            x = load_returns(store, series[blocks[a]], timeframe, w, w_end)
+            y = x if a == b else \
+                load_returns(store, series[blocks[b]], timeframe, w, w_end)
+            sums = sums + _moments(x, y)
+        return pair, _finish(sums, min_periods)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (a, b), corr in pool.map(run, pairs):
+            result[blocks[a], blocks[b]] = corr
+            result[blocks[b], blocks[a]] = corr.T
+    return result
@@ -0,0 +1,261 @@
+from _checks import check_isinstance_list
+from trading_fees import get_taker_fee_from_exchanges
+
+import numpy as np
+
+
+_EPS = 1e-12
+
+
+# --------- [ Market Graph ] ---------
+class MarketGraph:
+    """
+    Conversion graph of the markets of several exchanges. Nodes are
+    (exchange-id, currency), every market adds two edges:
+    base -> quote (selling at the bid) and quote -> base (buying at the
+    ask), both after the taker fee. With 'transfers', a currency is
+    connected to the same currency at every other exchange at no cost
+    (withdraw fees are absolute amounts and are not included).
+
+    Edge weights are -log(rate), so a profitable conversion loop is a
+    negative cycle. Edges are kept sorted by target node, so a Bellman-Ford
+    pass is one gather, one reduceat and one scatter over all edges.
+    """
+
+    def __init__(self, exchanges, fees=None, transfers=True, default_fee=0.0):
+        """
+        :param exchanges: a list of exchanges (as Exchange), markets loaded
+        :param fees: dictionary of exchange-id: taker fee (None: from ccxt)
+        :param transfers: connect the same currency across exchanges
+        :param default_fee: fee for exchanges without a known taker fee
+        """
+        check_isinstance_list(exchanges)
+
+        if fees is None:
+            fees = get_taker_fee_from_exchanges(exchanges)
+
+        self.nodes = []
+        self.node_index = {}
+        src, dst, kind, fee = [], [], [], []
+        self.markets = []   # (exchange-id, symbol) per market edge pair
+
+        for exchange in exchanges:
+            exchange_fee = fees.get(exchange.id)
+            if exchange_fee is None:
+                exchange_fee = default_fee
+            for symbol, market in exchange.markets.items():
+                base = self._node(exchange.id, market['base'])
+                quote = self._node(exchange.id, market['quote'])
+                self.markets.append((exchange.id, symbol))
+                # sell base for quote at the bid, buy base with quote at the ask
+                src += [base, quote]
+                dst += [quote, base]
+                kind += [1, -1]
+                fee += [exchange_fee, exchange_fee]
+
+        n_market_edges = len(src)
+        if transfers:
+            by_currency = {}
+            for node, (_, currency) in enumerate(self.nodes):
+                by_currency.setdefault(currency, []).append(node)
+            for nodes in by_currency.values():
+                for a in nodes:
+                    for b in nodes:
+                        if a != b:
+                            src.append(a)
+                            dst.append(b)
+                            kind.append(0)
+                            fee.append(0.0)
+
+        src = np.array(src, dtype=np.intp)
+        dst = np.array(dst, dtype=np.intp)
+        order = np.argsort(dst, kind='stable')
+
+        self.src = src[order]
+        self.dst = dst[order]
+        self.kind = np.array(kind, dtype=np.int8)[order]
+        self.fee = np.array(fee, dtype=np.float64)[order]
+        # market number of every edge (-1 for transfers)
+        market = np.full(len(order), -1, dtype=np.intp)
+        market[:n_market_edges] = np.arange(n_market_edges) // 2
+        self.market = market[order]
+        self.weight = np.where(self.kind == 0, 0.0, np.inf)
+
+        # position of the (sell, buy) edge of every market
+        position = np.empty(len(order), dtype=np.intp)
+        position[order] = np.arange(len(order))
+        self._sell_edge = position[0:n_market_edges:2]
+        self._buy_edge = position[1:n_market_edges:2]
+        self._market_index = {m: i for i, m in enumerate(self.markets)}
+
+        self._starts = np.concatenate(
+            ([0], np.flatnonzero(np.diff(self.dst)) + 1)) \
+            if len(self.dst) else np.empty(0, dtype=np.intp)
+        self._targets = self.dst[self._starts]
+        self._counts = np.diff(np.append(self._starts, len(self.dst)))
+
+        self._dist = np.zeros(len(self.nodes))
+        self._converged = False
+
+    def _node(self, exchange_id, currency):
+        key = (exchange_id, currency)
+        node = self.node_index.get(key)
+        if node is None:
+            node = len(self.nodes)
+            self.node_index[key] = node
+            self.nodes.append(key)
+        return node
+
+    # ----- prices -----
+    def _set_weights(self, markets, bids, asks):
+        fee_sell = self.fee[self._sell_edge[markets]]
+        fee_buy = self.fee[self._buy_edge[markets]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sell = -np.log(bids * (1 - fee_sell))
+            buy = -np.log((1 - fee_buy) / asks)
+        # missing quotes deactivate the edge
+        self.weight[self._sell_edge[markets]] = np.where(
+            np.isnan(sell), np.inf, sell)
+        self.weight[self._buy_edge[markets]] = np.where(
+            np.isnan(buy), np.inf, buy)
+
+    def update_from_board(self, board):
+        """Sets the weights of all markets from a QuoteBoard."""
+        rows = np.array([board.exchange_index.get(e, -1)
+                         for e, _ in self.markets], dtype=np.intp)
+        cols = np.array([board.symbol_index.get(s, -1)
+                         for _, s in self.markets], dtype=np.intp)
+        known = (rows >= 0) & (cols >= 0)
+
+        bids = np.full(len(self.markets), np.nan)
+        asks = np.full(len(self.markets), np.nan)
+        bids[known] = board.bid[rows[known], cols[known]]
+        asks[known] = board.ask[rows[known], cols[known]]
+        self._set_weights(np.arange(len(self.markets)), bids, asks)
+
+    def update_quotes(self, quotes):
+        """
+        Updates only the given markets.
+
+        :param quotes: dictionary of (exchange-id, symbol): (bid, ask)
+        """
+        markets, bids, asks = [], [], []
+        for key, (bid, ask) in quotes.items():
+            market = self._market_index.get(key)
+            if market is not None:
+                markets.append(market)
+                bids.append(np.nan if bid is None else bid)
+                asks.append(np.nan if ask is None else ask)
+        if markets:
+            self._set_weights(np.array(markets, dtype=np.intp),
+                              np.array(bids, dtype=float),
+                              np.array(asks, dtype=float))
+
+    # ----- cycles -----
+    def _relax(self, dist, pred, max_passes):
+        """
+        Runs Bellman-Ford passes until nothing improves.
+
+        :return: nodes improved in the last pass (empty if converged)
+        """
+        improved_nodes = np.empty(0, dtype=np.intp)
+        for _ in range(max_passes):
+            candidate = dist[self.src] + self.weight
+            best = np.minimum.reduceat(candidate, self._starts)
+            improved = best < dist[self._targets] - _EPS
+            if not improved.any():
+                return np.empty(0, dtype=np.intp)
+
+            improved_nodes = self._targets[improved]
+            dist[improved_nodes] = best[improved]
+            hit = (candidate == np.repeat(best, self._counts)) & \
+                np.repeat(improved, self._counts)
+            pred[self.dst[hit]] = np.flatnonzero(hit)
+        return improved_nodes
+
+    def _trace(self, node, pred):
+        """Returns the edges of the cycle that node leads into (or None)."""
+        for _ in range(len(self.nodes)):
+            if pred[node] < 0:
+                return None
+            node = self.src[pred[node]]
+
+        edges, start = [], node
+        while True:
+            edge = pred[node]
+            edges.append(edge)
+            node = self.src[edge]
+            if node == start:
+                return edges[::-1]
+            if len(edges) > len(self.nodes):
+                return None
+
+    def _describe(self, edges):
+        steps = []
+        for edge in edges:
+            exchange_id, currency = self.nodes[self.src[edge]]
+            target = self.nodes[self.dst[edge]]
+            if self.kind[edge] == 0:
+                steps.append({'from': (exchange_id, currency), 'to': target,
+                              'action': 'transfer'})
+            else:
+                steps.append({'from': (exchange_id, currency), 'to': target,
+                              'action': 'sell' if self.kind[edge] == 1
+                              else 'buy',
+                              'symbol': self.markets[self.market[edge]][1]})
+        weight = self.weight[edges].sum()
+        return {'profit': float(np.exp(-weight) - 1), 'steps': steps}
+
+    def find_cycles(self, max_passes=None):
+        """
+        Finds profitable conversion loops with a vectorized Bellman-Ford
+        from a virtual source connected to every node. If the previous run
+        found no cycle, its distances are reused as start values, so after
+        a few price changes only a few passes are needed.
+
+        :param max_passes: passes before giving up (default: number of nodes)
+        :return: a list of cycles (as dict with 'profit' and 'steps'),
+                 best first
+        """
+        n = len(self.nodes)
+        if not n:
+            return []
+        if max_passes is None:
+            max_passes = n
+
+        dist = self._dist if self._converged else np.zeros(n)
+        pred = np.full(n, -1, dtype=np.intp)
+        improved = self._relax(dist, pred, max_passes)
+
+        self._converged = not len(improved)
+        self._dist = dist if self._converged else np.zeros(n)
+        if self._converged:
+            return []
+
+        cycles, seen = [], set()
+        for node in improved:
+            edges = self._trace(node, pred)
+            if edges is None:
+                continue
+            key = frozenset(int(e) for e in edges)
+            if key in seen:
+                continue
+            seen.add(key)
+            if self.weight[edges].sum() < -_EPS:
+                cycles.append(self._describe(edges))
+        return sorted(cycles, key=lambda c: -c['profit'])
+
+
+def find_arbitrage_cycles(exchanges, board, transfers=True, fees=None):
+    """
+    Finds profitable conversion loops within and across the given
+    exchanges at the prices of a QuoteBoard.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param board: a QuoteBoard
+    :param transfers: include loops that move a currency between exchanges
+    :return: a list of cycles (as dict with 'profit' and 'steps')
+    """
+    graph = MarketGraph(exchanges, fees, transfers)
+    graph.update_from_board(board)
+    return graph.find_cycles()
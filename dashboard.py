@@ -0,0 +1,271 @@
+from _checks import check_isinstance_list
+from charts import ChartRenderer
+from fee_history import extract_fee_state
+from heatmap import coverage_matrix, fee_matrix, render_heatmap
+from trading_fees import get_maker_fee_from_exchanges, \
+    get_taker_fee_from_exchanges
+
+import hashlib
+import html
+import json
+import os
+import time
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+
+MANIFEST = 'manifest.json'
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; font-size: 0.9em; }}
+td, th {{ border: 1px solid #ccc; padding: 0.2em 0.6em; text-align: right; }}
+th {{ background: #f4f4f4; }}
+img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+<p><a href="{root}index.html">Overview</a></p>
+<h1>{title}</h1>
+{body}
+<script type="application/json" id="data">{data}</script>
+<p><small>Generated {generated}</small></p>
+</body>
+</html>
+"""
+
+
+def fingerprint(value):
+    """Returns a short hash of a JSON-serializable value."""
+    encoded = json.dumps(value, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=12).hexdigest()
+
+
+def _write(path, content):
+    """Writes a file atomically, so a reader never sees half a page."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    mode = 'wb' if isinstance(content, bytes) else 'w'
+    with open(path + '.tmp', mode) as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+
+
+def _clean(value):
+    """Replaces NaN (which isn't valid JSON) by None in nested rows."""
+    if isinstance(value, (list, tuple)):
+        return [_clean(v) for v in value]
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _table(header, rows):
+    cells = ''.join('<th>{}</th>'.format(html.escape(str(h))) for h in header)
+    lines = ['<table>', '<tr>{}</tr>'.format(cells)]
+    for row in rows:
+        lines.append('<tr>{}</tr>'.format(''.join(
+            '<td>{}</td>'.format(html.escape('' if v is None else str(v)))
+            for v in row)))
+    lines.append('</table>')
+    return '\n'.join(lines)
+
+
+def _page_name(key):
+    """
+    Returns the page path of a series key, one URL-quoted directory per
+    key part (as in SeriesStore), so different keys never share a page.
+    """
+    parts = [quote(str(part), safe='') for part in key]
+    parts = [p.replace('.', '%2E') if p in ('.', '..') else p for p in parts]
+    return '/'.join(parts)
+
+
+# --------- [ Dashboard ] ---------
+class Dashboard:
+    """
+    Static HTML dashboard (one directory of pages and images) with market
+    coverage, fee comparison, quotes and one price panel per stored
+    series. Every page has a fingerprint of its inputs (markets, fee
+    state, board version, series length); the fingerprints of the last
+    build are kept in a manifest, so a build only regenerates the pages
+    whose inputs changed.
+    """
+
+    def __init__(self, directory, exchanges, store=None, series=(),
+                 board=None):
+        """
+        :param directory: the output directory
+        :param exchanges: a list of exchanges (as Exchange), markets loaded
+        :param store: an OHLCVStore for the price panels
+        :param series: a list of series keys, e.g.
+                       [('binance', 'BTC/USDT', '1h')] (needs store)
+        :param board: a QuoteBoard for the quotes page
+        """
+        check_isinstance_list(exchanges)
+        if series and store is None:
+            raise ValueError("Price panels of 'series' need a 'store'.")
+
+        self.directory = directory
+        self.exchanges = exchanges
+        self.store = store
+        self.series = [tuple(key) for key in series]
+        self.board = board
+        self.charts = ChartRenderer(store) if store is not None else None
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _render(self, name, title, body, data=None):
+        root = '../' * name.count('/')
+        _write(self._path(name), _PAGE.format(
+            title=html.escape(title), root=root, body=body,
+            data=json.dumps(_clean(data), default=str).replace('</', '<\\/'),
+            generated=time.strftime('%Y-%m-%d %H:%M:%S')))
+
+    # ----- pages -----
+    def _pages(self):
+        """Returns the pages as (file name, fingerprint function, builder)."""
+        pages = [('coverage.html', self._coverage_inputs, self._coverage),
+                 ('fees.html', self._fee_inputs, self._fees)]
+        if self.board is not None:
+            pages.append(('quotes.html', self._quote_inputs, self._quotes))
+        for key in self.series:
+            pages.append(('prices/{}.html'.format(_page_name(key)),
+                          lambda key=key: self._price_inputs(key),
+                          lambda name, key=key: self._price(name, key)))
+        pages.append(('index.html', self._index_inputs, self._index))
+        return pages
+
+    def _coverage_inputs(self):
+        return {e.id: sorted(e.markets or ()) for e in self.exchanges}
+
+    def _coverage(self, name):
+        for kind in ('currency', 'pair'):
+            ids, labels, matrix = coverage_matrix(self.exchanges, kind)
+            if matrix.size:
+                render_heatmap(matrix, ids, labels,
+                               self._path('coverage_{}.png'.format(kind)),
+                               title='{} coverage'.format(kind),
+                               colorbar_label='share listed')
+
+        rows = [(e.id, len(e.markets or ()), len(e.currencies or ()))
+                for e in self.exchanges]
+        body = _table(('exchange', 'pairs', 'currencies'), rows)
+        body += '\n<img src="coverage_currency.png">' \
+                '\n<img src="coverage_pair.png">'
+        self._render(name, 'Market coverage', body, rows)
+
+    def _fee_inputs(self):
+        state = {}
+        for exchange in self.exchanges:
+            state.update(extract_fee_state(exchange))
+        return sorted((list(k), v) for k, v in state.items())
+
+    def _fees(self, name):
+        makers = get_maker_fee_from_exchanges(self.exchanges)
+        takers = get_taker_fee_from_exchanges(self.exchanges)
+        rows = [(e.id, makers.get(e.id), takers.get(e.id))
+                for e in self.exchanges]
+
+        body = _table(('exchange', 'maker', 'taker'), rows)
+        for kind in ('taker', 'withdraw'):
+            ids, labels, matrix = fee_matrix(self.exchanges, kind)
+            if matrix.size and not np.isnan(matrix).all():
+                image = 'fees_{}.png'.format(kind)
+                render_heatmap(matrix, ids, labels, self._path(image),
+                               title='{} fees'.format(kind), how='max',
+                               colorbar_label='{} fee'.format(kind))
+                body += '\n<img src="{}">'.format(image)
+        self._render(name, 'Fee comparison', body, rows)
+
+    def _quote_inputs(self):
+        # versions restart with every board, the timestamps don't
+        return [self.board.version, int(self.board.timestamp.max(initial=0))]
+
+    def _quotes(self, name):
+        board = self.board
+        spread = (board.ask - board.bid) / board.mid
+        rows = []
+        for i, exchange_id in enumerate(board.exchange_ids):
+            for j, symbol in enumerate(board.symbols):
+                if board.timestamp[i, j]:
+                    rows.append((exchange_id, symbol, board.bid[i, j],
+                                 board.ask[i, j], board.last[i, j],
+                                 '{:.4%}'.format(spread[i, j])))
+        self._render(name, 'Quotes', _table(
+            ('exchange', 'symbol', 'bid', 'ask', 'last', 'spread'), rows),
+            rows)
+
+    def _price_inputs(self, key):
+        if not self.store.has_series(*key):
+            return None
+        series = self.store.series(*key)
+        return [len(series), series.last_timestamp]
+
+    def _price(self, name, key):
+        image = name[:-len('.html')] + '.png'
+        os.makedirs(os.path.dirname(self._path(image)), exist_ok=True)
+        chart = self.charts.render(key, self._path(image))
+        candles = self.store.series(*key).tail(20) \
+            if self.store.has_series(*key) else []
+        rows = [(time.strftime('%Y-%m-%d %H:%M', time.gmtime(c['timestamp']
+                                                              / 1000)),
+                 c['open'], c['high'], c['low'], c['close'], c['volume'])
+                for c in candles[::-1]]
+        body = '<img src="{}">\n'.format(
+            html.escape(quote(os.path.basename(image)))) if chart else ''
+        body += _table(('time (UTC)', 'open', 'high', 'low', 'close',
+                        'volume'), rows)
+        self._render(name, ' '.join(key), body, rows)
+
+    def _index_inputs(self):
+        return [name for name, _, _ in self._pages() if name != 'index.html']
+
+    def _index(self, name):
+        links = ['<li><a href="{0}">{1}</a></li>'.format(
+            html.escape(quote(page)),
+            html.escape(unquote(page[:-len('.html')])))
+            for page in self._index_inputs()]
+        self._render(name, 'Visuccxt dashboard',
+                     '<ul>\n{}\n</ul>'.format('\n'.join(links)))
+
+    # ----- build -----
+    def build(self, force=False):
+        """
+        Regenerates the pages whose inputs changed since the last build.
+
+        :param force: regenerate every page
+        :return: a list of the regenerated pages
+        """
+        start = time.time()
+        os.makedirs(self.directory, exist_ok=True)
+
+        built = []
+        for name, inputs, builder in self._pages():
+            stamp = fingerprint(inputs())
+            if not force and self.manifest.get(name) == stamp and \
+                    os.path.exists(self._path(name)):
+                continue
+            builder(name)
+            self.manifest[name] = stamp
+            built.append(name)
+
+        if built:
+            _write(self._path(MANIFEST), json.dumps(self.manifest, indent=1))
+        print("Rebuilt {} of {} pages in {:.2f}s.".format(
+            len(built), len(self._pages()), time.time() - start))
+        return built
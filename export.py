@@ -0,0 +1,278 @@
+from _checks import check_isinstance_list, check_isinstance_string
+from fee_history import extract_fee_state, TRADING_KINDS, FUNDING_KINDS
+
+import csv
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+
+BATCH_SIZE = 10000
+
+# (column, type) of the exported tables; types are pyarrow aliases or
+# 'category' (dictionary-encoded strings)
+MARKET_COLUMNS = (('exchange', 'string'),
+                  ('symbol', 'string'),
+                  ('base', 'string'),
+                  ('quote', 'string'),
+                  ('type', 'string'),
+                  ('active', 'bool'),
+                  ('taker', 'float64'),
+                  ('maker', 'float64'),
+                  ('precision.amount', 'float64'),
+                  ('precision.price', 'float64'),
+                  ('limits.amount.min', 'float64'),
+                  ('limits.cost.min', 'float64'))
+
+PAIR_COLUMNS = (('exchange', 'string'),
+                ('symbol', 'string'),
+                ('base', 'string'),
+                ('quote', 'string'))
+
+FEE_COLUMNS = (('exchange', 'string'),
+               ('kind', 'string'),
+               ('currency', 'string'),
+               ('fee', 'float64'))
+
+
+# --------- [ Sources ] ---------
+def market_field(market, column):
+    """Returns a (dotted) field of a market dict, None if missing."""
+    value = market
+    for part in column.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def iter_markets(exchanges, columns=MARKET_COLUMNS):
+    """Yields one row (as tuple) per market of every exchange."""
+    check_isinstance_list(exchanges)
+
+    names = [name for name, _ in columns]
+    for exchange in exchanges:
+        for market in (exchange.markets or {}).values():
+            yield tuple(exchange.id if name == 'exchange'
+                        else market_field(market, name) for name in names)
+
+
+def iter_pair_listings(exchanges):
+    """Yields (exchange-id, symbol, base, quote) of every market."""
+    return iter_markets(exchanges, PAIR_COLUMNS)
+
+
+def iter_fees(exchanges):
+    """
+    Yields (exchange-id, kind, currency, fee) of the trading and funding
+    fees of every exchange (tier tables are left out).
+    """
+    check_isinstance_list(exchanges)
+
+    for exchange in exchanges:
+        state = extract_fee_state(exchange)
+        for (exchange_id, kind, currency), fee in sorted(state.items()):
+            if kind in TRADING_KINDS + FUNDING_KINDS and \
+                    isinstance(fee, (int, float)):
+                yield exchange_id, kind, currency, float(fee)
+
+
+def row_batches(rows, columns, batch_size=BATCH_SIZE):
+    """
+    Groups rows (tuples in column order) into columnar batches, so only
+    one batch is in memory at a time.
+
+    :return: generator of dictionaries of column: list of values
+    """
+    names = [name for name, _ in columns]
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield dict(zip(names, map(list, zip(*batch))))
+            batch = []
+    if batch:
+        yield dict(zip(names, map(list, zip(*batch))))
+
+
+def series_columns(store, key_names):
+    """Returns the columns of exported series: key columns, then fields."""
+    return tuple((name, 'category') for name in key_names) + \
+        tuple((name, store.dtype[name].name) for name in store.dtype.names)
+
+
+def iter_series(store, keys, key_names, start=None, end=None):
+    """
+    Yields the records of stored series as columnar batches, one per
+    touched chunk (zero-copy views of the memory map). Key columns are
+    the key part broadcast over the batch, also without a copy.
+
+    :param store: a SeriesStore (e.g. OHLCVStore or TradeStore)
+    :param keys: a list of series keys
+    :param key_names: names of the key columns, e.g.
+                      ('exchange', 'symbol', 'timeframe')
+    """
+    check_isinstance_list(keys)
+
+    for key in keys:
+        if not store.has_series(*key):
+            continue
+        for records in store.series(*key).iter_range(start, end):
+            batch = {name: np.broadcast_to(np.array(str(part)), len(records))
+                     for name, part in zip(key_names, key)}
+            for name in records.dtype.names:
+                batch[name] = records[name]
+            yield batch
+
+
+# --------- [ Writers ] ---------
+def _rows(batch, names):
+    columns = [batch[name].tolist() if isinstance(batch[name], np.ndarray)
+               else batch[name] for name in names]
+    return zip(*columns)
+
+
+def write_csv(path, columns, batches):
+    """Writes columnar batches to a CSV file, returns the number of rows."""
+    names = [name for name, _ in columns]
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        for batch in batches:
+            rows = list(_rows(batch, names))
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def _json_value(value):
+    """Replaces NaN and inf (which aren't valid JSON) by None."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def write_jsonl(path, columns, batches):
+    """
+    Writes columnar batches as JSON lines, returns the number of rows.
+    Missing values (NaN) are written as null.
+    """
+    names = [name for name, _ in columns]
+    count = 0
+    with open(path, 'w') as f:
+        for batch in batches:
+            for row in _rows(batch, names):
+                f.write(json.dumps({name: _json_value(value) for name, value
+                                    in zip(names, row)}, allow_nan=False))
+                f.write('\n')
+                count += 1
+    return count
+
+
+def _dictionary(pa, values):
+    """
+    Dictionary-encodes a column; a broadcast value (as from iter_series)
+    becomes a single dictionary entry without building the strings.
+    """
+    if isinstance(values, np.ndarray) and values.ndim == 1 and \
+            values.strides == (0,) and len(values):
+        return pa.DictionaryArray.from_arrays(
+            pa.array(np.zeros(len(values), dtype=np.int32)),
+            pa.array([str(values[0])]))
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    return pa.array(values, type=pa.string()).dictionary_encode()
+
+
+def write_parquet(path, columns, batches, compression='zstd'):
+    """
+    Writes columnar batches to a Parquet file with one row group per
+    batch (requires pyarrow), returns the number of rows.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow "
+                          "(pip install pyarrow)")
+
+    schema = pa.schema([(name, pa.dictionary(pa.int32(), pa.string())
+                         if kind == 'category' else pa.type_for_alias(kind))
+                        for name, kind in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for batch in batches:
+            arrays = [_dictionary(pa, batch[name])
+                      if pa.types.is_dictionary(field.type)
+                      else pa.array(batch[name], type=field.type)
+                      for name, field in zip(schema.names, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(arrays[0]) if arrays else 0
+    return count
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'parquet': write_parquet}
+
+
+def write_batches(path, columns, batches, format=None):
+    """
+    Writes columnar batches in the format given by 'format' or the file
+    extension (.csv, .jsonl, .parquet). The file is written under a
+    temporary name and moved in place when complete.
+
+    :return: number of written rows
+    """
+    check_isinstance_string(path)
+
+    format = format or os.path.splitext(path)[1].lstrip('.').lower()
+    if format not in WRITERS:
+        raise ValueError("Unknown export format '{}', use one of {}".format(
+            format, sorted(WRITERS)))
+
+    start = time.time()
+    try:
+        count = WRITERS[format](path + '.tmp', columns, batches)
+    except BaseException:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        raise
+    os.replace(path + '.tmp', path)
+    print("Exported {} rows to {} in {:.2f}s.".format(count, path,
+                                                      time.time() - start))
+    return count
+
+
+# --------- [ Exports ] ---------
+def export_markets(exchanges, path, format=None, columns=MARKET_COLUMNS,
+                   batch_size=BATCH_SIZE):
+    """Exports the markets of all exchanges (one row per market)."""
+    return write_batches(path, columns, row_batches(
+        iter_markets(exchanges, columns), columns, batch_size), format)
+
+
+def export_pair_listings(exchanges, path, format=None, batch_size=BATCH_SIZE):
+    """Exports which exchange lists which pair."""
+    return write_batches(path, PAIR_COLUMNS, row_batches(
+        iter_pair_listings(exchanges), PAIR_COLUMNS, batch_size), format)
+
+
+def export_fees(exchanges, path, format=None, batch_size=BATCH_SIZE):
+    """Exports the trading and funding fees of all exchanges."""
+    return write_batches(path, FEE_COLUMNS, row_batches(
+        iter_fees(exchanges), FEE_COLUMNS, batch_size), format)
+
+
+def export_series(store, keys, path, key_names=('exchange', 'symbol',
+                                                'timeframe'),
+                  start=None, end=None, format=None):
+    """
+    Exports stored series (e.g. candles of an OHLCVStore, or trades of a
+    TradeStore with key_names ('exchange', 'symbol')) chunk by chunk.
+    """
+    return write_batches(path, series_columns(store, key_names),
+                         iter_series(store, keys, key_names, start, end),
+                         format)
@@ -0,0 +1,261 @@
+from _checks import check_isinstance_exchange, check_isinstance_string, \
+    check_isinstance_list
+
+import bisect
+import os
+import pickle
+import time
+from array import array
+
+
+# --------- [ Fee Kinds ] ---------
+TRADING_KINDS = ('maker', 'taker')
+TIER_KINDS = ('tiers.maker', 'tiers.taker')
+FUNDING_KINDS = ('deposit', 'withdraw')
+FEE_KINDS = TRADING_KINDS + TIER_KINDS + FUNDING_KINDS
+
+_MISSING = object()
+
+
+def _freeze(value):
+    """Turns nested lists/dicts of a fee entry into hashable tuples."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def extract_fee_state(exchange):
+    """
+    Flattens the trading and funding fees of an exchange into a
+    dictionary of (exchange-id, kind, currency): fee.
+    Trading fees use an empty string as currency.
+
+    :param exchange: an exchange (as Exchange)
+    :return: dictionary of fee keys (as tuple) and fees
+    """
+    check_isinstance_exchange(exchange)
+
+    state = {}
+
+    try:
+        trading = exchange.fees['trading']
+        for kind in TRADING_KINDS:
+            if kind in trading:
+                state[(exchange.id, kind, '')] = _freeze(trading[kind])
+        if trading.get('tierBased') and 'tiers' in trading:
+            for kind in TIER_KINDS:
+                side = kind.split('.')[1]
+                if side in trading['tiers']:
+                    state[(exchange.id, kind, '')] = \
+                        _freeze(trading['tiers'][side])
+    except (KeyError, TypeError, AttributeError) as e:
+        print("Could not read trading fees of '{}': {!r}".format(
+            exchange.id, e))
+
+    try:
+        funding = exchange.fees['funding']
+        for kind in FUNDING_KINDS:
+            for currency, fee in (funding.get(kind) or {}).items():
+                state[(exchange.id, kind, currency)] = _freeze(fee)
+    except (KeyError, TypeError, AttributeError) as e:
+        print("Could not read funding fees of '{}': {!r}".format(
+            exchange.id, e))
+
+    return state
+
+
+# --------- [ Fee History ] ---------
+class FeeHistory:
+    """
+    Append-only, columnar history of exchange fees.
+
+    Every snapshot only stores the fees that changed compared to the
+    previous snapshot of the same exchange. A fee that disappears is
+    recorded as None. The history is kept as parallel columns
+    (time, key, previous row, value) and, if a path is given, every
+    snapshot is appended to that file so the history survives restarts.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+        # key interning: (exchange-id, kind, currency) <-> key-id
+        self._key_ids = {}
+        self._keys = []
+        self._exchange_keys = {}
+
+        # columns, one entry per recorded change
+        self._times = array('q')
+        self._key_col = array('q')
+        self._prev_rows = array('q')
+        self._values = []
+
+        # per key: times and rows of its changes (for as-of lookups)
+        self._key_times = []
+        self._key_rows = []
+
+        self._snapshot_times = array('q')
+
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self):
+        return len(self._times)
+
+    @property
+    def snapshot_times(self):
+        """Returns the times of all recorded snapshots."""
+        return list(self._snapshot_times)
+
+    def _key_id(self, key):
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            key_id = len(self._keys)
+            self._key_ids[key] = key_id
+            self._keys.append(key)
+            self._key_times.append(array('q'))
+            self._key_rows.append(array('q'))
+            self._exchange_keys.setdefault(key[0], []).append(key_id)
+        return key_id
+
+    def _current(self, key_id):
+        rows = self._key_rows[key_id]
+        if rows:
+            return self._values[rows[-1]]
+        return _MISSING
+
+    def _append(self, timestamp, rows):
+        for key, value in rows:
+            key_id = self._key_id(key)
+            key_rows = self._key_rows[key_id]
+            row = len(self._times)
+
+            self._times.append(timestamp)
+            self._key_col.append(key_id)
+            self._prev_rows.append(key_rows[-1] if key_rows else -1)
+            self._values.append(value)
+
+            key_rows.append(row)
+            self._key_times[key_id].append(timestamp)
+        self._snapshot_times.append(timestamp)
+
+    def _load(self, path):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    timestamp, rows = pickle.load(f)
+                except EOFError:
+                    break
+                self._append(timestamp, rows)
+
+    def record_snapshot(self, exchanges, timestamp=None):
+        """
+        Records the current fees of the given exchanges. Only fees that
+        differ from the last recorded state are stored.
+
+        :param exchanges: a list of exchanges (as Exchange)
+        :param timestamp: snapshot time in ms (defaults to now)
+        :return: a list of changes (time, exchange-id, kind, currency,
+                 old fee, new fee)
+        """
+        check_isinstance_list(exchanges)
+
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        if self._snapshot_times and timestamp < self._snapshot_times[-1]:
+            raise ValueError("Snapshots need to be recorded in time order.")
+
+        state = {}
+        for exchange in exchanges:
+            state.update(extract_fee_state(exchange))
+            # fees that vanished since the last snapshot
+            for key_id in self._exchange_keys.get(exchange.id, ()):
+                key = self._keys[key_id]
+                if key not in state and self._current(key_id) is not None:
+                    state[key] = None
+
+        rows = []
+        changes = []
+        for key, value in state.items():
+            key_id = self._key_ids.get(key)
+            old = _MISSING if key_id is None else self._current(key_id)
+            if old is _MISSING:
+                old = None
+            elif old == value:
+                continue
+            rows.append((key, value))
+            changes.append((timestamp,) + key + (old, value))
+
+        self._append(timestamp, rows)
+
+        if self.path is not None:
+            with open(self.path, 'ab') as f:
+                pickle.dump((timestamp, rows), f)
+
+        return changes
+
+    def fee_at(self, exchange_id, kind, timestamp, currency=''):
+        """
+        Returns the fee that was valid at the given time.
+
+        :param exchange_id: an exchange-id (as str)
+        :param kind: one of FEE_KINDS (as str)
+        :param timestamp: time in ms
+        :param currency: a currency for funding fees (as str)
+        :return: the fee or None if it was unknown at that time
+        """
+        check_isinstance_string(exchange_id)
+        check_isinstance_string(kind)
+
+        key_id = self._key_ids.get((exchange_id, kind, currency))
+        if key_id is None:
+            return None
+
+        i = bisect.bisect_right(self._key_times[key_id], timestamp) - 1
+        if i < 0:
+            return None
+        return self._values[self._key_rows[key_id][i]]
+
+    def fee_history(self, exchange_id, kind, currency=''):
+        """
+        Returns all recorded values of a single fee.
+
+        :param exchange_id: an exchange-id (as str)
+        :param kind: one of FEE_KINDS (as str)
+        :param currency: a currency for funding fees (as str)
+        :return: a list of (time, fee)
+        """
+        key_id = self._key_ids.get((exchange_id, kind, currency))
+        if key_id is None:
+            return []
+        return [(t, self._values[row]) for t, row in
+                zip(self._key_times[key_id], self._key_rows[key_id])]
+
+    def changes_between(self, start, end, exchange_id=None, kind=None):
+        """
+        Returns all fee changes recorded in [start, end].
+
+        :param start: time in ms
+        :param end: time in ms
+        :param exchange_id: only return changes of this exchange (as str)
+        :param kind: only return changes of this kind (as str)
+        :return: a list of changes (time, exchange-id, kind, currency,
+                 old fee, new fee)
+        """
+        lo = bisect.bisect_left(self._times, start)
+        hi = bisect.bisect_right(self._times, end)
+
+        changes = []
+        for row in range(lo, hi):
+            key = self._keys[self._key_col[row]]
+            if exchange_id is not None and key[0] != exchange_id:
+                continue
+            if kind is not None and key[1] != kind:
+                continue
+            prev = self._prev_rows[row]
+            old = self._values[prev] if prev >= 0 else None
+            changes.append((self._times[row],) + key +
+                           (old, self._values[row]))
+        return changes
@@ -0,0 +1,165 @@
+from _checks import check_isinstance_list
+from export import MARKET_COLUMNS, FEE_COLUMNS, iter_fees, iter_markets
+
+import weakref
+
+import numpy as np
+
+
+# columns of the market and fee tables that become categoricals
+CATEGORY_COLUMNS = ('exchange', 'base', 'quote', 'type', 'kind', 'currency')
+
+# exchange: (markets, size, columns, table); entries go with the exchange
+_market_tables = weakref.WeakKeyDictionary()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Arrow interop requires pyarrow "
+                          "(pip install pyarrow)")
+    return pyarrow
+
+
+def _pandas():
+    try:
+        import pandas
+    except ImportError:
+        raise ImportError("pandas interop requires pandas "
+                          "(pip install pandas)")
+    return pandas
+
+
+def _encode(pa, values):
+    """Dictionary-encodes a list of strings; None stays null."""
+    strings = [None if v is None else str(v) for v in values]
+    return pa.array(strings, type=pa.string()).dictionary_encode()
+
+
+def _rows_to_arrow(rows, columns):
+    pa = _pyarrow()
+    columnar = list(zip(*rows)) if rows else [()] * len(columns)
+    arrays = []
+    for (name, kind), values in zip(columns, columnar):
+        if name in CATEGORY_COLUMNS:
+            arrays.append(_encode(pa, values))
+        else:
+            arrays.append(pa.array(values, type=pa.type_for_alias(kind)))
+    return pa.Table.from_arrays(arrays, names=[name for name, _ in columns])
+
+
+# --------- [ Markets and Fees ] ---------
+def markets_to_arrow(exchanges, columns=MARKET_COLUMNS):
+    """
+    Returns the markets of the exchanges as an Arrow table with
+    dictionary-encoded exchange and currency columns. The table of every
+    exchange is built once and reused until its markets are reloaded.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param columns: (column, type) of the table, see export.MARKET_COLUMNS
+    :return: a pyarrow.Table
+    """
+    check_isinstance_list(exchanges)
+    pa = _pyarrow()
+
+    tables = []
+    for exchange in exchanges:
+        markets = exchange.markets or {}
+        cached = _market_tables.get(exchange)
+        if cached is None or cached[0] is not markets or \
+                cached[1] != len(markets) or cached[2] != columns:
+            table = _rows_to_arrow(list(iter_markets([exchange], columns)),
+                                   columns)
+            cached = (markets, len(markets), columns, table)
+            _market_tables[exchange] = cached
+        tables.append(cached[3])
+    if not tables:
+        return _rows_to_arrow([], columns)
+    return pa.concat_tables(tables).unify_dictionaries()
+
+
+def markets_to_pandas(exchanges, columns=MARKET_COLUMNS):
+    """Returns the markets of the exchanges as DataFrame (categoricals)."""
+    return markets_to_arrow(exchanges, columns).to_pandas()
+
+
+def fees_to_arrow(exchanges):
+    """Returns the trading and funding fees as an Arrow table."""
+    check_isinstance_list(exchanges)
+    return _rows_to_arrow(list(iter_fees(exchanges)), FEE_COLUMNS)
+
+
+def fees_to_pandas(exchanges):
+    """Returns the trading and funding fees as DataFrame (categoricals)."""
+    return fees_to_arrow(exchanges).to_pandas()
+
+
+# --------- [ Series ] ---------
+def records_to_pandas(records, datetime=True):
+    """
+    Wraps records (e.g. candles or trades from storage) in a DataFrame
+    without copying: every column is a view of its field, also of a
+    memory-mapped series.
+
+    :param records: a structured array
+    :param datetime: add a 'datetime' column (a datetime64 view of the
+                     timestamps)
+    :return: a pandas.DataFrame
+    """
+    pd = _pandas()
+    columns = {name: records[name] for name in records.dtype.names}
+    if datetime and 'timestamp' in columns:
+        columns['datetime'] = records['timestamp'].view('datetime64[ms]')
+    return pd.DataFrame(columns, copy=False)
+
+
+def records_to_arrow(records):
+    """
+    Returns records as an Arrow table. Arrow columns must be contiguous,
+    so every field of the record layout is copied once.
+    """
+    pa = _pyarrow()
+    return pa.Table.from_arrays(
+        [pa.array(np.ascontiguousarray(records[name]))
+         for name in records.dtype.names], names=list(records.dtype.names))
+
+
+# --------- [ Quote Board ] ---------
+def board_to_arrow(board, fields=('bid', 'ask', 'last', 'volume')):
+    """
+    Returns a QuoteBoard as a long Arrow table (one row per exchange and
+    symbol). The quote columns wrap the board arrays without copying;
+    exchange and symbol are dictionary-encoded.
+    """
+    pa = _pyarrow()
+    rows, cols = board.shape
+    arrays = [pa.DictionaryArray.from_arrays(
+                  pa.array(np.repeat(np.arange(rows, dtype=np.int32), cols)),
+                  pa.array(board.exchange_ids)),
+              pa.DictionaryArray.from_arrays(
+                  pa.array(np.tile(np.arange(cols, dtype=np.int32), rows)),
+                  pa.array(board.symbols))]
+    names = ['exchange', 'symbol']
+    for field in tuple(fields) + ('timestamp',):
+        arrays.append(pa.array(getattr(board, field).ravel()))
+        names.append(field)
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def board_to_pandas(board, fields=('bid', 'ask', 'last', 'volume')):
+    """
+    Returns a QuoteBoard as a long DataFrame; the quote columns are views
+    of the board arrays.
+    """
+    pd = _pandas()
+    rows, cols = board.shape
+    columns = {
+        'exchange': pd.Categorical.from_codes(
+            np.repeat(np.arange(rows, dtype=np.int32), cols),
+            board.exchange_ids),
+        'symbol': pd.Categorical.from_codes(
+            np.tile(np.arange(cols, dtype=np.int32), rows), board.symbols)}
+    for field in tuple(fields) + ('timestamp',):
+        columns[field] = getattr(board, field).ravel()
+    return pd.DataFrame(columns, copy=False)
@@ -0,0 +1,220 @@
+from _checks import check_isinstance_list, check_isinstance_string
+
+import os
+import time
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+
+
+MAX_TICK_LABELS = 40
+
+
+# --------- [ Matrices ] ---------
+def coverage_matrix(exchanges, kind='currency'):
+    """
+    Incidence matrix of exchanges and the currencies or pairs they list.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param kind: 'currency' or 'pair'
+    :return: (exchange-ids, labels, matrix (exchange x label) of 0/1)
+    """
+    check_isinstance_list(exchanges)
+    check_isinstance_string(kind)
+
+    listed = []
+    for exchange in exchanges:
+        if kind == 'pair':
+            listed.append(list(exchange.markets or ()))
+        else:
+            listed.append(list(exchange.currencies or ()))
+
+    labels = sorted(set().union(*listed)) if listed else []
+    index = {label: i for i, label in enumerate(labels)}
+    matrix = np.zeros((len(exchanges), len(labels)), dtype=np.uint8)
+    for row, items in enumerate(listed):
+        matrix[row, [index[item] for item in items]] = 1
+    return [e.id for e in exchanges], labels, matrix
+
+
+def fee_matrix(exchanges, kind='withdraw', labels=None):
+    """
+    Fee matrix of exchanges and currencies (funding fees) or pairs
+    (taker fees of the markets). Unknown fees are NaN.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param kind: 'withdraw', 'deposit' (per currency) or 'taker',
+                 'maker' (per pair)
+    :param labels: currencies or pairs (default: all listed)
+    :return: (exchange-ids, labels, matrix (exchange x label))
+    """
+    check_isinstance_list(exchanges)
+    check_isinstance_string(kind)
+
+    per_pair = kind in ('taker', 'maker')
+    fees = []
+    for exchange in exchanges:
+        if per_pair:
+            fees.append({symbol: market.get(kind) for symbol, market
+                         in (exchange.markets or {}).items()})
+        else:
+            try:
+                fees.append(dict(exchange.fees['funding'][kind] or {}))
+            except (KeyError, TypeError, AttributeError) as e:
+                print("Could not read {} fees of '{}': {!r}".format(
+                    kind, exchange.id, e))
+                fees.append({})
+
+    if labels is None:
+        labels = sorted(set().union(*fees)) if fees else []
+    index = {label: i for i, label in enumerate(labels)}
+    matrix = np.full((len(exchanges), len(labels)), np.nan)
+    for row, values in enumerate(fees):
+        for label, fee in values.items():
+            col = index.get(label)
+            if col is not None and isinstance(fee, (int, float)):
+                matrix[row, col] = fee
+    return [e.id for e in exchanges], labels, matrix
+
+
+# --------- [ Downsampling ] ---------
+def _bucket_starts(n, size):
+    """Returns the start of each of at most 'size' buckets over n items."""
+    return np.unique(np.linspace(0, n, min(n, size) + 1).astype(np.intp)[:-1])
+
+
+def downsample_matrix(matrix, max_rows, max_cols, how='mean'):
+    """
+    Aggregates a matrix to at most max_rows x max_cols cells (e.g. the
+    pixel size of the image) with reduceat along both axes. NaN cells
+    are ignored; a cell of only NaN stays NaN.
+
+    :param matrix: a 2D array
+    :param how: 'mean' (e.g. the share of covered cells) or 'max'
+    :return: (aggregated matrix, row bucket starts, column bucket starts)
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    rows = _bucket_starts(matrix.shape[0], max_rows)
+    cols = _bucket_starts(matrix.shape[1], max_cols)
+    if not len(rows) or not len(cols):
+        return np.empty((len(rows), len(cols))), rows, cols
+
+    known = ~np.isnan(matrix)
+    if how == 'max':
+        filled = np.where(known, matrix, -np.inf)
+        reduced = np.maximum.reduceat(
+            np.maximum.reduceat(filled, rows, axis=0), cols, axis=1)
+        return np.where(np.isinf(reduced), np.nan, reduced), rows, cols
+
+    sums = np.add.reduceat(np.add.reduceat(np.where(known, matrix, 0.0),
+                                           rows, axis=0), cols, axis=1)
+    counts = np.add.reduceat(np.add.reduceat(known.astype(np.int64),
+                                             rows, axis=0), cols, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts, rows, cols
+
+
+# --------- [ Rendering ] ---------
+def _tick_labels(starts, labels, n):
+    """Returns tick positions and labels for bucket starts (thinned out)."""
+    step = max(1, int(np.ceil(len(starts) / MAX_TICK_LABELS)))
+    positions = np.arange(0, len(starts), step)
+    if len(starts) == n:
+        return positions, [labels[i] for i in starts[positions]]
+    # aggregated buckets are labelled with their first item
+    return positions, ['{}…'.format(labels[i]) for i in starts[positions]]
+
+
+def render_heatmap(matrix, row_labels, col_labels, path, title=None,
+                   size=(16, 6), dpi=100, how='mean', cmap='viridis',
+                   colorbar_label=None):
+    """
+    Renders a heatmap to a PNG or SVG file (chosen by the extension of
+    path) without a display. The matrix is aggregated to the pixel size
+    of the plot area first, so drawing cost doesn't depend on the
+    matrix size.
+
+    :param matrix: a 2D array (e.g. from coverage_matrix or fee_matrix)
+    :param row_labels: labels of the rows (e.g. exchange-ids)
+    :param col_labels: labels of the columns (e.g. currencies)
+    :param path: the output file (.png or .svg)
+    :param title: the title of the plot
+    :param size: figure size in inches
+    :param dpi: resolution of the image
+    :param how: aggregation of cells that share a pixel ('mean' or 'max')
+    :param cmap: a matplotlib colormap name
+    :return: path
+    """
+    check_isinstance_string(path)
+
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+
+    bbox = axes.get_position()
+    max_rows = max(1, int(bbox.height * size[1] * dpi))
+    max_cols = max(1, int(bbox.width * size[0] * dpi))
+    matrix = np.asarray(matrix)
+    image, rows, cols = downsample_matrix(matrix, max_rows, max_cols, how)
+
+    shown = axes.imshow(np.ma.masked_invalid(image), aspect='auto',
+                        interpolation='nearest', cmap=cmap)
+    colorbar = figure.colorbar(shown, ax=axes)
+    if colorbar_label:
+        colorbar.set_label(colorbar_label)
+
+    positions, labels = _tick_labels(rows, row_labels, matrix.shape[0])
+    axes.set_yticks(positions)
+    axes.set_yticklabels(labels, fontsize=7)
+    positions, labels = _tick_labels(cols, col_labels, matrix.shape[1])
+    axes.set_xticks(positions)
+    axes.set_xticklabels(labels, fontsize=7, rotation=90)
+    if title:
+        axes.set_title(title)
+
+    figure.savefig(path, dpi=dpi, bbox_inches='tight')
+    return path
+
+
+def render_coverage_heatmaps(exchanges, directory, formats=('png',),
+                             fee_kinds=('withdraw', 'taker')):
+    """
+    Renders the coverage (currencies, pairs) and fee heatmaps of the
+    exchanges in one batch.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param directory: the output directory
+    :param formats: file formats ('png', 'svg')
+    :param fee_kinds: fee matrices to render (see fee_matrix)
+    :return: a list of the written files
+    """
+    check_isinstance_list(exchanges)
+
+    os.makedirs(directory, exist_ok=True)
+    start = time.time()
+
+    jobs = []
+    for kind in ('currency', 'pair'):
+        ids, labels, matrix = coverage_matrix(exchanges, kind)
+        jobs.append(('coverage_' + kind, ids, labels, matrix, 'mean',
+                     'share listed'))
+    for kind in fee_kinds:
+        ids, labels, matrix = fee_matrix(exchanges, kind)
+        jobs.append(('fees_' + kind, ids, labels, matrix, 'max', kind + ' fee'))
+
+    written = []
+    for name, ids, labels, matrix, how, label in jobs:
+        if not matrix.size:
+            print("Skipped {}: no data.".format(name))
+            continue
+        for extension in formats:
+            path = os.path.join(directory, '{}.{}'.format(name, extension))
+            written.append(render_heatmap(
+                matrix, ids, labels, path,
+                title='{} ({} x {})'.format(name, *matrix.shape),
+                how=how, colorbar_label=label))
+
+    print("Rendered {} heatmaps in {:.2f}s.".format(len(written),
+                                                    time.time() - start))
+    return written
@@ -0,0 +1,530 @@
+from _checks import check_isinstance_string
+
+import time
+import weakref
+
+import numpy as np
+
+
+# --------- [ Quantile Sketch ] ---------
+def _p2_init(heights, positions, desired, increments):
+    """Sets the markers of sketches that just received their 5th value."""
+    heights.sort(axis=-1)
+    positions[:] = np.arange(1, 6)
+    desired[:] = 1 + 4 * increments
+
+
+def _p2_update(heights, positions, desired, increments, x):
+    """
+    One step of the P-square quantile estimator (Jain & Chlamtac) for
+    many sketches at once: 5 markers per sketch, O(1) per value.
+
+    :param heights: marker heights (sketches x 5), updated in place
+    :param positions: marker positions (sketches x 5), updated in place
+    :param desired: desired marker positions (sketches x 5)
+    :param increments: desired position increments (sketches x 5)
+    :param x: one new value per sketch
+    """
+    heights[:, 0] = np.minimum(heights[:, 0], x)
+    heights[:, 4] = np.maximum(heights[:, 4], x)
+    cell = (heights[:, 1:4] <= x[:, None]).sum(axis=1)
+    positions += np.arange(5) > cell[:, None]
+    desired += increments
+
+    rows = np.arange(len(x))
+    for i in (1, 2, 3):
+        n, q = positions, heights
+        d = desired[:, i] - n[:, i]
+        move = ((d >= 1) & (n[:, i + 1] - n[:, i] > 1)) | \
+            ((d <= -1) & (n[:, i - 1] - n[:, i] < -1))
+        if not move.any():
+            continue
+        d = np.sign(d)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            parabolic = q[:, i] + d / (n[:, i + 1] - n[:, i - 1]) * (
+                (n[:, i] - n[:, i - 1] + d) * (q[:, i + 1] - q[:, i]) /
+                (n[:, i + 1] - n[:, i]) +
+                (n[:, i + 1] - n[:, i] - d) * (q[:, i] - q[:, i - 1]) /
+                (n[:, i] - n[:, i - 1]))
+            neighbour = (i + d).astype(np.intp)
+            linear = q[:, i] + d * (q[rows, neighbour] - q[:, i]) / \
+                (n[rows, neighbour] - n[:, i])
+        inside = (q[:, i - 1] < parabolic) & (parabolic < q[:, i + 1])
+        heights[:, i] = np.where(move, np.where(inside, parabolic, linear),
+                                 q[:, i])
+        positions[:, i] += np.where(move, d, 0)
+
+
+def _p2_from_sorted(values, increments):
+    """
+    Returns P-square markers (heights, positions, desired) of sketches
+    that have seen the sorted 'values' (at least 5), with the markers at
+    the exact order statistics.
+    """
+    k = len(values)
+    desired = 1 + (k - 1) * increments
+    positions = np.rint(desired)
+    positions[:, 0], positions[:, 4] = 1, k
+    for i in (1, 2, 3):
+        positions[:, i] = np.maximum(positions[:, i], positions[:, i - 1] + 1)
+    for i in (3, 2, 1):
+        positions[:, i] = np.minimum(positions[:, i], positions[:, i + 1] - 1)
+    heights = values[positions.astype(np.intp) - 1]
+    return heights, positions, desired
+
+
+def _ewm(x, alpha, start):
+    """
+    Returns y[t] = (1 - alpha) * y[t - 1] + alpha * x[t] with
+    y[-1] = start, in blocks short enough for the powers of the decay.
+    """
+    decay = 1 - alpha
+    if decay <= 0:
+        return np.array(x, dtype=np.float64)
+    block = max(1, int(300 / -np.log10(decay)))
+    y = np.empty(len(x))
+    for lo in range(0, len(x), block):
+        part = x[lo:lo + block]
+        k = np.arange(1, len(part) + 1)
+        y[lo:lo + block] = decay ** k * (start + alpha * np.cumsum(
+            part * decay ** -k))
+        start = y[lo + len(part) - 1]
+    return y
+
+
+# --------- [ Feed Monitor ] ---------
+class FeedMonitor:
+    """
+    Online statistics of the log returns of many price feeds, one feed
+    per (exchange-id, symbol). Feeds are interned to integer ids and all
+    state lives in preallocated arrays indexed by id, so an update is a
+    handful of vectorized operations regardless of the number of feeds:
+
+    - count, mean and variance (Welford)
+    - exponentially weighted mean and variance
+    - quantiles (P-square sketches); two sketches per quantile are
+      restarted alternately every 'window' returns, the older one is
+      read, so estimates cover the last 'window' to 2 * 'window' returns
+
+    Anomalies: a price jump is a return of more than 'jump_threshold'
+    exponentially weighted standard deviations, a feed is stale if it
+    hasn't ticked for 'stale_after' ms, and it diverges if its price
+    is more than 'divergence' away from the median of the same symbol
+    at the other exchanges.
+    """
+
+    def __init__(self, capacity=1024, alpha=0.05, quantiles=(0.01, 0.5, 0.99),
+                 window=1000, jump_threshold=6.0, warmup=30,
+                 stale_after=60000, divergence=0.02):
+        self.alpha = alpha
+        self.quantiles = tuple(quantiles)
+        self.window = window
+        self.jump_threshold = jump_threshold
+        self.warmup = warmup
+        self.stale_after = stale_after
+        self.divergence = divergence
+
+        self.feeds = {}
+        self.keys = []
+        self._symbols = {}
+        # board: (exchange-ids, symbols, feed ids); entries go with the board
+        self._boards = weakref.WeakKeyDictionary()
+
+        n_q = len(self.quantiles)
+        self._increments = np.array(
+            [[0.0, p / 2, p, (1 + p) / 2, 1.0] for p in self.quantiles])
+
+        self.symbol_id = np.zeros(capacity, dtype=np.intp)
+        self.price = np.full(capacity, np.nan)
+        self.timestamp = np.zeros(capacity, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros(capacity)
+        self.m2 = np.zeros(capacity)
+        self.ewm_mean = np.zeros(capacity)
+        self.ewm_var = np.zeros(capacity)
+        self.jumps = np.zeros(capacity, dtype=np.int64)
+        self.last_return = np.full(capacity, np.nan)
+        # (feed, sketch, quantile, marker)
+        self._heights = np.zeros((capacity, 2, n_q, 5))
+        self._positions = np.zeros((capacity, 2, n_q, 5))
+        self._desired = np.zeros((capacity, 2, n_q, 5))
+        self._sketch_count = np.zeros((capacity, 2), dtype=np.int64)
+
+    _ARRAYS = ('symbol_id', 'price', 'timestamp', 'count', 'mean', 'm2',
+               'ewm_mean', 'ewm_var', 'jumps', 'last_return', '_heights',
+               '_positions', '_desired', '_sketch_count')
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def capacity(self):
+        return len(self.price)
+
+    def _grow(self):
+        capacity = 2 * self.capacity
+        for name in self._ARRAYS:
+            old = getattr(self, name)
+            grown = np.full((capacity,) + old.shape[1:],
+                            np.nan if name in ('price', 'last_return') else 0,
+                            dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def feed(self, exchange_id, symbol):
+        """Returns the id of a feed, interning it if necessary."""
+        key = (exchange_id, symbol)
+        feed = self.feeds.get(key)
+        if feed is None:
+            if len(self.keys) == self.capacity:
+                self._grow()
+            feed = len(self.keys)
+            self.feeds[key] = feed
+            self.keys.append(key)
+            self.symbol_id[feed] = self._symbols.setdefault(
+                symbol, len(self._symbols))
+        return feed
+
+    # ----- updates -----
+    def _update_sketches(self, ids, returns):
+        n_q = len(self.quantiles)
+        for sketch in (0, 1):
+            counts = self._sketch_count[ids, sketch]
+            # restart every 2 * window returns, sketch 1 shifted by window
+            restart = (self.count[ids] - 1 + sketch * self.window) % \
+                (2 * self.window) == 0
+            counts = np.where(restart, 0, counts)
+
+            filling = counts < 5
+            f_ids = ids[filling]
+            self._heights[f_ids, sketch, :, counts[filling]] = \
+                returns[filling, None]
+            ready = f_ids[counts[filling] == 4]
+            if len(ready):
+                increments = np.broadcast_to(self._increments,
+                                             (len(ready), n_q, 5))
+                h = self._heights[ready, sketch]
+                p = self._positions[ready, sketch]
+                d = self._desired[ready, sketch]
+                _p2_init(h, p, d, increments)
+                self._heights[ready, sketch] = h
+                self._positions[ready, sketch] = p
+                self._desired[ready, sketch] = d
+
+            u_ids = ids[~filling]
+            if len(u_ids):
+                h = self._heights[u_ids, sketch].reshape(-1, 5)
+                p = self._positions[u_ids, sketch].reshape(-1, 5)
+                d = self._desired[u_ids, sketch].reshape(-1, 5)
+                increments = np.tile(self._increments, (len(u_ids), 1))
+                _p2_update(h, p, d, increments,
+                           np.repeat(returns[~filling], n_q))
+                self._heights[u_ids, sketch] = h.reshape(-1, n_q, 5)
+                self._positions[u_ids, sketch] = p.reshape(-1, n_q, 5)
+                self._desired[u_ids, sketch] = d.reshape(-1, n_q, 5)
+            self._sketch_count[ids, sketch] = counts + 1
+
+    def _update_unique(self, ids, prices, timestamps):
+        """Updates feeds that occur at most once in ids."""
+        fresh = (timestamps > self.timestamp[ids]) & ~np.isnan(prices) & \
+            (prices > 0)
+        ids, prices, timestamps = ids[fresh], prices[fresh], timestamps[fresh]
+
+        previous = self.price[ids]
+        self.price[ids] = prices
+        self.timestamp[ids] = timestamps
+
+        has_return = ~np.isnan(previous)
+        ids, r = ids[has_return], np.log(prices[has_return] /
+                                         previous[has_return])
+        if not len(ids):
+            return np.empty(0, dtype=np.intp)
+        self.last_return[ids] = r
+
+        # jumps are judged against the state before this return
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = np.abs(r - self.ewm_mean[ids]) / np.sqrt(self.ewm_var[ids])
+        jump = (self.count[ids] >= self.warmup) & (z > self.jump_threshold)
+        self.jumps[ids[jump]] += 1
+
+        # Welford
+        self.count[ids] += 1
+        delta = r - self.mean[ids]
+        self.mean[ids] += delta / self.count[ids]
+        self.m2[ids] += delta * (r - self.mean[ids])
+
+        # exponentially weighted
+        first = self.count[ids] == 1
+        diff = r - self.ewm_mean[ids]
+        increment = self.alpha * diff
+        self.ewm_mean[ids] = np.where(first, r, self.ewm_mean[ids] + increment)
+        self.ewm_var[ids] = np.where(
+            first, 0.0, (1 - self.alpha) * (self.ewm_var[ids] + diff * increment))
+
+        self._update_sketches(ids, r)
+        return ids[jump]
+
+    def update(self, ids, prices, timestamps):
+        """
+        Adds price ticks. Ticks that aren't newer than the last tick of
+        their feed are ignored. Several ticks of a feed are applied in
+        rounds (one pass per tick); for the history of a feed use
+        update_series.
+
+        :param ids: array of feed ids (see feed())
+        :param prices: array of prices
+        :param timestamps: array of timestamps in ms
+        :return: array of the feed ids with a price jump
+        """
+        ids = np.asarray(ids, dtype=np.intp)
+        prices = np.asarray(prices, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+
+        # several ticks of a feed are applied in rounds, in time order
+        order = np.lexsort((timestamps, ids))
+        ids, prices, timestamps = ids[order], prices[order], timestamps[order]
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) \
+            if len(ids) else np.empty(0, dtype=np.intp)
+        rank = np.arange(len(ids)) - np.repeat(starts, np.diff(
+            np.append(starts, len(ids))))
+
+        jumps = []
+        for r in range(rank.max() + 1 if len(rank) else 0):
+            at = rank == r
+            jumps.append(self._update_unique(ids[at], prices[at],
+                                             timestamps[at]))
+        return np.concatenate(jumps) if jumps else np.empty(0, dtype=np.intp)
+
+    def update_series(self, exchange_id, symbol, prices, timestamps):
+        """
+        Adds many ticks of a single feed at once (e.g. to backfill history).
+        Gives the same statistics as update(), but without a pass per
+        tick: moments and exponentially weighted moments are computed
+        for the whole series, sketches that restart within the series
+        are rebuilt from the exact quantiles of the returns since the
+        restart.
+
+        :param prices: array of prices
+        :param timestamps: array of timestamps in ms
+        :return: array of the feed ids with a price jump
+        """
+        feed = self.feed(exchange_id, symbol)
+        prices = np.asarray(prices, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+
+        order = np.argsort(timestamps, kind='stable')
+        prices, timestamps = prices[order], timestamps[order]
+        keep = (timestamps > self.timestamp[feed]) & ~np.isnan(prices) & \
+            (prices > 0)
+        prices, timestamps = prices[keep], timestamps[keep]
+        # of equal timestamps only the first tick counts
+        first = np.r_[True, timestamps[1:] != timestamps[:-1]]
+        prices, timestamps = prices[first], timestamps[first]
+        if not len(prices):
+            return np.empty(0, dtype=np.intp)
+
+        previous = self.price[feed]
+        self.price[feed] = prices[-1]
+        self.timestamp[feed] = timestamps[-1]
+        if np.isnan(previous):
+            r = np.log(prices[1:] / prices[:-1])
+        else:
+            r = np.log(prices / np.r_[previous, prices[:-1]])
+        if not len(r):
+            return np.empty(0, dtype=np.intp)
+        self.last_return[feed] = r[-1]
+
+        # exponentially weighted moments before every return; the first
+        # return of a feed only sets them
+        n0 = int(self.count[feed])
+        if n0 == 0:
+            mean, var, rest = r[0], 0.0, r[1:]
+        else:
+            mean, var, rest = self.ewm_mean[feed], self.ewm_var[feed], r
+        mean_after = _ewm(rest, self.alpha, mean)
+        mean_before = np.r_[mean, mean_after][:-1]
+        diff = rest - mean_before
+        var_after = _ewm((1 - self.alpha) * diff * diff, self.alpha, var)
+        var_before = np.r_[var, var_after][:-1]
+        if n0 == 0:
+            mean_before = np.r_[np.nan, mean_before]
+            var_before = np.r_[np.nan, var_before]
+        self.ewm_mean[feed] = mean_after[-1] if len(rest) else mean
+        self.ewm_var[feed] = var_after[-1] if len(rest) else var
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = np.abs(r - mean_before) / np.sqrt(var_before)
+        jump = (n0 + np.arange(len(r)) >= self.warmup) & \
+            (z > self.jump_threshold)
+        n_jumps = int(jump.sum())
+        self.jumps[feed] += n_jumps
+
+        # Welford, merged with the moments of the series (Chan et al.)
+        n = n0 + len(r)
+        delta = r.mean() - self.mean[feed]
+        self.m2[feed] += ((r - r.mean()) ** 2).sum() + \
+            delta * delta * n0 * len(r) / n
+        self.mean[feed] += delta * len(r) / n
+        self.count[feed] = n
+
+        self._series_sketches(feed, n0, r)
+        return np.full(n_jumps, feed, dtype=np.intp)
+
+    def _series_sketches(self, feed, n0, r):
+        n_q = len(self.quantiles)
+        for sketch in (0, 1):
+            phase = (n0 + np.arange(len(r)) + sketch * self.window) % \
+                (2 * self.window)
+            restarts = np.flatnonzero(phase == 0)
+            heights = self._heights[feed, sketch]
+            positions = self._positions[feed, sketch]
+            desired = self._desired[feed, sketch]
+            if len(restarts) and len(r) - restarts[-1] >= 5:
+                segment = np.sort(r[restarts[-1]:])
+                heights[:], positions[:], desired[:] = _p2_from_sorted(
+                    segment, self._increments)
+                self._sketch_count[feed, sketch] = len(segment)
+                continue
+
+            # a continued sketch (less than 2 * window returns) or a
+            # restart shortly before the end: one step per return
+            if len(restarts):
+                segment, count = r[restarts[-1]:], 0
+            else:
+                segment, count = r, int(self._sketch_count[feed, sketch])
+            for x in segment:
+                if count < 5:
+                    heights[:, count] = x
+                    if count == 4:
+                        _p2_init(heights, positions, desired,
+                                 self._increments)
+                else:
+                    _p2_update(heights, positions, desired,
+                               self._increments, np.full(n_q, x))
+                count += 1
+            self._sketch_count[feed, sketch] = count
+
+    def update_from_board(self, board):
+        """
+        Adds the quotes of a QuoteBoard (mid prices) that changed since the
+        last call.
+
+        :return: array of the feed ids with a price jump
+        """
+        cached = self._boards.get(board)
+        if cached is not None and cached[0] == board.exchange_ids and \
+                cached[1] == board.symbols:
+            ids = cached[2]
+        else:
+            ids = np.array([[self.feed(e, s) for s in board.symbols]
+                            for e in board.exchange_ids], dtype=np.intp)
+            self._boards[board] = (list(board.exchange_ids),
+                                   list(board.symbols), ids)
+        quoted = board.timestamp > 0
+        return self.update(ids[quoted], board.mid[quoted],
+                           board.timestamp[quoted])
+
+    def update_from_candles(self, exchange_id, symbol, candles):
+        """
+        Adds candles (OHLCV records, e.g. from an OHLCVStore) of a feed,
+        using the close prices.
+
+        :return: array of the feed ids with a price jump
+        """
+        check_isinstance_string(exchange_id)
+        check_isinstance_string(symbol)
+
+        return self.update_series(exchange_id, symbol, candles['close'],
+                                  candles['timestamp'])
+
+    # ----- statistics -----
+    def _used(self, array):
+        return array[:len(self.keys)]
+
+    @property
+    def variance(self):
+        """Returns the sample variance of the returns of every feed."""
+        count = self._used(self.count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 1, self._used(self.m2) / (count - 1),
+                            np.nan)
+
+    @property
+    def ewm_std(self):
+        return np.sqrt(self._used(self.ewm_var))
+
+    def quantile(self, q):
+        """
+        Returns the estimated quantile q (one of 'quantiles') of the
+        returns of every feed (NaN for feeds with less than 5 returns).
+        """
+        j = self.quantiles.index(q)
+        counts = self._used(self._sketch_count)
+        older = np.argmax(counts, axis=1)
+        rows = np.arange(len(self.keys))
+        value = self._heights[rows, older, j, 2]
+        return np.where(counts[rows, older] >= 5, value, np.nan)
+
+    # ----- anomalies -----
+    def stale(self, now=None):
+        """Returns a mask of the feeds without a tick for 'stale_after' ms."""
+        if now is None:
+            now = int(time.time() * 1000)
+        timestamp = self._used(self.timestamp)
+        return (timestamp > 0) & (now - timestamp > self.stale_after)
+
+    def divergent(self):
+        """
+        Returns a mask of the feeds whose price is further than
+        'divergence' from the median price of their symbol at the other
+        exchanges (the feed itself is left out of its median).
+        """
+        price = self._used(self.price)
+        symbol = self._used(self.symbol_id)
+        known = ~np.isnan(price)
+
+        # median of the others over the sorted (symbol, price) order
+        order = np.lexsort((price, symbol))
+        order = order[known[order]]
+        s, p = symbol[order], price[order]
+        median = np.full(len(price), np.nan)
+        if len(order):
+            starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+            counts = np.diff(np.append(starts, len(s)))
+            start = np.repeat(starts, counts)
+            count = np.repeat(counts, counts)
+            rank = np.arange(len(s)) - start
+            # lower and upper middle of the count - 1 others, skipping
+            # the feed's own rank
+            others = np.maximum(count - 1, 1)
+            lower = (others - 1) // 2
+            upper = others // 2
+            single = count == 1
+            lower += (lower >= rank) & ~single
+            upper += (upper >= rank) & ~single
+            with np.errstate(invalid='ignore'):
+                median[order] = np.where(single, np.nan, (p[start + lower] +
+                                                          p[start + upper]) / 2)
+
+        with np.errstate(invalid='ignore'):
+            return np.abs(price / median - 1) > self.divergence
+
+    def anomalies(self, jumps=None, now=None):
+        """
+        Lists the current anomalies.
+
+        :param jumps: feed ids with a price jump (as returned by update)
+        :param now: current time in ms (default: now)
+        :return: a list of dictionaries (exchange, symbol, kind, price)
+        """
+        flags = []
+        for kind, ids in (('jump', np.unique(jumps if jumps is not None
+                                             else [])),
+                          ('stale', np.flatnonzero(self.stale(now))),
+                          ('divergence', np.flatnonzero(self.divergent()))):
+            for feed in ids:
+                exchange_id, symbol = self.keys[feed]
+                flags.append({'exchange': exchange_id, 'symbol': symbol,
+                              'kind': kind,
+                              'price': float(self.price[feed])})
+        return flags
@@ -0,0 +1,272 @@
+from _checks import check_isinstance_list, check_isinstance_string
+
+import hashlib
+import os
+import time
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import numpy as np
+
+
+REPULSION_BLOCK = 512   # rows of the pairwise repulsion per step
+
+
+# --------- [ Market Graph ] ---------
+class CurrencyNetwork:
+    """
+    The currency graph implied by the markets of several exchanges:
+    currencies are nodes, every market is an edge (base, quote) with the
+    exchange as attribute. For the layout, the markets of a pair at
+    several exchanges are merged into one edge weighted by the number of
+    exchanges.
+    """
+
+    def __init__(self, exchanges):
+        """
+        :param exchanges: a list of exchanges (as Exchange), markets loaded
+        """
+        check_isinstance_list(exchanges)
+
+        self.currencies = []
+        self.currency_index = {}
+        self.exchange_ids = [e.id for e in exchanges]
+        base, quote, exchange_row = [], [], []
+        for row, exchange in enumerate(exchanges):
+            for market in (exchange.markets or {}).values():
+                base.append(self._node(market['base']))
+                quote.append(self._node(market['quote']))
+                exchange_row.append(row)
+
+        # one row per market, the edge attribute is the exchange row
+        self.base = np.array(base, dtype=np.intp)
+        self.quote = np.array(quote, dtype=np.intp)
+        self.exchange = np.array(exchange_row, dtype=np.intp)
+
+        pairs = np.sort(np.stack((self.base, self.quote), axis=1), axis=1) \
+            if len(base) else np.empty((0, 2), dtype=np.intp)
+        unique, counts = np.unique(pairs, axis=0, return_counts=True)
+        self.edges = unique
+        self.weights = counts.astype(np.float64)
+
+    def _node(self, currency):
+        node = self.currency_index.get(currency)
+        if node is None:
+            node = len(self.currencies)
+            self.currency_index[currency] = node
+            self.currencies.append(currency)
+        return node
+
+    @property
+    def degree(self):
+        return np.bincount(self.edges.ravel(), minlength=len(self.currencies))
+
+    def fingerprint(self):
+        """Returns a hash of the edge set (the snapshot of the graph)."""
+        digest = hashlib.blake2b(digest_size=12)
+        names = np.array(self.currencies, dtype=object)
+        for a, b in sorted(zip(names[self.edges[:, 0]],
+                               names[self.edges[:, 1]])):
+            digest.update('{}|{};'.format(a, b).encode())
+        return digest.hexdigest()
+
+
+# --------- [ Force-Directed Layout ] ---------
+def _repulsion(positions, k):
+    """Sums the repulsive forces k^2 / d of all node pairs, block by block."""
+    displacement = np.zeros_like(positions)
+    x, y = positions[:, 0], positions[:, 1]
+    for lo in range(0, len(positions), REPULSION_BLOCK):
+        hi = lo + REPULSION_BLOCK
+        dx = x[lo:hi, None] - x[None, :]
+        dy = y[lo:hi, None] - y[None, :]
+        distance2 = dx * dx
+        distance2 += dy * dy
+        np.maximum(distance2, 1e-9, out=distance2)
+        force = np.divide(k * k, distance2, out=distance2)
+        # sum_j (p_i - p_j) f_ij = p_i sum_j f_ij - (f @ p)_i
+        total = force.sum(axis=1)
+        displacement[lo:hi, 0] = x[lo:hi] * total - force @ x
+        displacement[lo:hi, 1] = y[lo:hi] * total - force @ y
+    return displacement
+
+
+def force_layout(edges, weights, positions, iterations=50, temperature=0.1,
+                 fixed=None):
+    """
+    Fruchterman-Reingold layout with vectorized forces: repulsion between
+    all nodes (in blocks), attraction along the edges (one bincount per
+    dimension). Moves are limited by a temperature that cools linearly.
+
+    :param edges: array of node pairs (edges x 2)
+    :param weights: array of edge weights
+    :param positions: start positions (nodes x 2), updated in place
+    :param iterations: number of steps
+    :param temperature: maximal move in the first step
+    :param fixed: optional mask of nodes that must not move
+    :return: positions
+    """
+    n = len(positions)
+    if n < 2:
+        return positions
+    k = 1.0 / np.sqrt(n)
+    src, dst = edges[:, 0], edges[:, 1]
+
+    for step in range(iterations):
+        displacement = _repulsion(positions, k)
+
+        delta = positions[src] - positions[dst]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-9)
+        pull = delta * (distance * weights / k)[:, None]
+        for axis in (0, 1):
+            displacement[:, axis] -= np.bincount(src, pull[:, axis],
+                                                 minlength=n)
+            displacement[:, axis] += np.bincount(dst, pull[:, axis],
+                                                 minlength=n)
+
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        limit = temperature * (1 - step / iterations)
+        move = displacement * (np.minimum(length, limit) / length)[:, None]
+        if fixed is not None:
+            move[fixed] = 0
+        positions += move
+    return positions
+
+
+class NetworkLayout:
+    """
+    Cached layout of a CurrencyNetwork. Positions are cached per graph
+    snapshot (fingerprint of the edge set). When the graph changes, the
+    previous positions are reused: new currencies start at the mean
+    position of their placed neighbours and only a few cool iterations
+    are run, so a few listings or delistings don't reshuffle the picture.
+    With a path, the positions of the last layout are kept on disk.
+    """
+
+    def __init__(self, path=None, iterations=100, update_iterations=15,
+                 seed=0):
+        """
+        :param path: a .npz file for the last layout (optional)
+        :param iterations: steps of a full layout
+        :param update_iterations: steps after a change of the graph
+        :param seed: seed of the random start positions
+        """
+        self.path = path
+        self.iterations = iterations
+        self.update_iterations = update_iterations
+        self._random = np.random.default_rng(seed)
+        self._cache = {}
+        self._positions = {}   # currency: position of the last layout
+
+        if path is not None and os.path.exists(path):
+            with np.load(path, allow_pickle=False) as stored:
+                self._positions = dict(zip(stored['currencies'].tolist(),
+                                           stored['positions']))
+
+    def _save(self):
+        if self.path is None:
+            return
+        currencies = np.array(list(self._positions), dtype=str)
+        positions = np.array(list(self._positions.values())).reshape(-1, 2)
+        with open(self.path + '.tmp', 'wb') as f:
+            np.savez(f, currencies=currencies, positions=positions)
+        os.replace(self.path + '.tmp', self.path)
+
+    def layout(self, network):
+        """
+        Returns the positions of the currencies of a network.
+
+        :param network: a CurrencyNetwork
+        :return: array of positions (currencies x 2, in the order of
+                 network.currencies)
+        """
+        key = network.fingerprint()
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        start = time.time()
+        n = len(network.currencies)
+        positions = np.full((n, 2), np.nan)
+        for node, currency in enumerate(network.currencies):
+            previous = self._positions.get(currency)
+            if previous is not None:
+                positions[node] = previous
+
+        placed = ~np.isnan(positions[:, 0])
+        if not placed.any():
+            positions = self._random.random((n, 2))
+            iterations, temperature = self.iterations, 0.1
+        else:
+            self._place_new(network, positions, placed)
+            iterations, temperature = self.update_iterations, 0.02
+
+        force_layout(network.edges, network.weights, positions, iterations,
+                     temperature)
+        self._cache[key] = positions
+        self._positions = dict(zip(network.currencies, positions))
+        self._save()
+        print("Layout of {} currencies ({} new) in {:.2f}s.".format(
+            n, int((~placed).sum()), time.time() - start))
+        return positions
+
+    def _place_new(self, network, positions, placed):
+        """Puts new nodes at the mean of their placed neighbours."""
+        src, dst = network.edges[:, 0], network.edges[:, 1]
+        n = len(positions)
+        filled = np.where(placed[:, None], positions, 0.0)
+        sums = np.zeros((n, 2))
+        counts = np.zeros(n)
+        for a, b in ((src, dst), (dst, src)):
+            known = placed[b]
+            for axis in (0, 1):
+                sums[:, axis] += np.bincount(a[known], filled[b[known], axis],
+                                             minlength=n)
+            counts += np.bincount(a[known], minlength=n)
+
+        new = ~placed
+        jitter = self._random.normal(0, 0.01, (int(new.sum()), 2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            around = sums[new] / counts[new][:, None]
+        centre = np.nanmean(positions[placed], axis=0)
+        around = np.where(np.isnan(around), centre, around)
+        positions[new] = around + jitter
+
+
+# --------- [ Rendering ] ---------
+def render_network(network, positions, path, labels=30, size=(12, 12),
+                   dpi=100, title=None):
+    """
+    Renders a currency network to a PNG or SVG file without a display.
+    Edge width follows the number of exchanges listing the pair, node
+    size the number of pairs of the currency.
+
+    :param network: a CurrencyNetwork
+    :param positions: positions from NetworkLayout.layout
+    :param path: the output file (.png or .svg)
+    :param labels: number of currencies (by degree) that get a label
+    :return: path
+    """
+    check_isinstance_string(path)
+
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+    axes.set_axis_off()
+
+    segments = positions[network.edges]
+    widths = 0.3 + 0.4 * np.log1p(network.weights)
+    axes.add_collection(LineCollection(segments, linewidths=widths,
+                                       colors='tab:gray', alpha=0.3))
+    degree = network.degree
+    axes.scatter(positions[:, 0], positions[:, 1], s=4 + 4 * np.sqrt(degree),
+                 c=np.log1p(degree), cmap='viridis', zorder=2)
+    for node in np.argsort(-degree)[:labels]:
+        axes.annotate(network.currencies[node], positions[node], fontsize=7,
+                      zorder=3)
+    axes.autoscale()
+    if title:
+        axes.set_title(title)
+    figure.savefig(path, dpi=dpi, bbox_inches='tight')
+    return path
@@ -0,0 +1,174 @@
+from _async import to_async_exchanges, close_async_exchanges, \
+    exchange_semaphores, gather_reporting
+from _checks import check_isinstance_exchange, check_isinstance_string, \
+    check_isinstance_list
+from pairs import get_all_mutual_pairs_at_exchanges
+
+import asyncio
+import time
+
+from ccxt.base.exchange import Exchange
+
+
+# OHLCV candles are lists of [timestamp (ms), open, high, low, close, volume].
+# A storage used for ingestion (e.g. storage.OHLCVStore) needs to provide:
+#   storage.last_timestamp(exchange_id, symbol, timeframe) -> int or None
+#   storage.append(exchange_id, symbol, timeframe, candles)
+
+
+# --------- [ Timeframes ] ---------
+def timeframe_to_ms(timeframe):
+    """Returns the duration of a timeframe (e.g. '1m', '1h') in ms."""
+    check_isinstance_string(timeframe)
+    return Exchange.parse_timeframe(timeframe) * 1000
+
+
+def supports_ohlcv(exchange, timeframe=None):
+    """Checks whether the exchange provides OHLCV data (for a timeframe)."""
+    if not exchange.has.get('fetchOHLCV'):
+        return False
+    if timeframe is not None and exchange.timeframes:
+        return timeframe in exchange.timeframes
+    return True
+
+
+# --------- [ Pagination ] ---------
+async def paginate_ohlcv(exchange, symbol, timeframe='1m', since=None,
+                         until=None, limit=None, semaphore=None):
+    """
+    Pages through the candles of a series by moving the 'since' cursor
+    past the last received candle. Batches are yielded as they arrive,
+    so whole histories are never held in memory.
+    Candles that are not closed yet are never yielded.
+
+    :param exchange: an async exchange (ccxt.async_support)
+    :param symbol: a trading-pair (as str)
+    :param timeframe: a timeframe (as str)
+    :param since: first candle in ms (None: exchange default)
+    :param until: last candle in ms (None: up to now)
+    :param limit: candles per request (None: exchange default)
+    :param semaphore: limits the concurrent requests to the exchange
+    :return: async generator of candle batches
+    """
+    step = timeframe_to_ms(timeframe)
+
+    while True:
+        if semaphore is None:
+            batch = await exchange.fetch_ohlcv(symbol, timeframe, since, limit)
+        else:
+            async with semaphore:
+                batch = await exchange.fetch_ohlcv(symbol, timeframe,
+                                                   since, limit)
+
+        closed_before = int(time.time() * 1000) - step
+        if until is not None:
+            closed_before = min(closed_before, until)
+
+        last = batch[-1][0] if batch else None
+        if since is not None:
+            batch = [c for c in batch
+                     if since <= c[0] <= closed_before]
+        else:
+            batch = [c for c in batch if c[0] <= closed_before]
+
+        if not batch:
+            return
+        yield batch
+
+        if last is None or last >= closed_before:
+            return
+        since = batch[-1][0] + step
+
+
+async def ingest_ohlcv_series(exchange, symbol, storage, timeframe='1m',
+                              since=None, until=None, limit=None,
+                              semaphore=None):
+    """
+    Fetches a single series into the storage. The download resumes
+    after the last candle that is already stored.
+
+    :param exchange: an async exchange (ccxt.async_support)
+    :param symbol: a trading-pair (as str)
+    :param storage: the storage the candles are appended to
+    :return: number of stored candles
+    """
+    last = storage.last_timestamp(exchange.id, symbol, timeframe)
+    if last is not None:
+        resume = last + timeframe_to_ms(timeframe)
+        since = resume if since is None else max(since, resume)
+
+    stored = 0
+    async for batch in paginate_ohlcv(exchange, symbol, timeframe, since,
+                                      until, limit, semaphore):
+        storage.append(exchange.id, symbol, timeframe, batch)
+        stored += len(batch)
+    return stored
+
+
+# --------- [ Ingestion ] ---------
+async def ingest_ohlcv_async(exchanges, symbols, storage, timeframe='1m',
+                             since=None, until=None, limit=None,
+                             concurrency=3):
+    """
+    Fetches all (exchange, symbol) series concurrently. Every exchange
+    gets its own request limit (concurrency) on top of ccxt's rate
+    limiter, so slow exchanges don't hold back the fast ones.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param symbols: a list of trading-pairs (as str)
+    :param storage: the storage the candles are appended to
+    :param concurrency: concurrent requests per exchange
+    :return: dictionary of (exchange-id, symbol): number of stored candles
+    """
+    check_isinstance_list(exchanges)
+    check_isinstance_list(symbols)
+
+    async_exchanges = to_async_exchanges(exchanges)
+    semaphores = exchange_semaphores(async_exchanges, concurrency)
+
+    jobs = {}
+    for exchange in async_exchanges:
+        if not supports_ohlcv(exchange, timeframe):
+            print("No OHLCV data for {} ({})".format(exchange.id, timeframe))
+            continue
+        for symbol in symbols:
+            if symbol in exchange.markets:
+                jobs[(exchange.id, symbol)] = ingest_ohlcv_series(
+                    exchange, symbol, storage, timeframe, since, until,
+                    limit, semaphores[exchange.id])
+
+    try:
+        return await gather_reporting(jobs)
+    finally:
+        await close_async_exchanges(async_exchanges)
+
+
+def ingest_ohlcv(exchanges, symbols, storage, timeframe='1m', since=None,
+                 until=None, limit=None, concurrency=3):
+    """Blocking wrapper around ingest_ohlcv_async."""
+    start = time.time()
+    stored = asyncio.run(ingest_ohlcv_async(
+        exchanges, symbols, storage, timeframe, since, until, limit,
+        concurrency))
+    print("Stored {} candles of {} series in {:.2f}s.".format(
+        sum(stored.values()), len(stored), time.time() - start))
+    return stored
+
+
+def backfill_mutual_pairs(exchanges, storage, timeframe='1m', since=None,
+                          until=None, limit=None, concurrency=3):
+    """
+    Backfills the candles of all pairs that are available at every
+    one of the given exchanges.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param storage: the storage the candles are appended to
+    :return: dictionary of (exchange-id, symbol): number of stored candles
+    """
+    check_isinstance_list(exchanges)
+    for exchange in exchanges:
+        check_isinstance_exchange(exchange)
+
+    symbols = sorted(get_all_mutual_pairs_at_exchanges(exchanges))
+    return ingest_ohlcv(exchanges, symbols, storage, timeframe, since,
+                        until, limit, concurrency)
@@ -0,0 +1,281 @@
+from _async import to_async_exchanges, close_async_exchanges, \
+    exchange_semaphores, gather_reporting
+from _checks import check_isinstance_string, check_isinstance_list
+from pairs import get_all_mutual_pairs_at_exchanges
+
+import asyncio
+import time
+
+import ccxt
+import numpy as np
+
+
+PRICE, SIZE = 0, 1
+
+
+# --------- [ Order Book Pool ] ---------
+class OrderBookPool:
+    """
+    Fixed-depth order books of many (exchange, symbol) pairs, stored in
+    preallocated arrays of shape (slots, depth, 2) for bids and asks
+    ([..., 0] is the price, [..., 1] the size). Missing levels are NaN.
+    A slot is assigned once per pair and overwritten by every snapshot,
+    so steady-state capture doesn't allocate.
+    """
+
+    def __init__(self, depth=20, capacity=256):
+        self.depth = depth
+        self.slots = {}
+        self.keys = []
+
+        self.bids = np.full((capacity, depth, 2), np.nan)
+        self.asks = np.full((capacity, depth, 2), np.nan)
+        self.bid_levels = np.zeros(capacity, dtype=np.int32)
+        self.ask_levels = np.zeros(capacity, dtype=np.int32)
+        self.timestamp = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def capacity(self):
+        return len(self.timestamp)
+
+    def _grow(self):
+        capacity = 2 * self.capacity
+        for name in ('bids', 'asks'):
+            grown = np.full((capacity, self.depth, 2), np.nan)
+            grown[:self.capacity] = getattr(self, name)
+            setattr(self, name, grown)
+        for name in ('bid_levels', 'ask_levels', 'timestamp'):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def slot(self, exchange_id, symbol):
+        """Returns the slot of a pair, assigning a new one if necessary."""
+        key = (exchange_id, symbol)
+        slot = self.slots.get(key)
+        if slot is None:
+            if len(self.keys) == self.capacity:
+                self._grow()
+            slot = len(self.keys)
+            self.slots[key] = slot
+            self.keys.append(key)
+        return slot
+
+    def _write_side(self, levels, out, counts, slot):
+        n = min(len(levels), self.depth)
+        if n:
+            if len(levels[0]) != 2:
+                # some exchanges add an order count or id per level
+                levels = [level[:2] for level in levels[:n]]
+            out[slot, :n] = levels[:n]
+        out[slot, n:] = np.nan
+        counts[slot] = n
+
+    def write(self, exchange_id, symbol, book):
+        """
+        Writes a ccxt order book into the slot of the pair.
+
+        :param exchange_id: an exchange-id (as str)
+        :param symbol: a trading-pair (as str)
+        :param book: an order book (as returned by fetch_order_book)
+        :return: the slot
+        """
+        slot = self.slot(exchange_id, symbol)
+        self._write_side(book['bids'], self.bids, self.bid_levels, slot)
+        self._write_side(book['asks'], self.asks, self.ask_levels, slot)
+        self.timestamp[slot] = book.get('timestamp') or int(time.time() * 1000)
+        return slot
+
+    def book(self, exchange_id, symbol):
+        """Returns views (bids, asks) of the filled levels of a pair."""
+        check_isinstance_string(exchange_id)
+        check_isinstance_string(symbol)
+
+        slot = self.slots[(exchange_id, symbol)]
+        return (self.bids[slot, :self.bid_levels[slot]],
+                self.asks[slot, :self.ask_levels[slot]])
+
+    def slots_of_symbol(self, symbol):
+        """Returns the slots and exchange-ids of a symbol."""
+        slots, exchange_ids = [], []
+        for (exchange_id, s), slot in self.slots.items():
+            if s == symbol:
+                slots.append(slot)
+                exchange_ids.append(exchange_id)
+        return np.array(slots, dtype=np.intp), exchange_ids
+
+    # ----- vectorized views over all slots -----
+    def _used(self, array):
+        return array[:len(self.keys)]
+
+    @property
+    def best_bid(self):
+        return self._used(self.bids)[:, 0, PRICE]
+
+    @property
+    def best_ask(self):
+        return self._used(self.asks)[:, 0, PRICE]
+
+    @property
+    def mid(self):
+        return (self.best_bid + self.best_ask) / 2
+
+    @property
+    def spread(self):
+        """Relative spread of every book."""
+        return (self.best_ask - self.best_bid) / self.mid
+
+    def cumulative_depth(self, notional=False):
+        """
+        Returns the cumulative size (or notional) per level of all books
+        as arrays of shape (books, depth) for bids and asks.
+        """
+        bids, asks = self._used(self.bids), self._used(self.asks)
+        if notional:
+            bid_depth = bids[..., PRICE] * bids[..., SIZE]
+            ask_depth = asks[..., PRICE] * asks[..., SIZE]
+        else:
+            bid_depth, ask_depth = bids[..., SIZE], asks[..., SIZE]
+        return (np.nancumsum(bid_depth, axis=1),
+                np.nancumsum(ask_depth, axis=1))
+
+    def depth_within(self, pct, notional=False):
+        """
+        Returns the liquidity within pct (e.g. 0.01 for 1%) of the mid
+        price for every book.
+
+        :return: arrays (bid depth, ask depth) with one value per book
+        """
+        bids, asks = self._used(self.bids), self._used(self.asks)
+        mid = self.mid[:, None]
+
+        bid_mask = bids[..., PRICE] >= mid * (1 - pct)
+        ask_mask = asks[..., PRICE] <= mid * (1 + pct)
+        bid_size, ask_size = bids[..., SIZE], asks[..., SIZE]
+        if notional:
+            bid_size = bid_size * bids[..., PRICE]
+            ask_size = ask_size * asks[..., PRICE]
+        return (np.where(bid_mask, bid_size, 0).sum(axis=1),
+                np.where(ask_mask, ask_size, 0).sum(axis=1))
+
+
+# --------- [ Depth Aggregation ] ---------
+def aggregate_levels(levels, bucket, side='bids'):
+    """
+    Groups the levels of one side of a book into price buckets of a fixed
+    width. Bids are rounded down, asks up, so a bucket never looks better
+    than the levels it contains.
+
+    :param levels: array of (price, size) levels, sorted like the book
+    :param bucket: the bucket width in quote currency
+    :param side: 'bids' or 'asks'
+    :return: arrays (bucket prices, sizes, cumulative sizes)
+    """
+    levels = levels[~np.isnan(levels[:, PRICE])]
+    if not len(levels):
+        empty = np.empty(0)
+        return empty, empty, empty
+
+    if side == 'bids':
+        buckets = np.floor(levels[:, PRICE] / bucket)
+    else:
+        buckets = np.ceil(levels[:, PRICE] / bucket)
+
+    # books are sorted, so equal buckets are consecutive
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    sizes = np.add.reduceat(levels[:, SIZE], starts)
+    return buckets[starts] * bucket, sizes, np.cumsum(sizes)
+
+
+# --------- [ Collector ] ---------
+class OrderBookCollector:
+    """
+    Captures the order books of many pairs concurrently into an
+    OrderBookPool. The async exchanges are kept open between cycles;
+    call close() when done.
+    """
+
+    def __init__(self, exchanges, symbols=None, depth=20, concurrency=3):
+        """
+        :param exchanges: a list of exchanges (as Exchange), markets loaded
+        :param symbols: a list of symbols (None: all mutual pairs)
+        :param depth: levels per side that are kept
+        :param concurrency: concurrent requests per exchange
+        """
+        check_isinstance_list(exchanges)
+
+        if symbols is None:
+            symbols = sorted(get_all_mutual_pairs_at_exchanges(exchanges))
+        self.symbols = {e.id: [s for s in symbols if s in e.markets]
+                        for e in exchanges}
+        self.pool = OrderBookPool(depth, max(1, sum(
+            len(s) for s in self.symbols.values())))
+        self.concurrency = concurrency
+
+        # assign the slots up front, so the pool has a stable layout
+        for exchange_id, exchange_symbols in self.symbols.items():
+            for symbol in exchange_symbols:
+                self.pool.slot(exchange_id, symbol)
+
+        self._exchanges = to_async_exchanges(exchanges)
+        self._semaphores = None
+        self._limits = {}
+
+    async def _fetch(self, exchange, symbol):
+        limit = self._limits.get(exchange.id, self.pool.depth)
+        async with self._semaphores[exchange.id]:
+            try:
+                book = await exchange.fetch_order_book(symbol, limit)
+            except (ccxt.BadRequest, ccxt.ArgumentsRequired):
+                if limit is None:
+                    raise
+                # the exchange only accepts specific limits, use its default
+                self._limits[exchange.id] = None
+                book = await exchange.fetch_order_book(symbol)
+        self.pool.write(exchange.id, symbol, book)
+
+    async def _collect_exchange(self, exchange):
+        symbols = self.symbols[exchange.id]
+        results = await asyncio.gather(
+            *[self._fetch(exchange, s) for s in symbols],
+            return_exceptions=True)
+        return sum(1 for r in results if not isinstance(r, BaseException))
+
+    async def collect(self):
+        """
+        Runs one capture cycle over all exchanges.
+
+        :return: dictionary of exchange-id: number of captured books
+        """
+        if self._semaphores is None:
+            self._semaphores = exchange_semaphores(self._exchanges,
+                                                   self.concurrency)
+        return await gather_reporting(
+            {e.id: self._collect_exchange(e) for e in self._exchanges})
+
+    async def close(self):
+        await close_async_exchanges(self._exchanges)
+
+
+def collect_order_books(exchanges, symbols=None, depth=20, concurrency=3):
+    """
+    Captures the order books of the given exchanges once.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param symbols: a list of symbols (None: all mutual pairs)
+    :return: an OrderBookPool
+    """
+    async def run():
+        collector = OrderBookCollector(exchanges, symbols, depth,
+                                       concurrency)
+        try:
+            await collector.collect()
+        finally:
+            await collector.close()
+        return collector.pool
+
+    return asyncio.run(run())
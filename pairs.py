@@ -1,5 +1,4 @@
 from currencies import *
-from exchange import *
 
 
 # --------- [ Pair Available ] ---------
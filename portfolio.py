@@ -0,0 +1,204 @@
+from _checks import check_isinstance_list, check_isinstance_string
+from pairs import get_pairs_by_currency_at_exchange
+
+import warnings
+
+import numpy as np
+
+
+BRIDGE_CURRENCIES = ('BTC', 'ETH', 'USDT', 'USDC', 'USD', 'EUR')
+
+
+# --------- [ Cross Rates ] ---------
+class CrossRateTable:
+    """
+    Value of one unit of every currency at every exchange in a reference
+    currency (exchange x currency), derived from the mid prices of a
+    QuoteBoard. Conversion paths are made of the pairs with the reference
+    currency or a bridge currency (BTC, ETH, ...).
+
+    The table is computed with vectorized passes over all conversion
+    pairs and cached per board version, so valuing many portfolios
+    against the same price snapshot costs one lookup each.
+    """
+
+    def __init__(self, exchanges, board, reference='USDT',
+                 bridges=BRIDGE_CURRENCIES, max_hops=3, fallback=True):
+        """
+        :param exchanges: a list of exchanges (as Exchange), markets loaded
+        :param board: a QuoteBoard with the pairs of the exchanges
+        :param reference: the currency values are expressed in (as str)
+        :param bridges: currencies that may be used as intermediate step
+        :param max_hops: maximal number of pairs of a conversion path
+        :param fallback: currencies without a path at an exchange use the
+                         median rate of the other exchanges
+        """
+        check_isinstance_list(exchanges)
+        check_isinstance_string(reference)
+
+        self.board = board
+        self.reference = reference
+        self.max_hops = max_hops
+        self.fallback = fallback
+        self.exchange_ids = list(board.exchange_ids)
+
+        self.currencies = [reference]
+        self.currency_index = {reference: 0}
+        rows, bases, quotes, cols = [], [], [], []
+
+        for exchange in exchanges:
+            row = board.exchange_index.get(exchange.id)
+            if row is None:
+                continue
+            symbols = set()
+            for currency in (reference,) + tuple(bridges):
+                symbols.update(
+                    get_pairs_by_currency_at_exchange(exchange, currency))
+            for symbol in sorted(symbols):
+                col = board.symbol_index.get(symbol)
+                if col is None:
+                    continue
+                market = exchange.markets[symbol]
+                rows.append(row)
+                bases.append(self._currency(market['base']))
+                quotes.append(self._currency(market['quote']))
+                cols.append(col)
+
+        for exchange in exchanges:
+            for currency in exchange.currencies or ():
+                self._currency(currency)
+
+        self._rows = np.array(rows, dtype=np.intp)
+        self._bases = np.array(bases, dtype=np.intp)
+        self._quotes = np.array(quotes, dtype=np.intp)
+        self._cols = np.array(cols, dtype=np.intp)
+
+        self._version = None
+        self._rates = None
+
+    def _currency(self, currency):
+        index = self.currency_index.get(currency)
+        if index is None:
+            index = len(self.currencies)
+            self.currency_index[currency] = index
+            self.currencies.append(currency)
+        return index
+
+    def _compute(self):
+        rates = np.full((len(self.exchange_ids), len(self.currencies)),
+                        np.nan)
+        rates[:, 0] = 1.0
+        mid = self.board.mid[self._rows, self._cols]
+
+        # every pass extends the known rates by one pair
+        for _ in range(self.max_hops):
+            base_rate = rates[self._rows, self._bases]
+            quote_rate = rates[self._rows, self._quotes]
+
+            known_quote = np.isnan(base_rate) & ~np.isnan(quote_rate) & \
+                ~np.isnan(mid)
+            known_base = np.isnan(quote_rate) & ~np.isnan(base_rate) & \
+                ~np.isnan(mid)
+            if not known_quote.any() and not known_base.any():
+                break
+            rates[self._rows[known_quote], self._bases[known_quote]] = \
+                mid[known_quote] * quote_rate[known_quote]
+            with np.errstate(divide='ignore'):
+                rates[self._rows[known_base], self._quotes[known_base]] = \
+                    base_rate[known_base] / mid[known_base]
+
+        if self.fallback and len(self.exchange_ids) > 1:
+            missing = np.isnan(rates)
+            if missing.any():
+                with warnings.catch_warnings():
+                    # currencies without any rate stay NaN
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    median = np.nanmedian(rates, axis=0)
+                rates = np.where(missing, median[None, :], rates)
+        return rates
+
+    def rates(self):
+        """Returns the rate table, recomputed only for a new board version."""
+        if self._rates is None or self._version != self.board.version:
+            self._rates = self._compute()
+            self._version = self.board.version
+        return self._rates
+
+    def rate(self, exchange_id, currency):
+        """Returns the value of one unit of a currency at an exchange."""
+        check_isinstance_string(exchange_id)
+        check_isinstance_string(currency)
+
+        index = self.currency_index.get(currency)
+        if index is None:
+            return float('nan')
+        return float(self.rates()[self.board.exchange_index[exchange_id],
+                                  index])
+
+
+# --------- [ Valuation ] ---------
+def positions_to_arrays(table, holdings):
+    """
+    Converts holdings into position arrays of a CrossRateTable. Exchanges
+    and currencies the table doesn't know get the index -1 (valued NaN);
+    the table is left unchanged.
+
+    :param table: a CrossRateTable
+    :param holdings: nested dictionary (exchange-id: currency: amount)
+    :return: arrays (exchange rows, currency columns, amounts)
+    """
+    rows, cols, amounts = [], [], []
+    for exchange_id, balances in holdings.items():
+        row = table.board.exchange_index.get(exchange_id, -1)
+        for currency, amount in balances.items():
+            rows.append(row)
+            cols.append(table.currency_index.get(currency, -1))
+            amounts.append(amount)
+    return (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp),
+            np.array(amounts, dtype=np.float64))
+
+
+def value_positions(table, rows, cols, amounts):
+    """
+    Values position arrays in the reference currency with a single
+    gather from the rate table. Unknown exchanges and currencies (index
+    -1) are NaN.
+    """
+    rates = table.rates()
+    known = (rows >= 0) & (rows < rates.shape[0]) & \
+        (cols >= 0) & (cols < rates.shape[1])
+    values = np.full(len(amounts), np.nan)
+    values[known] = rates[rows[known], cols[known]] * amounts[known]
+    return values
+
+
+def value_portfolios(table, portfolios):
+    """
+    Values many portfolios against the current price snapshot.
+
+    :param table: a CrossRateTable
+    :param portfolios: dictionary of name: holdings
+                       (exchange-id: currency: amount)
+    :return: dictionary of name: (total value, number of positions
+             without a rate, which are left out of the total)
+    """
+    names = list(portfolios)
+    rows, cols, amounts, owners = [], [], [], []
+    for i, name in enumerate(names):
+        r, c, a = positions_to_arrays(table, portfolios[name])
+        rows.append(r)
+        cols.append(c)
+        amounts.append(a)
+        owners.append(np.full(len(a), i, dtype=np.intp))
+    if not names:
+        return {}
+
+    owners = np.concatenate(owners)
+    values = value_positions(table, np.concatenate(rows),
+                             np.concatenate(cols), np.concatenate(amounts))
+    priced = ~np.isnan(values)
+    totals = np.bincount(owners[priced], values[priced],
+                         minlength=len(names))
+    unpriced = np.bincount(owners[~priced], minlength=len(names))
+    return {name: (float(totals[i]), int(unpriced[i]))
+            for i, name in enumerate(names)}
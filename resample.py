@@ -0,0 +1,171 @@
+from ohlcv import timeframe_to_ms
+from storage import OHLCV_DTYPE
+
+import numpy as np
+
+
+# Buckets are aligned to multiples of the period since the epoch (UTC),
+# e.g. '1d' candles start at midnight UTC.
+
+
+# --------- [ Vectorized Rollups ] ---------
+def _bucket_bounds(buckets):
+    """Returns the first and last index of every run of equal buckets."""
+    starts = np.flatnonzero(np.diff(buckets)) + 1
+    starts = np.concatenate(([0], starts))
+    ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+    return starts, ends
+
+
+def resample_ohlcv(records, timeframe):
+    """
+    Rolls candles up to a higher timeframe with one reduction per column
+    over the time buckets (no Python loop over candles). The last bucket
+    is returned as well, even if it is not complete yet.
+
+    :param records: OHLCV records sorted by timestamp
+    :param timeframe: the target timeframe (as str, e.g. '1h')
+    :return: OHLCV records of the target timeframe
+    """
+    period = timeframe_to_ms(timeframe)
+    records = np.asarray(records, dtype=OHLCV_DTYPE)
+    if not len(records):
+        return np.empty(0, dtype=OHLCV_DTYPE)
+
+    buckets = records['timestamp'] - records['timestamp'] % period
+    starts, ends = _bucket_bounds(buckets)
+
+    out = np.empty(len(starts), dtype=OHLCV_DTYPE)
+    out['timestamp'] = buckets[starts]
+    out['open'] = records['open'][starts]
+    out['close'] = records['close'][ends]
+    out['high'] = np.fmax.reduceat(records['high'], starts)
+    out['low'] = np.fmin.reduceat(records['low'], starts)
+    out['volume'] = np.add.reduceat(np.nan_to_num(records['volume']), starts)
+    return out
+
+
+def combine_ohlcv(series, timeframe):
+    """
+    Combines the candles of the same pair at several exchanges into one
+    series. Every series is rolled up to the timeframe first, afterwards
+    high/low are the extremes, volume is the sum and open/close are
+    volume-weighted over the exchanges of each bucket.
+
+    :param series: a list of OHLCV record arrays (one per exchange)
+    :param timeframe: the target timeframe (as str)
+    :return: OHLCV records
+    """
+    parts = [resample_ohlcv(s, timeframe) for s in series if len(s)]
+    if not parts:
+        return np.empty(0, dtype=OHLCV_DTYPE)
+
+    records = np.concatenate(parts)
+    records = records[np.argsort(records['timestamp'], kind='stable')]
+    starts, _ = _bucket_bounds(records['timestamp'])
+
+    volume = np.nan_to_num(records['volume'])
+    total = np.add.reduceat(volume, starts)
+    count = np.diff(np.append(starts, len(records)))
+    # buckets without any volume fall back to an equally weighted mean
+    weights = np.where(np.repeat(total, count) > 0, volume, 1.0)
+    norm = np.where(total > 0, total, count)
+
+    out = np.empty(len(starts), dtype=OHLCV_DTYPE)
+    out['timestamp'] = records['timestamp'][starts]
+    out['open'] = np.add.reduceat(records['open'] * weights, starts) / norm
+    out['close'] = np.add.reduceat(records['close'] * weights, starts) / norm
+    out['high'] = np.fmax.reduceat(records['high'], starts)
+    out['low'] = np.fmin.reduceat(records['low'], starts)
+    out['volume'] = total
+    return out
+
+
+# --------- [ Incremental Rollups ] ---------
+class Resampler:
+    """
+    Keeps the rollups of a single series up to date while new candles
+    arrive. Only the new candles and the still open bucket of every
+    target timeframe are touched per update, history is never recomputed.
+    """
+
+    def __init__(self, source='1m', targets=('5m', '1h', '1d')):
+        self.source = source
+        self.targets = tuple(targets)
+        self._step = timeframe_to_ms(source)
+        self._periods = {t: timeframe_to_ms(t) for t in self.targets}
+        self._open = {t: np.empty(0, dtype=OHLCV_DTYPE) for t in self.targets}
+        self.last_timestamp = None
+
+    def open_candle(self, timeframe):
+        """Returns the not yet complete candle of a timeframe (or None)."""
+        candle = self._open[timeframe]
+        return candle[0] if len(candle) else None
+
+    def update(self, records):
+        """
+        Adds new source candles.
+
+        :param records: OHLCV records of the source timeframe, sorted
+        :return: dictionary of timeframe: newly completed OHLCV records
+        """
+        records = np.asarray(records, dtype=OHLCV_DTYPE)
+        if self.last_timestamp is not None:
+            records = records[records['timestamp'] > self.last_timestamp]
+
+        done = {}
+        if not len(records):
+            for timeframe in self.targets:
+                done[timeframe] = np.empty(0, dtype=OHLCV_DTYPE)
+            return done
+
+        last = int(records['timestamp'][-1])
+        for timeframe in self.targets:
+            period = self._periods[timeframe]
+            # the open candle starts at its bucket, so it simply joins
+            # the bucket reduction of the new candles
+            rolled = resample_ohlcv(
+                np.concatenate((self._open[timeframe], records)), timeframe)
+
+            if rolled['timestamp'][-1] + period <= last + self._step:
+                done[timeframe] = rolled
+                self._open[timeframe] = rolled[:0].copy()
+            else:
+                done[timeframe] = rolled[:-1]
+                self._open[timeframe] = rolled[-1:].copy()
+
+        self.last_timestamp = last
+        return done
+
+
+def update_rollups(store, exchange_id, symbol, source='1m',
+                   targets=('5m', '1h', '1d'), resampler=None):
+    """
+    Appends the completed higher timeframe candles of a stored series
+    to the store. Pass the returned resampler on the next call; without
+    one, the state is restored from the store (only the open buckets
+    are recomputed).
+
+    :param store: an OHLCVStore
+    :param exchange_id: an exchange-id (as str)
+    :param symbol: a trading-pair (as str)
+    :return: the resampler
+    """
+    if resampler is None:
+        resampler = Resampler(source, targets)
+        # resume after the oldest completed rollup of any target
+        resume = None
+        for timeframe in resampler.targets:
+            last = store.last_timestamp(exchange_id, symbol, timeframe)
+            start = 0 if last is None else last + resampler._periods[timeframe]
+            resume = start if resume is None else min(resume, start)
+        records = store.read(exchange_id, symbol, source, start=resume)
+    else:
+        start = resampler.last_timestamp
+        records = store.read(exchange_id, symbol, source,
+                             start=None if start is None else start + 1)
+
+    for timeframe, rolled in resampler.update(records).items():
+        if len(rolled):
+            store.append(exchange_id, symbol, timeframe, rolled)
+    return resampler
@@ -0,0 +1,286 @@
+from ohlcv import ingest_ohlcv_series
+
+import asyncio
+import heapq
+import itertools
+import time
+
+import ccxt
+
+
+_STOP = object()
+
+
+# --------- [ Poll Items ] ---------
+class PollItem:
+    """
+    Something that should be kept fresh: 'job' is a coroutine function
+    (without arguments) that is run about every 'interval' seconds.
+    Lower numbers mean higher priority; items with a priority of at least
+    the scheduler's 'shed_priority' are skipped when it is under pressure.
+    Items of the same exchange share its request limit.
+    """
+
+    def __init__(self, name, job, interval, priority=1, exchange_id=None):
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self.priority = priority
+        self.exchange_id = exchange_id
+
+        self.last_success = None
+        self.runs = 0
+        self.skips = 0
+        self.failures = 0
+
+    def staleness(self, now):
+        """Returns the seconds since the last successful run (or None)."""
+        if self.last_success is None:
+            return None
+        return now - self.last_success
+
+    def __repr__(self):
+        return "PollItem({!r}, every {}s, priority {})".format(
+            self.name, self.interval, self.priority)
+
+
+def poll_markets(exchange, interval=3600, priority=3):
+    """Reloads the markets of an async exchange."""
+    async def job():
+        return await exchange.load_markets(reload=True)
+    return PollItem('markets:{}'.format(exchange.id), job, interval,
+                    priority, exchange.id)
+
+
+def poll_tickers(collector, interval=5, priority=0):
+    """Runs the cycles of a tickers.TickerCollector."""
+    return PollItem('tickers', collector.collect, interval, priority)
+
+
+def poll_order_books(collector, interval=10, priority=1):
+    """Runs the cycles of an orderbook.OrderBookCollector."""
+    return PollItem('order_books', collector.collect, interval, priority)
+
+
+def poll_ohlcv(exchange, symbol, storage, timeframe='1m', interval=60,
+               priority=2):
+    """Appends the new candles of a series of an async exchange."""
+    async def job():
+        return await ingest_ohlcv_series(exchange, symbol, storage, timeframe)
+    return PollItem('ohlcv:{}:{}:{}'.format(exchange.id, symbol, timeframe),
+                    job, interval, priority, exchange.id)
+
+
+# --------- [ Scheduler ] ---------
+class PollingScheduler:
+    """
+    Long running scheduler that keeps poll items fresh.
+
+    - Items are run when their interval is due, in order of priority.
+      An item is never run twice at the same time.
+    - Backpressure: results are handed to consumers through a bounded
+      queue. When it is full, runs wait before they are rescheduled and
+      no more than 'max_tasks' runs are in flight.
+    - Degradation: low priority items are skipped while the exchange is
+      at its request limit, backing off after a rate limit error or while
+      the result queue is full. Other items of a backing off exchange
+      wait until the backoff ends.
+    - stop() lets running jobs finish (up to 'shutdown_timeout' seconds),
+      cancels the rest and ends the result stream.
+
+    Jobs can be any coroutine function, so the scheduler can be run
+    against a local fake exchange; 'clock' can be replaced as well.
+    """
+
+    def __init__(self, concurrency=2, queue_size=100, max_tasks=64,
+                 shed_priority=2, backoff=30.0, shutdown_timeout=10.0,
+                 clock=time.monotonic):
+        """
+        :param concurrency: concurrent runs per exchange
+        :param queue_size: size of the result queue (None: results of the
+                           jobs are not collected)
+        :param max_tasks: runs in flight over all exchanges
+        :param shed_priority: items with priority >= this can be skipped
+        :param backoff: seconds an exchange is treated as rate limited
+        """
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_tasks = max_tasks
+        self.shed_priority = shed_priority
+        self.backoff = backoff
+        self.shutdown_timeout = shutdown_timeout
+        self.clock = clock
+
+        self.items = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._inflight = {}
+        self._backoff_until = {}
+        self._semaphores = {}
+        self._tasks = set()
+
+        self._queue = None
+        self._wakeup = None
+        self._stopping = False
+
+    # ----- items -----
+    def add(self, item, delay=0.0):
+        """Adds a poll item, its first run is due after 'delay' seconds."""
+        if item.name in self.items:
+            raise ValueError("Duplicate poll item: '{}'.".format(item.name))
+        self.items[item.name] = item
+        self._push(item, self.clock() + delay)
+
+    def remove(self, name):
+        """Removes a poll item, a running job is finished."""
+        self.items.pop(name, None)
+
+    def _push(self, item, due):
+        heapq.heappush(self._heap, (due, item.priority, next(self._seq), item))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ----- state -----
+    def is_backing_off(self, exchange_id, now=None):
+        now = self.clock() if now is None else now
+        return self._backoff_until.get(exchange_id, 0) > now
+
+    def _under_pressure(self, item, now):
+        key = item.exchange_id
+        if self._inflight.get(key, 0) >= self.concurrency:
+            return True
+        if self.is_backing_off(key, now):
+            return True
+        return self._queue is not None and self._queue.full()
+
+    def stats(self):
+        """Returns runs, skips, failures and staleness of every item."""
+        now = self.clock()
+        return {name: {'runs': item.runs,
+                       'skips': item.skips,
+                       'failures': item.failures,
+                       'staleness': item.staleness(now)}
+                for name, item in self.items.items()}
+
+    # ----- running -----
+    async def _execute(self, item):
+        key = item.exchange_id
+        semaphore = self._semaphores.setdefault(
+            key, asyncio.Semaphore(self.concurrency))
+        started = self.clock()
+        try:
+            async with semaphore:
+                self._inflight[key] = self._inflight.get(key, 0) + 1
+                try:
+                    result = await item.job()
+                finally:
+                    self._inflight[key] -= 1
+            item.runs += 1
+            item.last_success = self.clock()
+            if self._queue is not None:
+                # blocks while consumers are behind (backpressure)
+                await self._queue.put((item.name, result))
+        except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+            item.failures += 1
+            self._backoff_until[key] = self.clock() + self.backoff
+            print("Rate limited ({}): {}".format(item.name, e))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            item.failures += 1
+            print("Poll item '{}' failed: {!r}".format(item.name, e))
+        finally:
+            if not self._stopping and self.items.get(item.name) is item:
+                # not before the exchange's backoff ends, whatever priority
+                self._push(item, max(started + item.interval, self.clock(),
+                                     self._backoff_until.get(key, 0)))
+
+    async def _wait(self, timeout):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        """Runs the scheduler until stop() is called."""
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        if self.queue_size is not None and self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+
+        while not self._stopping:
+            if not self._heap:
+                await self._wait(1.0)
+                continue
+
+            now = self.clock()
+            due, _, _, item = self._heap[0]
+            if due > now:
+                await self._wait(due - now)
+                continue
+            if len(self._tasks) >= self.max_tasks:
+                await self._wait(0.05)
+                continue
+
+            heapq.heappop(self._heap)
+            if self.items.get(item.name) is not item:
+                continue  # removed
+
+            if item.priority >= self.shed_priority and \
+                    self._under_pressure(item, now):
+                item.skips += 1
+                self._push(item, now + item.interval)
+                continue
+            if self.is_backing_off(item.exchange_id, now):
+                # items that are not shed wait for the end of the backoff
+                self._push(item, self._backoff_until[item.exchange_id])
+                continue
+
+            task = asyncio.ensure_future(self._execute(item))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+        await self._shutdown()
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _shutdown(self):
+        if self._tasks:
+            _, pending = await asyncio.wait(list(self._tasks),
+                                            timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.put(_STOP),
+                                       self.shutdown_timeout)
+            except asyncio.TimeoutError:
+                print("No consumer took the end of the result stream.")
+
+    def stop(self):
+        """Stops the scheduler (call from within its event loop)."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def results(self):
+        """
+        Async generator of (item name, result) tuples, ends after stop().
+        Consuming slowly slows the scheduler down instead of piling up
+        results.
+        """
+        if self.queue_size is None:
+            raise ValueError("The scheduler doesn't collect results "
+                             "(queue_size=None).")
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+        while True:
+            result = await self._queue.get()
+            if result is _STOP:
+                return
+            yield result
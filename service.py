@@ -0,0 +1,334 @@
+from _checks import check_isinstance_list
+import exchange as exchange_queries
+from exchange import get_exchanges_as_list, load_exchanges_from_pickle, \
+    load_markets_threaded
+import pairs as pair_queries
+from trading_fees import get_maker_fee_from_exchanges, \
+    get_taker_fee_from_exchanges
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import inspect
+import json
+import threading
+import time
+from urllib.request import Request, urlopen
+
+from ccxt.base.exchange import Exchange
+import numpy as np
+
+
+# query functions that load or save instead of answering a question
+_EXCLUDED = {'load_markets_threaded', 'safe_exchanges_to_pickle',
+             'load_exchanges_from_pickle'}
+
+
+def _query_functions():
+    """Returns the public functions of exchange.py and pairs.py that take
+    'exchange' or 'exchanges' as first argument."""
+    functions = {}
+    for module in (exchange_queries, pair_queries):
+        for name, function in inspect.getmembers(module, inspect.isfunction):
+            if name.startswith('_') or name in _EXCLUDED or \
+                    function.__module__ != module.__name__:
+                continue
+            parameters = list(inspect.signature(function).parameters)
+            if parameters and parameters[0] in ('exchange', 'exchanges'):
+                functions[name] = function
+    return functions
+
+
+def _jsonable(value):
+    """Converts query results (exchanges, sets, arrays) to JSON types."""
+    if isinstance(value, Exchange):
+        return value.id
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted(_jsonable(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# --------- [ Warm Index ] ---------
+class MarketIndex:
+    """
+    Lookup tables over loaded exchanges: pair -> exchange-ids,
+    currency -> exchange-ids and the trading fee table. Built once per
+    refresh, so the common questions are dictionary lookups.
+    """
+
+    def __init__(self, exchanges):
+        check_isinstance_list(exchanges)
+
+        self.exchanges = {e.id: e for e in exchanges}
+        self.pairs = {}
+        self.currencies = {}
+        for exchange in exchanges:
+            for symbol in exchange.markets or ():
+                self.pairs.setdefault(symbol, []).append(exchange.id)
+            for currency in exchange.currencies or ():
+                self.currencies.setdefault(currency, []).append(exchange.id)
+        self.maker = get_maker_fee_from_exchanges(exchanges)
+        self.taker = get_taker_fee_from_exchanges(exchanges)
+
+    def exchanges_supporting_pair(self, pair):
+        return list(self.pairs.get(pair, ()))
+
+    def exchanges_supporting_pairs(self, pairs):
+        found = set()
+        for pair in pairs:
+            found.update(self.pairs.get(pair, ()))
+        return [e for e in self.exchanges if e in found]
+
+    def exchanges_supporting_mutual_pairs(self, pairs):
+        if not pairs:
+            return []
+        found = set(self.exchanges)
+        for pair in pairs:
+            found &= set(self.pairs.get(pair, ()))
+        return [e for e in self.exchanges if e in found]
+
+    def exchanges_supporting_currency(self, currency):
+        return list(self.currencies.get(currency, ()))
+
+    def fees(self, exchange_ids=None):
+        ids = exchange_ids or list(self.exchanges)
+        return {e: {'maker': self.maker.get(e), 'taker': self.taker.get(e)}
+                for e in ids}
+
+
+# --------- [ Service ] ---------
+class MarketService:
+    """
+    Keeps loaded exchanges and their MarketIndex in memory, refreshes them
+    in a background thread and answers the query functions of exchange.py
+    and pairs.py. Requests always see one consistent snapshot: a refresh
+    builds new exchanges and a new index and swaps them in at once.
+    """
+
+    def __init__(self, exchange_ids=None, pickle_file=None, loader=None,
+                 refresh_interval=3600):
+        """
+        :param exchange_ids: exchanges to load (used without pickle_file)
+        :param pickle_file: load the exchanges from a pickle instead
+        :param loader: a function returning loaded exchanges (overrides
+                       both, e.g. for tests)
+        :param refresh_interval: seconds between refreshes (None: never)
+        """
+        if not exchange_ids and pickle_file is None and loader is None:
+            raise ValueError("MarketService needs 'exchange_ids', "
+                             "'pickle_file' or 'loader'.")
+        if exchange_ids is not None:
+            check_isinstance_list(exchange_ids)
+        self.exchange_ids = exchange_ids
+        self.pickle_file = pickle_file
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.functions = _query_functions()
+
+        self._state = None   # (exchanges, index, loaded at, version)
+        self._stop = threading.Event()
+        self._refresher = None
+        self._server = None
+
+    # ----- state -----
+    def _load(self):
+        if self.loader is not None:
+            return self.loader()
+        if self.pickle_file is not None:
+            return load_exchanges_from_pickle(self.pickle_file)
+        return load_markets_threaded(get_exchanges_as_list(
+            self.exchange_ids))
+
+    def refresh(self):
+        """Loads the exchanges and swaps in a new snapshot."""
+        start = time.time()
+        exchanges = self._load()
+        version = self._state[3] + 1 if self._state else 1
+        self._state = (exchanges, MarketIndex(exchanges), time.time(),
+                       version)
+        print("Refreshed {} exchanges in {:.2f}s (version {}).".format(
+            len(exchanges), time.time() - start, version))
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # keep serving the previous snapshot
+                print("Refresh failed: {!r}".format(e))
+
+    # ----- queries -----
+    def call(self, function, args=None):
+        """
+        Answers one query against the current snapshot.
+
+        :param function: name of a query function (see self.functions)
+                         or 'fees'
+        :param args: dictionary of arguments; 'exchanges' is a list of
+                     exchange-ids (default: all), 'exchange' an exchange-id
+        :return: the JSON-ready result
+        """
+        exchanges, index, _, _ = self._state
+        args = dict(args or {})
+
+        if function == 'fees':
+            return index.fees(args.get('exchanges'))
+        if function == 'get_exchanges_supporting_pair' and \
+                'exchanges' not in args:
+            return index.exchanges_supporting_pair(args['pair'])
+        if function == 'get_exchanges_supporting_pairs' and \
+                'exchanges' not in args:
+            return index.exchanges_supporting_pairs(args['pairs'])
+        if function == 'get_exchanges_supporting_mutual_pairs' and \
+                'exchanges' not in args:
+            return index.exchanges_supporting_mutual_pairs(args['pairs'])
+
+        query = self.functions.get(function)
+        if query is None:
+            raise KeyError("Unknown function '{}'".format(function))
+        if 'exchange' in args:
+            args['exchange'] = index.exchanges[args['exchange']]
+        parameters = inspect.signature(query).parameters
+        if 'exchanges' in parameters:
+            ids = args.get('exchanges')
+            args['exchanges'] = exchanges if ids is None \
+                else [index.exchanges[i] for i in ids]
+        return _jsonable(query(**args))
+
+    def batch(self, calls):
+        """
+        Answers several queries against the same snapshot.
+
+        :param calls: a list of {'function': name, 'args': {...}}
+        :return: a list of {'result': ...} or {'error': ...}
+        """
+        results = []
+        for call in calls:
+            try:
+                results.append({'result': self.call(call['function'],
+                                                    call.get('args'))})
+            except Exception as e:
+                results.append({'error': '{}: {}'.format(type(e).__name__, e)})
+        return results
+
+    def health(self):
+        exchanges, _, loaded_at, version = self._state
+        return {'status': 'ok', 'exchanges': len(exchanges),
+                'loaded_at': loaded_at, 'version': version}
+
+    # ----- server -----
+    def start(self, host='127.0.0.1', port=8765, block=False):
+        """
+        Loads the exchanges, starts the background refresh and serves
+        HTTP on host:port (port 0 picks a free port).
+
+        Endpoints: GET /health, GET /functions, POST /query
+        ({'function': ..., 'args': {...}}) and POST /batch (a list of
+        queries).
+
+        :return: the base url
+        """
+        if self._state is None:
+            self.refresh()
+        if self.refresh_interval:
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._refresh_loop,
+                                               daemon=True)
+            self._refresher.start()
+
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+        url = 'http://{}:{}'.format(*self._server.server_address[:2])
+        print("Serving {} query functions at {}".format(
+            len(self.functions) + 1, url))
+        if block:
+            try:
+                self._server.serve_forever()
+            finally:
+                self.stop()
+        else:
+            threading.Thread(target=self._server.serve_forever,
+                             daemon=True).start()
+        return url
+
+    def stop(self):
+        """Stops serving; waits for a running refresh to finish."""
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _handler(service):
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._reply(200, service.health())
+            elif self.path == '/functions':
+                self._reply(200, sorted(service.functions) + ['fees'])
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'null')
+            except ValueError as e:
+                self._reply(400, {'error': str(e)})
+                return
+            if self.path == '/batch' and isinstance(request, list):
+                self._reply(200, service.batch(request))
+            elif self.path == '/query' and isinstance(request, dict):
+                answer = service.batch([request])[0]
+                self._reply(400 if 'error' in answer else 200, answer)
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+# --------- [ Client ] ---------
+def _post(url, body):
+    request = Request(url, json.dumps(body).encode(),
+                      {'Content-Type': 'application/json'})
+    with urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def query(url, function, **args):
+    """Asks a running MarketService a single query, returns the result."""
+    answer = _post(url + '/query', {'function': function, 'args': args})
+    return answer['result']
+
+
+def batch_query(url, calls):
+    """
+    Asks a running MarketService several queries in one request.
+
+    :param calls: a list of (function, args)
+    :return: a list of {'result': ...} or {'error': ...}
+    """
+    return _post(url + '/batch', [{'function': f, 'args': a or {}}
+                                  for f, a in calls])
@@ -0,0 +1,147 @@
+from _checks import check_isinstance_string
+from orderbook import PRICE, SIZE
+
+import numpy as np
+
+
+# --------- [ Single Book ] ---------
+def fill_costs(levels, sizes):
+    """
+    Returns the cost (in quote currency) of taking the given sizes from
+    one side of a book. Uses cumulative sums over the levels and a
+    searchsorted per size instead of walking the book level by level.
+
+    :param levels: array of (price, size) levels, best first
+    :param sizes: array of order sizes (base currency)
+    :return: array of costs, NaN where the book is not deep enough
+    """
+    sizes = np.asarray(sizes, dtype=np.float64)
+    levels = levels[~np.isnan(levels[:, PRICE])]
+    if not len(levels):
+        return np.full(len(sizes), np.nan)
+
+    cum_size = np.cumsum(levels[:, SIZE])
+    cum_notional = np.cumsum(levels[:, PRICE] * levels[:, SIZE])
+
+    # level at which each order is completely filled
+    k = np.searchsorted(cum_size, sizes, side='left')
+    deep_enough = k < len(levels)
+    k = np.minimum(k, len(levels) - 1)
+
+    before_size = np.where(k > 0, cum_size[k - 1], 0.0)
+    before_notional = np.where(k > 0, cum_notional[k - 1], 0.0)
+    costs = before_notional + (sizes - before_size) * levels[k, PRICE]
+    return np.where(deep_enough, costs, np.nan)
+
+
+def simulate_order(pool, exchange_id, symbol, sizes, side='buy', fee=0.0):
+    """
+    Expected fill of market orders of several sizes at one exchange.
+
+    :param pool: an OrderBookPool
+    :param exchange_id: an exchange-id (as str)
+    :param symbol: a trading-pair (as str)
+    :param sizes: array of order sizes (base currency)
+    :param side: 'buy' (takes the asks) or 'sell' (takes the bids)
+    :param fee: the taker fee of the exchange
+    :return: dictionary of arrays 'price' (average fill), 'slippage'
+             (relative to the best price), 'fee' and 'total' (quote
+             currency paid for buys, received for sells)
+    """
+    check_isinstance_string(side)
+
+    bids, asks = pool.book(exchange_id, symbol)
+    levels = asks if side == 'buy' else bids
+    sizes = np.asarray(sizes, dtype=np.float64)
+
+    costs = fill_costs(levels, sizes)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        price = costs / sizes
+        best = levels[0, PRICE] if len(levels) else np.nan
+        slippage = price / best - 1 if side == 'buy' else 1 - price / best
+    fees = costs * fee
+    total = costs + fees if side == 'buy' else costs - fees
+    return {'price': price, 'slippage': slippage, 'fee': fees,
+            'total': total}
+
+
+def simulate_order_at_exchanges(pool, symbol, sizes, side='buy', fees=None):
+    """
+    Runs simulate_order for every exchange that has a book of the symbol.
+
+    :param fees: dictionary of exchange-id: taker fee (None: no fees)
+    :return: dictionary of exchange-id: result of simulate_order
+    """
+    fees = fees or {}
+    _, exchange_ids = pool.slots_of_symbol(symbol)
+    return {exchange_id: simulate_order(pool, exchange_id, symbol, sizes,
+                                        side, fees.get(exchange_id) or 0.0)
+            for exchange_id in exchange_ids}
+
+
+# --------- [ Split Orders ] ---------
+def split_order(pool, symbol, sizes, side='buy', fees=None):
+    """
+    Splits market orders over all exchanges with a book of the symbol so
+    the total (including taker fees) is optimal. The levels of all books
+    are merged by fee-adjusted price; since filling the best levels first
+    is optimal for linear per-level costs, each order size is one
+    searchsorted over the merged cumulative sizes.
+
+    :param pool: an OrderBookPool
+    :param symbol: a trading-pair (as str)
+    :param sizes: array of order sizes (base currency)
+    :param side: 'buy' or 'sell'
+    :param fees: dictionary of exchange-id: taker fee (None: no fees)
+    :return: dictionary with 'exchanges', 'allocation' (size x exchange,
+             base currency), 'total' (incl. fees) and 'price' (average)
+    """
+    check_isinstance_string(symbol)
+
+    fees = fees or {}
+    slots, exchange_ids = pool.slots_of_symbol(symbol)
+    sizes = np.asarray(sizes, dtype=np.float64)
+    book = pool.asks if side == 'buy' else pool.bids
+    levels = book[slots]                                  # (E, depth, 2)
+
+    fee = np.array([fees.get(e) or 0.0 for e in exchange_ids])[:, None]
+    effective = levels[..., PRICE] * ((1 + fee) if side == 'buy'
+                                      else (1 - fee))
+    owner = np.broadcast_to(np.arange(len(slots))[:, None],
+                            effective.shape)
+
+    valid = ~np.isnan(effective)
+    effective, amount = effective[valid], levels[..., SIZE][valid]
+    owner = owner[valid]
+    order = np.argsort(effective if side == 'buy' else -effective,
+                       kind='stable')
+    effective, amount, owner = effective[order], amount[order], owner[order]
+
+    cum_size = np.cumsum(amount)
+    cum_total = np.cumsum(effective * amount)
+    # cumulative size per exchange along the merged book
+    per_exchange = np.zeros((len(amount), len(slots)))
+    per_exchange[np.arange(len(amount)), owner] = amount
+    per_exchange = np.cumsum(per_exchange, axis=0)
+
+    k = np.searchsorted(cum_size, sizes, side='left')
+    deep_enough = k < len(amount)
+    k = np.minimum(k, max(len(amount) - 1, 0))
+
+    allocation = np.zeros((len(sizes), len(slots)))
+    total = np.full(len(sizes), np.nan)
+    if len(amount):
+        before = k > 0
+        allocation[before] = per_exchange[k[before] - 1]
+        before_size = np.where(before, cum_size[k - 1], 0.0)
+        before_total = np.where(before, cum_total[k - 1], 0.0)
+        rest = sizes - before_size
+        allocation[np.arange(len(sizes)), owner[k]] += rest
+        total = before_total + rest * effective[k]
+
+    allocation[~deep_enough] = np.nan
+    total = np.where(deep_enough, total, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        price = total / sizes
+    return {'exchanges': exchange_ids, 'allocation': allocation,
+            'total': total, 'price': price}
@@ -0,0 +1,298 @@
+# Only the standard library is imported here, so a Snapshot opens in
+# milliseconds; build_snapshot imports the ccxt-based modules when called.
+from array import array
+from bisect import bisect_left
+import difflib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+
+MAGIC = b'VSNAP001'
+_LENGTH = struct.Struct('<I')
+
+
+# --------- [ Building ] ---------
+def _u32(values):
+    return array('I', values).tobytes() if sys.byteorder == 'little' \
+        else _swapped(array('I', values))
+
+
+def _u16(values):
+    return array('H', values).tobytes() if sys.byteorder == 'little' \
+        else _swapped(array('H', values))
+
+
+def _swapped(values):
+    values.byteswap()
+    return values.tobytes()
+
+
+def build_snapshot(exchanges, path):
+    """
+    Writes a snapshot of the markets and fees of loaded exchanges.
+
+    File layout: magic, header length (u32), a JSON header (exchange-ids, all
+    ccxt exchange-ids, section offsets) and the sections:
+
+        names       sorted pair names, joined by '\\n' (utf-8)
+        offsets     u32 byte offset of every name (+1 end offset)
+        listing     u32 start of the exchanges of every pair (+1 end)
+        postings    u16 exchange indices, per pair
+        exchange    u32 start of the pairs of every exchange (+1 end)
+        pairs       u32 pair indices, per exchange (sorted)
+        fees        JSON {exchange-id: {kind: {currency: fee}}}
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param path: the snapshot file
+    :return: path
+    """
+    from _checks import check_isinstance_list, check_isinstance_string
+    from exchange import get_all_exchange_ids
+    from export import iter_fees
+
+    check_isinstance_list(exchanges)
+    check_isinstance_string(path)
+    start = time.time()
+
+    exchange_ids = [e.id for e in exchanges]
+    names = sorted({symbol for e in exchanges for symbol in e.markets or ()})
+    pair_index = {name: i for i, name in enumerate(names)}
+
+    listings = [[] for _ in names]
+    exchange_pairs = []
+    for row, exchange in enumerate(exchanges):
+        pairs = sorted(pair_index[s] for s in exchange.markets or ())
+        for pair in pairs:
+            listings[pair].append(row)
+        exchange_pairs.append(pairs)
+
+    encoded = [name.encode() for name in names]
+    offsets = [0]
+    for name in encoded:
+        offsets.append(offsets[-1] + len(name) + 1)
+    listing = [0]
+    for exchanges_of_pair in listings:
+        listing.append(listing[-1] + len(exchanges_of_pair))
+    exchange_start = [0]
+    for pairs in exchange_pairs:
+        exchange_start.append(exchange_start[-1] + len(pairs))
+
+    fees = {}
+    for exchange_id, kind, currency, fee in iter_fees(exchanges):
+        fees.setdefault(exchange_id, {}).setdefault(kind, {})[currency] = fee
+
+    sections = [
+        ('names', b'\n'.join(encoded) + b'\n' if encoded else b''),
+        ('offsets', _u32(offsets)),
+        ('listing', _u32(listing)),
+        ('postings', _u16([row for rows in listings for row in rows])),
+        ('exchange', _u32(exchange_start)),
+        ('pairs', _u32([pair for pairs in exchange_pairs for pair in pairs])),
+        ('fees', json.dumps(fees, separators=(',', ':')).encode())]
+
+    position = 0
+    layout = {}
+    for name, data in sections:
+        position += -position % 4   # align the arrays
+        layout[name] = [position, len(data)]
+        position += len(data)
+    header = json.dumps({'created': time.time(),
+                         'exchanges': exchange_ids,
+                         'all_exchanges': get_all_exchange_ids(),
+                         'sections': layout}).encode()
+
+    base = len(MAGIC) + _LENGTH.size + len(header)
+    base += -base % 4
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        for name, data in sections:
+            f.seek(base + layout[name][0])
+            f.write(data)
+    os.replace(path + '.tmp', path)
+    print("Built snapshot of {} exchanges and {} pairs in {:.2f}s.".format(
+        len(exchange_ids), len(names), time.time() - start))
+    return path
+
+
+# --------- [ Reading ] ---------
+class Snapshot:
+    """
+    A memory-mapped snapshot written by build_snapshot. Lookups read only
+    the touched part of the file: a pair is found by binary search over
+    the sorted names, its exchanges are a slice of the postings.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError("'{}' is not a snapshot.".format(path))
+        length, = _LENGTH.unpack_from(self._map, len(MAGIC))
+        start = len(MAGIC) + _LENGTH.size
+        header = json.loads(self._map[start:start + length])
+        base = start + length
+        base += -base % 4
+
+        self.path = path
+        self.created = header['created']
+        self.exchange_ids = header['exchanges']
+        self.all_exchange_ids = header['all_exchanges']
+        self._exchange_rows = {e: i for i, e in enumerate(self.exchange_ids)}
+        self._view = memoryview(self._map)
+        self._sections = {name: self._view[base + offset:base + offset + size]
+                          for name, (offset, size)
+                          in header['sections'].items()}
+        self._offsets = self._array('offsets', 'I')
+        self._listing = self._array('listing', 'I')
+        self._postings = self._array('postings', 'H')
+        self._exchange = self._array('exchange', 'I')
+        self._pairs = self._array('pairs', 'I')
+        self._fees = None
+
+    def _array(self, name, kind):
+        section = self._sections[name]
+        if sys.byteorder == 'little':
+            return section.cast(kind)
+        values = array(kind, section.tobytes())
+        values.byteswap()
+        return values
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def close(self):
+        for values in (self._offsets, self._listing, self._postings,
+                       self._exchange, self._pairs):
+            if isinstance(values, memoryview):
+                values.release()
+        for section in self._sections.values():
+            section.release()
+        self._sections = {}
+        self._offsets = self._listing = self._postings = None
+        self._exchange = self._pairs = None
+        self._view.release()
+        self._map.close()
+
+    # ----- pairs -----
+    def pair(self, i):
+        """Returns the name of the i-th pair."""
+        names = self._sections['names']
+        return bytes(names[self._offsets[i]:self._offsets[i + 1] - 1]).decode()
+
+    def pair_names(self):
+        """Returns all pair names (sorted)."""
+        names = bytes(self._sections['names']).decode()
+        return names.split('\n')[:-1] if names else []
+
+    def _find(self, pair):
+        names = _Names(self)
+        i = bisect_left(names, pair)
+        return i if i < len(self) and names[i] == pair else None
+
+    def _rows(self, pair):
+        i = self._find(pair)
+        if i is None:
+            return []
+        return self._postings[self._listing[i]:self._listing[i + 1]]
+
+    def exchanges_supporting_pair(self, pair):
+        """Returns the exchange-ids listing a pair."""
+        return [self.exchange_ids[row] for row in self._rows(pair)]
+
+    def exchanges_supporting_pairs(self, pairs):
+        """Returns the exchange-ids listing at least one of the pairs."""
+        rows = set()
+        for pair in pairs:
+            rows.update(self._rows(pair))
+        return [self.exchange_ids[row] for row in sorted(rows)]
+
+    def exchanges_supporting_mutual_pairs(self, pairs):
+        """Returns the exchange-ids listing all of the pairs."""
+        rows = None
+        for pair in pairs:
+            found = set(self._rows(pair))
+            rows = found if rows is None else rows & found
+        return [self.exchange_ids[row] for row in sorted(rows or ())]
+
+    def pairs_at_exchange(self, exchange_id):
+        """Returns the pairs listed at an exchange."""
+        row = self._exchange_rows[exchange_id]
+        return [self.pair(i) for i in
+                self._pairs[self._exchange[row]:self._exchange[row + 1]]]
+
+    def mutual_pairs(self, exchange_ids):
+        """Returns the pairs listed at every one of the exchanges."""
+        common = None
+        for exchange_id in exchange_ids:
+            row = self._exchange_rows[exchange_id]
+            found = set(self._pairs[self._exchange[row]:
+                                    self._exchange[row + 1]])
+            common = found if common is None else common & found
+        return [self.pair(i) for i in sorted(common or ())]
+
+    # ----- fees -----
+    def fees(self, exchange_id, kind=None, currency=None):
+        """
+        Returns the fees of an exchange as {kind: {currency: fee}}
+        (trading fees use '' as currency), optionally only one kind
+        and/or currency.
+        """
+        if exchange_id not in self._exchange_rows:
+            raise KeyError("'{}' is not in the snapshot.".format(exchange_id))
+        if self._fees is None:
+            self._fees = json.loads(bytes(self._sections['fees']))
+        fees = self._fees.get(exchange_id, {})
+        if kind is not None:
+            fees = {kind: fees.get(kind, {})}
+        if currency is not None:
+            fees = {k: {currency: v[currency]} for k, v in fees.items()
+                    if currency in v}
+        return fees
+
+    # ----- search -----
+    def search(self, term, kind='exchange', number_results=5):
+        """
+        Fuzzy search for an exchange-id (all of ccxt) or a pair (of the
+        snapshot). Substring matches come first, then close matches.
+
+        :param kind: 'exchange' or 'pair'
+        :return: a list of names
+        """
+        if kind == 'exchange':
+            candidates = self.all_exchange_ids
+        elif kind == 'pair':
+            candidates = self.pair_names()
+        else:
+            raise ValueError("Unknown search kind '{}', use 'exchange' or "
+                             "'pair'".format(kind))
+        if term in candidates:
+            return [term]
+
+        folded = term.lower()
+        results = [c for c in candidates if folded in c.lower()]
+        results.sort(key=len)
+        results = results[:number_results]
+        if len(results) < number_results:
+            lowered = {c.lower(): c for c in candidates}
+            for match in difflib.get_close_matches(folded, lowered,
+                                                   number_results, 0.5):
+                if lowered[match] not in results:
+                    results.append(lowered[match])
+        return results[:number_results]
+
+
+class _Names:
+    """Sequence view of the sorted pair names, for bisect."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __getitem__(self, i):
+        return self._snapshot.pair(i)
@@ -0,0 +1,394 @@
+from frames import records_to_arrow, records_to_pandas
+
+import json
+import os
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+
+# --------- [ Record Layouts ] ---------
+OHLCV_DTYPE = np.dtype([('timestamp', '<i8'),
+                        ('open', '<f8'),
+                        ('high', '<f8'),
+                        ('low', '<f8'),
+                        ('close', '<f8'),
+                        ('volume', '<f8')])
+
+TRADE_DTYPE = np.dtype([('timestamp', '<i8'),
+                        ('price', '<f8'),
+                        ('amount', '<f8'),
+                        ('side', 'i1'),        # 1: buy, -1: sell, 0: unknown
+                        ('id_hash', '<u8')])   # see trades.trade_id_hashes
+
+CHUNK_RECORDS = 1 << 20   # records per chunk file (48 MB for OHLCV)
+INDEX_STRIDE = 1 << 12    # one index entry every n records
+
+
+def _safe_name(part):
+    """
+    Turns a key part into a file name by URL-quoting it ('BTC/USDT' ->
+    'BTC%2FUSDT'), so different parts never share a file name.
+    """
+    name = quote(str(part), safe='')
+    return name.replace('.', '%2E') if name in ('.', '..') else name
+
+
+# --------- [ Chunked Series ] ---------
+class ChunkedSeries:
+    """
+    A single time series of fixed-width records, stored as a number of
+    chunk files in one directory. Records are appended in timestamp order.
+
+    The sparse index holds the timestamp of every INDEX_STRIDE-th record,
+    so a range lookup is a binary search over the index followed by a
+    binary search inside a single stride of a memory-mapped chunk.
+    Reads return NumPy views of the memory map, nothing is loaded
+    that isn't touched.
+
+    With 'unique_timestamps' (e.g. candles) every timestamp is stored once
+    and overlapping appends are trimmed; otherwise (e.g. trades) equal
+    timestamps are allowed and deduplication is up to the caller.
+    """
+
+    def __init__(self, path, dtype, chunk_records=CHUNK_RECORDS,
+                 index_stride=INDEX_STRIDE, key=None,
+                 unique_timestamps=True):
+        self.path = path
+        self.key = key
+        self.unique_timestamps = unique_timestamps
+        meta_path = os.path.join(path, 'meta.json')
+
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            dtype = np.dtype([tuple(d) for d in meta['dtype']])
+            chunk_records = meta['chunk_records']
+            index_stride = meta['index_stride']
+            self.key = tuple(meta['key']) if meta.get('key') else key
+        else:
+            os.makedirs(path, exist_ok=True)
+            with open(meta_path, 'w') as f:
+                json.dump({'dtype': np.dtype(dtype).descr,
+                           'chunk_records': chunk_records,
+                           'index_stride': index_stride,
+                           'key': list(key) if key else None}, f)
+
+        if chunk_records % index_stride:
+            raise ValueError("'chunk_records' needs to be a multiple of "
+                             "'index_stride'.")
+
+        self.dtype = np.dtype(dtype)
+        self.chunk_records = chunk_records
+        self.index_stride = index_stride
+
+        self._maps = {}
+        self._length = self._scan()
+        self._index = self._load_index()
+
+    # ----- files -----
+    def _chunk_path(self, chunk):
+        return os.path.join(self.path, 'chunk_{:06d}.bin'.format(chunk))
+
+    def _index_path(self):
+        return os.path.join(self.path, 'index.i8')
+
+    def _scan(self):
+        """Counts the stored records, dropping a torn record at the end."""
+        length = 0
+        chunk = 0
+        while os.path.exists(self._chunk_path(chunk)):
+            path = self._chunk_path(chunk)
+            size = os.path.getsize(path)
+            if size % self.dtype.itemsize:
+                with open(path, 'r+b') as f:
+                    f.truncate(size - size % self.dtype.itemsize)
+                size -= size % self.dtype.itemsize
+            length += size // self.dtype.itemsize
+            chunk += 1
+        return length
+
+    def _load_index(self):
+        expected = -(-self._length // self.index_stride)
+        path = self._index_path()
+        if os.path.exists(path):
+            index = np.fromfile(path, dtype='<i8')
+            if len(index) == expected:
+                return index
+
+        # missing or out of sync: rebuild from the chunks
+        index = np.empty(expected, dtype='<i8')
+        for i in range(expected):
+            index[i] = self._record(i * self.index_stride)['timestamp']
+        index.tofile(path)
+        return index
+
+    def _map(self, chunk):
+        """Returns the memory map of a chunk (cached while it is full)."""
+        records = min(self.chunk_records,
+                      self._length - chunk * self.chunk_records)
+        cached = self._maps.get(chunk)
+        if cached is not None and len(cached) == records:
+            return cached
+        mapped = np.memmap(self._chunk_path(chunk), dtype=self.dtype,
+                           mode='r', shape=(records,))
+        self._maps[chunk] = mapped
+        return mapped
+
+    def _record(self, i):
+        chunk, offset = divmod(i, self.chunk_records)
+        return self._map(chunk)[offset]
+
+    # ----- properties -----
+    def __len__(self):
+        return self._length
+
+    @property
+    def first_timestamp(self):
+        if not self._length:
+            return None
+        return int(self._index[0])
+
+    @property
+    def last_timestamp(self):
+        if not self._length:
+            return None
+        return int(self._record(self._length - 1)['timestamp'])
+
+    # ----- writing -----
+    def append(self, records):
+        """
+        Appends records (a structured array of the series dtype).
+        For unique timestamps, records that are not newer than the last
+        stored one are skipped, so overlapping batches can be appended
+        as they come.
+
+        :return: number of appended records
+        """
+        records = np.asarray(records, dtype=self.dtype)
+        last = self.last_timestamp
+        if last is not None:
+            if self.unique_timestamps:
+                records = records[records['timestamp'] > last]
+            elif len(records) and records['timestamp'][0] < last:
+                raise ValueError("Records need to be appended in "
+                                 "timestamp order.")
+        if not len(records):
+            return 0
+
+        steps = np.diff(records['timestamp'])
+        if np.any(steps <= 0 if self.unique_timestamps else steps < 0):
+            raise ValueError("Records need increasing timestamps.")
+
+        written = 0
+        new_index = []
+        while written < len(records):
+            chunk, offset = divmod(self._length, self.chunk_records)
+            n = min(len(records) - written, self.chunk_records - offset)
+            part = records[written:written + n]
+
+            with open(self._chunk_path(chunk), 'ab') as f:
+                part.tofile(f)
+
+            first = -(-self._length // self.index_stride) * self.index_stride
+            for i in range(first, self._length + n, self.index_stride):
+                new_index.append(part['timestamp'][i - self._length])
+
+            self._length += n
+            written += n
+
+        if new_index:
+            new_index = np.array(new_index, dtype='<i8')
+            with open(self._index_path(), 'ab') as f:
+                new_index.tofile(f)
+            self._index = np.concatenate([self._index, new_index])
+        return written
+
+    # ----- reading -----
+    def _position(self, timestamp, side):
+        """Returns the record position of a timestamp (like searchsorted)."""
+        # equal timestamps may cross a stride border: for 'left' start in
+        # the last stride that begins before the timestamp
+        block = int(np.searchsorted(self._index, timestamp, side=side)) - 1
+        if block < 0:
+            return 0
+        start = block * self.index_stride
+        stop = min(start + self.index_stride, self._length)
+
+        chunk, offset = divmod(start, self.chunk_records)
+        stamps = self._map(chunk)['timestamp'][offset:offset + stop - start]
+        return start + int(np.searchsorted(stamps, timestamp, side=side))
+
+    def locate(self, start=None, end=None):
+        """Returns the record positions [lo, hi) of a time range [start, end]."""
+        lo = 0 if start is None else self._position(start, 'left')
+        hi = self._length if end is None else self._position(end, 'right')
+        return lo, max(lo, hi)
+
+    def iter_range(self, start=None, end=None):
+        """
+        Yields zero-copy views of the records in [start, end], one per
+        chunk that is touched by the range.
+        """
+        lo, hi = self.locate(start, end)
+        while lo < hi:
+            chunk, offset = divmod(lo, self.chunk_records)
+            n = min(hi - lo, self.chunk_records - offset)
+            yield self._map(chunk)[offset:offset + n]
+            lo += n
+
+    def read(self, start=None, end=None):
+        """
+        Returns the records in [start, end]. If the range lies within a
+        single chunk this is a zero-copy view of the memory map, otherwise
+        the chunk parts are concatenated.
+        """
+        parts = list(self.iter_range(start, end))
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def tail(self, n):
+        """Returns the last n records."""
+        lo = max(0, self._length - n)
+        parts = []
+        while lo < self._length:
+            chunk, offset = divmod(lo, self.chunk_records)
+            m = min(self._length - lo, self.chunk_records - offset)
+            parts.append(self._map(chunk)[offset:offset + m])
+            lo += m
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    # ----- interop -----
+    def to_pandas(self, start=None, end=None):
+        """Returns the records in [start, end] as DataFrame (no copy)."""
+        return records_to_pandas(self.read(start, end))
+
+    def to_arrow(self, start=None, end=None):
+        """Returns the records in [start, end] as Arrow table."""
+        return records_to_arrow(self.read(start, end))
+
+
+# --------- [ Series Store ] ---------
+class SeriesStore:
+    """
+    A directory of chunked series that share one record layout.
+    Every key (a tuple of str) is stored in its own sub directory.
+    """
+
+    def __init__(self, root, dtype, chunk_records=CHUNK_RECORDS,
+                 index_stride=INDEX_STRIDE, unique_timestamps=True):
+        self.root = root
+        self.dtype = np.dtype(dtype)
+        self.chunk_records = chunk_records
+        self.index_stride = index_stride
+        self.unique_timestamps = unique_timestamps
+        self._series = {}
+
+    def _path(self, key):
+        return os.path.join(self.root, *[_safe_name(k) for k in key])
+
+    def has_series(self, *key):
+        return key in self._series or \
+            os.path.exists(os.path.join(self._path(key), 'meta.json'))
+
+    def series(self, *key):
+        """Returns (and creates if necessary) the series of a key."""
+        series = self._series.get(key)
+        if series is None:
+            series = ChunkedSeries(self._path(key), self.dtype,
+                                   self.chunk_records, self.index_stride,
+                                   key, self.unique_timestamps)
+            self._series[key] = series
+        return series
+
+    def keys(self):
+        """Returns the keys of all series on disk."""
+        keys = []
+        for path, _, files in os.walk(self.root):
+            if 'meta.json' in files:
+                with open(os.path.join(path, 'meta.json')) as f:
+                    key = json.load(f).get('key')
+                if key is None:
+                    key = [unquote(part) for part in
+                           os.path.relpath(path, self.root).split(os.sep)]
+                keys.append(tuple(key))
+        return sorted(keys)
+
+
+# --------- [ OHLCV Store ] ---------
+def candles_to_records(candles):
+    """Converts ccxt candles ([ts, o, h, l, c, v] lists) to OHLCV records."""
+    values = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+    records = np.empty(len(values), dtype=OHLCV_DTYPE)
+    records['timestamp'] = values[:, 0].astype(np.int64)
+    for i, name in enumerate(OHLCV_DTYPE.names[1:], start=1):
+        # ccxt reports missing values as None, which become NaN here
+        records[name] = values[:, i]
+    return records
+
+
+class OHLCVStore(SeriesStore):
+    """
+    Local candle storage, one chunked series per
+    (exchange-id, symbol, timeframe). Can be used as storage for the
+    ingestion in ohlcv.py.
+    """
+
+    def __init__(self, root, chunk_records=CHUNK_RECORDS,
+                 index_stride=INDEX_STRIDE):
+        super().__init__(root, OHLCV_DTYPE, chunk_records, index_stride)
+
+    def last_timestamp(self, exchange_id, symbol, timeframe):
+        if not self.has_series(exchange_id, symbol, timeframe):
+            return None
+        return self.series(exchange_id, symbol, timeframe).last_timestamp
+
+    def append(self, exchange_id, symbol, timeframe, candles):
+        """
+        Appends candles (ccxt lists or OHLCV records) to a series.
+
+        :return: number of appended candles
+        """
+        if not isinstance(candles, np.ndarray) or candles.dtype != OHLCV_DTYPE:
+            candles = candles_to_records(candles)
+        return self.series(exchange_id, symbol, timeframe).append(candles)
+
+    def read(self, exchange_id, symbol, timeframe, start=None, end=None):
+        """Returns the candles of a series in [start, end] (in ms)."""
+        if not self.has_series(exchange_id, symbol, timeframe):
+            return np.empty(0, dtype=OHLCV_DTYPE)
+        return self.series(exchange_id, symbol, timeframe).read(start, end)
+
+
+# --------- [ Trade Store ] ---------
+class TradeStore(SeriesStore):
+    """
+    Local trade tape storage, one chunked series per (exchange-id, symbol).
+    Trades may share a timestamp, duplicates are filtered by the
+    ingestion in trades.py.
+    """
+
+    def __init__(self, root, chunk_records=CHUNK_RECORDS,
+                 index_stride=INDEX_STRIDE):
+        super().__init__(root, TRADE_DTYPE, chunk_records, index_stride,
+                         unique_timestamps=False)
+
+    def last_timestamp(self, exchange_id, symbol):
+        if not self.has_series(exchange_id, symbol):
+            return None
+        return self.series(exchange_id, symbol).last_timestamp
+
+    def append(self, exchange_id, symbol, records):
+        """Appends trade records, returns the number of appended trades."""
+        return self.series(exchange_id, symbol).append(records)
+
+    def read(self, exchange_id, symbol, start=None, end=None):
+        """Returns the trades of a series in [start, end] (in ms)."""
+        if not self.has_series(exchange_id, symbol):
+            return np.empty(0, dtype=TRADE_DTYPE)
+        return self.series(exchange_id, symbol).read(start, end)
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import ccxt
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fake_markets(*symbols):
+    """Returns a markets dict (as loaded by ccxt) for the given pairs."""
+    markets = {}
+    for symbol in symbols:
+        base, quote = symbol.split('/')
+        markets[symbol] = {'id': base + quote, 'symbol': symbol,
+                           'base': base, 'quote': quote, 'baseId': base,
+                           'quoteId': quote, 'spot': True, 'type': 'spot',
+                           'active': True, 'precision': {}, 'limits': {},
+                           'taker': 0.001, 'maker': 0.001}
+    return markets
+
+
+def fake_exchange(exchange_id, *symbols):
+    """Returns a ccxt exchange with fake markets, nothing is requested."""
+    exchange = getattr(ccxt, exchange_id)()
+    exchange.set_markets(fake_markets(*symbols))
+    return exchange
+
+
+@pytest.fixture
+def fake_exchanges():
+    return [fake_exchange('binance', 'BTC/USDT', 'ETH/USDT', 'ETH/BTC'),
+            fake_exchange('kraken', 'BTC/USDT', 'XRP/EUR')]
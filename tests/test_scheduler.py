@@ -0,0 +1,72 @@
+import asyncio
+
+import ccxt
+
+from scheduler import PollItem, PollingScheduler
+
+
+class FakeExchange:
+    """A local stand-in for an async exchange; fails while rate limited."""
+
+    id = 'fake'
+
+    def __init__(self, rate_limited=False):
+        self.rate_limited = rate_limited
+        self.calls = 0
+
+    async def fetch_ticker(self, symbol):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.rate_limited:
+            raise ccxt.RateLimitExceeded('fake: too many requests')
+        return {'symbol': symbol, 'last': 100.0 + self.calls}
+
+
+def run_for(scheduler, seconds, consume=True):
+    collected = []
+
+    async def main():
+        runner = asyncio.ensure_future(scheduler.run())
+        if consume:
+            async def consumer():
+                async for result in scheduler.results():
+                    collected.append(result)
+            reader = asyncio.ensure_future(consumer())
+        await asyncio.sleep(seconds)
+        scheduler.stop()
+        await runner
+        if consume:
+            await reader
+
+    asyncio.run(main())
+    return collected
+
+
+def ticker_item(exchange, interval, priority):
+    async def job():
+        return await exchange.fetch_ticker('BTC/USDT')
+    return PollItem('ticker:{}:{}'.format(exchange.id, priority), job,
+                    interval, priority, exchange.id)
+
+
+def test_items_are_polled_and_collected():
+    exchange = FakeExchange()
+    scheduler = PollingScheduler()
+    scheduler.add(ticker_item(exchange, 0.05, 0))
+    results = run_for(scheduler, 0.3)
+    assert 3 <= len(results) <= 8
+    assert results[0][0] == 'ticker:fake:0'
+    assert scheduler.stats()['ticker:fake:0']['failures'] == 0
+
+
+def test_rate_limit_backs_off_every_priority():
+    exchange = FakeExchange(rate_limited=True)
+    scheduler = PollingScheduler(backoff=0.3, queue_size=None)
+    scheduler.add(ticker_item(exchange, 0.1, 0))
+    scheduler.add(ticker_item(exchange, 0.1, 3))
+    run_for(scheduler, 1.0, consume=False)
+    # once per backoff (0.3s) instead of once per interval (0.1s)
+    stats = scheduler.stats()
+    assert stats['ticker:fake:0']['failures'] <= 5
+    assert stats['ticker:fake:3']['failures'] <= 5
+    assert exchange.calls <= 10
@@ -0,0 +1,64 @@
+import json
+import time
+from urllib.request import urlopen
+
+import pytest
+
+from service import MarketService, batch_query, query
+
+
+@pytest.fixture
+def service(fake_exchanges):
+    service = MarketService(loader=lambda: fake_exchanges,
+                            refresh_interval=None)
+    url = service.start(port=0)
+    yield service, url
+    service.stop()
+
+
+def test_requires_a_source():
+    with pytest.raises(ValueError):
+        MarketService()
+
+
+def test_health_and_functions(service):
+    _, url = service
+    health = json.loads(urlopen(url + '/health').read())
+    assert health['status'] == 'ok' and health['exchanges'] == 2
+    functions = json.loads(urlopen(url + '/functions').read())
+    assert 'get_exchanges_supporting_pair' in functions
+    assert 'load_markets_threaded' not in functions
+
+
+def test_query(service):
+    _, url = service
+    assert query(url, 'get_exchanges_supporting_pair',
+                 pair='BTC/USDT') == ['binance', 'kraken']
+    assert query(url, 'get_exchanges_supporting_pair', pair='BTC/USDT',
+                 exchanges=['kraken']) == ['kraken']
+    assert query(url, 'get_all_pairs_at_exchange',
+                 exchange='kraken') == ['BTC/USDT', 'XRP/EUR']
+
+
+def test_batch(service):
+    _, url = service
+    answers = batch_query(url, [
+        ('get_exchanges_supporting_mutual_pairs',
+         {'pairs': ['BTC/USDT', 'ETH/USDT']}),
+        ('get_all_mutual_pairs_at_exchanges', {}),
+        ('unknown', {})])
+    assert answers[0] == {'result': ['binance']}
+    assert answers[1] == {'result': ['BTC/USDT']}
+    assert 'error' in answers[2]
+
+
+def test_refresh_swaps_snapshot(fake_exchanges):
+    service = MarketService(loader=lambda: fake_exchanges,
+                            refresh_interval=0.05)
+    service.start(port=0)
+    service.stop()
+    version = service.health()['version']
+    assert version >= 1
+    # the refresh thread is joined, so nothing changes after stop()
+    time.sleep(0.2)
+    assert service.health()['version'] == version
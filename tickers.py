@@ -0,0 +1,209 @@
+from _async import to_async_exchanges, close_async_exchanges, \
+    exchange_semaphores, gather_reporting
+from _checks import check_isinstance_string, check_isinstance_list
+from frames import board_to_arrow, board_to_pandas
+
+import asyncio
+import time
+
+import ccxt
+import numpy as np
+
+
+QUOTE_FIELDS = ('bid', 'ask', 'last', 'volume')
+
+
+# --------- [ Quote Board ] ---------
+class QuoteBoard:
+    """
+    Preallocated, columnar table of the latest tickers (exchange x symbol).
+    Every field is a 2D array (rows: exchanges, columns: symbols) that is
+    overwritten in place; unknown quotes are NaN. 'version' is increased
+    on every update, so derived tables can be cached per snapshot.
+    """
+
+    def __init__(self, exchange_ids, symbols):
+        check_isinstance_list(exchange_ids)
+        check_isinstance_list(symbols)
+
+        self.exchange_ids = list(exchange_ids)
+        self.symbols = list(symbols)
+        self.exchange_index = {e: i for i, e in enumerate(self.exchange_ids)}
+        self.symbol_index = {s: i for i, s in enumerate(self.symbols)}
+
+        shape = (len(self.exchange_ids), len(self.symbols))
+        self.bid = np.full(shape, np.nan)
+        self.ask = np.full(shape, np.nan)
+        self.last = np.full(shape, np.nan)
+        self.volume = np.full(shape, np.nan)
+        self.timestamp = np.zeros(shape, dtype=np.int64)
+        self.version = 0
+
+    @property
+    def shape(self):
+        return self.bid.shape
+
+    @property
+    def mid(self):
+        """Returns the mid prices (falls back to the last price)."""
+        mid = (self.bid + self.ask) / 2
+        return np.where(np.isnan(mid), self.last, mid)
+
+    def update(self, exchange_id, tickers):
+        """
+        Writes ccxt tickers of one exchange into the board.
+        Tickers of symbols that are not on the board are ignored.
+
+        :param exchange_id: an exchange-id (as str)
+        :param tickers: dictionary of symbol: ticker (as returned by ccxt)
+        :return: number of updated quotes
+        """
+        row = self.exchange_index[exchange_id]
+        now = int(time.time() * 1000)
+
+        cols, values, stamps = [], [], []
+        for symbol, ticker in tickers.items():
+            col = self.symbol_index.get(symbol)
+            if col is None or not ticker:
+                continue
+            cols.append(col)
+            values.append((ticker.get('bid'), ticker.get('ask'),
+                           ticker.get('last'), ticker.get('baseVolume')))
+            stamps.append(ticker.get('timestamp') or now)
+
+        if cols:
+            values = np.array(values, dtype=np.float64)  # None -> nan
+            self.bid[row, cols] = values[:, 0]
+            self.ask[row, cols] = values[:, 1]
+            self.last[row, cols] = values[:, 2]
+            self.volume[row, cols] = values[:, 3]
+            self.timestamp[row, cols] = stamps
+            self.version += 1
+        return len(cols)
+
+    def quote(self, exchange_id, symbol):
+        """Returns the quote of a symbol at an exchange as dictionary."""
+        check_isinstance_string(exchange_id)
+        check_isinstance_string(symbol)
+
+        row = self.exchange_index[exchange_id]
+        col = self.symbol_index[symbol]
+        quote = {field: float(getattr(self, field)[row, col])
+                 for field in QUOTE_FIELDS}
+        quote['timestamp'] = int(self.timestamp[row, col])
+        return quote
+
+    def age(self, now=None):
+        """Returns the age of every quote in ms (-1 for missing quotes)."""
+        if now is None:
+            now = int(time.time() * 1000)
+        return np.where(self.timestamp > 0, now - self.timestamp, -1)
+
+    def to_pandas(self):
+        """Returns the board as long DataFrame (quote columns are views)."""
+        return board_to_pandas(self)
+
+    def to_arrow(self):
+        """Returns the board as long Arrow table (quote columns not copied)."""
+        return board_to_arrow(self)
+
+
+# --------- [ Collector ] ---------
+class TickerCollector:
+    """
+    Fills a QuoteBoard concurrently from many exchanges. Exchanges that
+    support fetchTickers are queried with a single request, the others
+    with batches of concurrent fetch_ticker calls. The async exchanges
+    are kept open between cycles; call close() when done.
+    """
+
+    def __init__(self, exchanges, symbols=None, batch_size=20,
+                 concurrency=3):
+        """
+        :param exchanges: a list of exchanges (as Exchange), markets loaded
+        :param symbols: a list of symbols (None: all symbols of all exchanges)
+        :param batch_size: symbols per batch for exchanges without fetchTickers
+        :param concurrency: concurrent requests per exchange
+        """
+        check_isinstance_list(exchanges)
+
+        if symbols is None:
+            symbols = sorted({s for e in exchanges for s in e.symbols})
+        self.board = QuoteBoard([e.id for e in exchanges], symbols)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+        self._exchanges = to_async_exchanges(exchanges)
+        self._semaphores = None
+        self._symbols = {e.id: [s for s in symbols if s in e.markets]
+                         for e in exchanges}
+
+    async def _fetch_bulk(self, exchange, symbols):
+        async with self._semaphores[exchange.id]:
+            try:
+                return await exchange.fetch_tickers(symbols)
+            except (ccxt.ArgumentsRequired, ccxt.BadRequest,
+                    ccxt.BadSymbol):
+                # some exchanges don't accept a symbol filter
+                tickers = await exchange.fetch_tickers()
+                return {s: tickers[s] for s in symbols if s in tickers}
+
+    async def _fetch_one(self, exchange, symbol):
+        async with self._semaphores[exchange.id]:
+            return await exchange.fetch_ticker(symbol)
+
+    async def _collect_exchange(self, exchange):
+        symbols = self._symbols[exchange.id]
+        if not symbols:
+            return 0
+
+        if exchange.has.get('fetchTickers'):
+            tickers = await self._fetch_bulk(exchange, symbols)
+            return self.board.update(exchange.id, tickers)
+
+        updated = 0
+        for i in range(0, len(symbols), self.batch_size):
+            batch = symbols[i:i + self.batch_size]
+            results = await asyncio.gather(
+                *[self._fetch_one(exchange, s) for s in batch],
+                return_exceptions=True)
+            tickers = {s: t for s, t in zip(batch, results)
+                       if not isinstance(t, BaseException)}
+            updated += self.board.update(exchange.id, tickers)
+        return updated
+
+    async def collect(self):
+        """
+        Runs one collection cycle over all exchanges.
+
+        :return: dictionary of exchange-id: number of updated quotes
+        """
+        if self._semaphores is None:
+            # semaphores need to be created inside the running loop
+            self._semaphores = exchange_semaphores(self._exchanges,
+                                                   self.concurrency)
+        return await gather_reporting(
+            {e.id: self._collect_exchange(e) for e in self._exchanges})
+
+    async def close(self):
+        await close_async_exchanges(self._exchanges)
+
+
+def collect_tickers(exchanges, symbols=None, batch_size=20, concurrency=3):
+    """
+    Collects the tickers of the given exchanges once.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param symbols: a list of symbols (None: all symbols)
+    :return: a QuoteBoard
+    """
+    async def run():
+        collector = TickerCollector(exchanges, symbols, batch_size,
+                                    concurrency)
+        try:
+            await collector.collect()
+        finally:
+            await collector.close()
+        return collector.board
+
+    return asyncio.run(run())
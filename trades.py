@@ -0,0 +1,263 @@
+from _async import to_async_exchanges, close_async_exchanges, \
+    exchange_semaphores, gather_reporting
+from _checks import check_isinstance_list
+from storage import TRADE_DTYPE
+
+import asyncio
+import hashlib
+import time
+
+import numpy as np
+
+
+_SIDES = {'buy': 1, 'sell': -1}
+
+
+# --------- [ Trade Records ] ---------
+def trade_id_hashes(trades):
+    """
+    Returns a stable 64 bit hash per trade. The trade id is used where the
+    exchange provides one, otherwise timestamp, price, amount and side.
+
+    :param trades: a list of trades (as returned by fetch_trades)
+    :return: array of hashes (as uint64)
+    """
+    hashes = np.empty(len(trades), dtype=np.uint64)
+    for i, trade in enumerate(trades):
+        key = trade.get('id')
+        if key is None:
+            key = '{timestamp}|{price}|{amount}|{side}'.format(**trade)
+        digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+        hashes[i] = int.from_bytes(digest, 'little')
+    return hashes
+
+
+def trades_to_records(trades, hashes=None):
+    """Converts ccxt trades to trade records."""
+    records = np.empty(len(trades), dtype=TRADE_DTYPE)
+    records['timestamp'] = [t['timestamp'] for t in trades]
+    records['price'] = np.array([t['price'] for t in trades], dtype=float)
+    records['amount'] = np.array([t['amount'] for t in trades], dtype=float)
+    records['side'] = [_SIDES.get(t.get('side'), 0) for t in trades]
+    records['id_hash'] = trade_id_hashes(trades) if hashes is None else hashes
+    return records
+
+
+# --------- [ Deduplication ] ---------
+class TradeDeduplicator:
+    """
+    Remembers the id hashes of the last 'window' trades in a ring buffer
+    (8 bytes per trade), which is enough to drop the overlap of
+    consecutive pages without keeping any trade around.
+    """
+
+    def __init__(self, window=1 << 16):
+        self._ring = np.zeros(window, dtype=np.uint64)
+        self._size = 0
+        self._pos = 0
+
+    def __len__(self):
+        return self._size
+
+    def _remember(self, hashes):
+        window = len(self._ring)
+        hashes = hashes[-window:]
+        end = self._pos + len(hashes)
+        if end <= window:
+            self._ring[self._pos:end] = hashes
+        else:
+            split = window - self._pos
+            self._ring[self._pos:] = hashes[:split]
+            self._ring[:end - window] = hashes[split:]
+        self._pos = end % window
+        self._size = min(window, self._size + len(hashes))
+
+    def seed(self, hashes):
+        """Adds already stored hashes to the window."""
+        self._remember(np.asarray(hashes, dtype=np.uint64))
+
+    def new_mask(self, hashes):
+        """
+        Returns a mask of the hashes that haven't been seen yet (the first
+        of duplicates within the batch counts as new) and remembers them.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        mask = ~np.isin(hashes, self._ring[:self._size])
+
+        _, first = np.unique(hashes, return_index=True)
+        unique = np.zeros(len(hashes), dtype=bool)
+        unique[first] = True
+        mask &= unique
+
+        self._remember(hashes[mask])
+        return mask
+
+
+# --------- [ Ingestion ] ---------
+class TradeIngestor:
+    """
+    Incremental trade tape ingestion into a storage.TradeStore.
+    Keeps a since-cursor and a deduplication window per (exchange, symbol)
+    and appends new trades in batches of 'batch_size'.
+    """
+
+    def __init__(self, store, window=1 << 16, batch_size=10000):
+        self.store = store
+        self.window = window
+        self.batch_size = batch_size
+        self.cursors = {}
+        self._dedup = {}
+        self._buffers = {}
+
+    def _deduplicator(self, exchange_id, symbol):
+        key = (exchange_id, symbol)
+        dedup = self._dedup.get(key)
+        if dedup is None:
+            dedup = TradeDeduplicator(self.window)
+            last = self.store.last_timestamp(exchange_id, symbol)
+            if last is not None:
+                # only trades of the last stored ms can show up again
+                stored = self.store.read(exchange_id, symbol, start=last)
+                dedup.seed(stored['id_hash'])
+                self.cursors[key] = last
+            self._dedup[key] = dedup
+        return dedup
+
+    def add(self, exchange_id, symbol, trades):
+        """
+        Adds fetched trades; duplicates are dropped, the rest is buffered
+        and appended to the store once a batch is full.
+
+        :return: number of new trades
+        """
+        if not trades:
+            return 0
+        trades = sorted(trades, key=lambda t: t['timestamp'])
+
+        hashes = trade_id_hashes(trades)
+        mask = self._deduplicator(exchange_id, symbol).new_mask(hashes)
+        if not mask.any():
+            return 0
+
+        new = [t for t, m in zip(trades, mask) if m]
+        records = trades_to_records(new, hashes[mask])
+
+        key = (exchange_id, symbol)
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(records)
+        self.cursors[key] = max(self.cursors.get(key, 0),
+                                int(records['timestamp'][-1]))
+        if sum(len(b) for b in buffer) >= self.batch_size:
+            self.flush(exchange_id, symbol)
+        return len(records)
+
+    def flush(self, exchange_id=None, symbol=None):
+        """Appends the buffered trades (of one or all series) to the store."""
+        keys = list(self._buffers) if exchange_id is None \
+            else [(exchange_id, symbol)]
+        for key in keys:
+            buffer = self._buffers.get(key)
+            if not buffer:
+                self._buffers.pop(key, None)
+                continue
+            records = np.concatenate(buffer)
+            records = records[np.argsort(records['timestamp'], kind='stable')]
+            last = self.store.last_timestamp(*key)
+            if last is not None:
+                late = records['timestamp'] < last
+                if late.any():
+                    print("Dropped {} trades of {} older than the stored "
+                          "tape.".format(int(late.sum()), key))
+                    records = records[~late]
+            # the buffer is only cleared once the trades are stored
+            self.store.append(key[0], key[1], records)
+            del self._buffers[key]
+
+    async def ingest(self, exchange, symbol, since=None, until=None,
+                     limit=None, semaphore=None):
+        """
+        Pages through fetch_trades of an async exchange from the cursor
+        of the series (or 'since') until no new trades show up.
+
+        :return: number of new trades
+        """
+        self._deduplicator(exchange.id, symbol)
+        cursor = self.cursors.get((exchange.id, symbol))
+        if cursor is not None:
+            since = cursor if since is None else max(since, cursor)
+
+        new = 0
+        while True:
+            if semaphore is None:
+                page = await exchange.fetch_trades(symbol, since, limit)
+            else:
+                async with semaphore:
+                    page = await exchange.fetch_trades(symbol, since, limit)
+
+            if not page:
+                break
+            if until is not None:
+                added = self.add(exchange.id, symbol,
+                                 [t for t in page if t['timestamp'] <= until])
+            else:
+                added = self.add(exchange.id, symbol, page)
+            new += added
+
+            last = max(t['timestamp'] for t in page)
+            if until is not None and last >= until:
+                break
+            if last == since:
+                # a full page within a single ms, move on
+                since += 1
+            elif added:
+                # pages overlap on the last ms, the window drops the repeats
+                since = last
+            else:
+                break
+
+        self.flush(exchange.id, symbol)
+        return new
+
+
+async def ingest_trades_async(exchanges, symbols, ingestor, since=None,
+                              until=None, limit=None, concurrency=3):
+    """
+    Ingests the trades of all (exchange, symbol) series concurrently.
+
+    :param exchanges: a list of exchanges (as Exchange), markets loaded
+    :param symbols: a list of trading-pairs (as str)
+    :param ingestor: a TradeIngestor
+    :return: dictionary of (exchange-id, symbol): number of new trades
+    """
+    check_isinstance_list(exchanges)
+    check_isinstance_list(symbols)
+
+    async_exchanges = to_async_exchanges(exchanges)
+    semaphores = exchange_semaphores(async_exchanges, concurrency)
+
+    jobs = {}
+    for exchange in async_exchanges:
+        if not exchange.has.get('fetchTrades'):
+            continue
+        for symbol in symbols:
+            if symbol in exchange.markets:
+                jobs[(exchange.id, symbol)] = ingestor.ingest(
+                    exchange, symbol, since, until, limit,
+                    semaphores[exchange.id])
+
+    try:
+        return await gather_reporting(jobs)
+    finally:
+        ingestor.flush()
+        await close_async_exchanges(async_exchanges)
+
+
+def ingest_trades(exchanges, symbols, ingestor, since=None, until=None,
+                  limit=None, concurrency=3):
+    """Blocking wrapper around ingest_trades_async."""
+    start = time.time()
+    new = asyncio.run(ingest_trades_async(
+        exchanges, symbols, ingestor, since, until, limit, concurrency))
+    print("Stored {} trades of {} series in {:.2f}s.".format(
+        sum(new.values()), len(new), time.time() - start))
+    return new
@@ -0,0 +1,188 @@
+from _checks import check_isinstance_string, check_isinstance_list
+from ohlcv import timeframe_to_ms
+
+import numpy as np
+
+
+# --------- [ Bucketing ] ---------
+def bucket_volumes(timestamps, prices, volumes, exchange_rows, n_exchanges,
+                   period):
+    """
+    Sums price * volume and volume per (time bucket, exchange) with a
+    single bincount over the combined bucket/exchange index.
+
+    :param timestamps: array of timestamps in ms
+    :param prices: array of prices
+    :param volumes: array of volumes (base currency)
+    :param exchange_rows: exchange row of every value
+    :param n_exchanges: number of exchange rows
+    :param period: bucket width in ms
+    :return: (bucket timestamps, pv[bucket, exchange], v[bucket, exchange])
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.nan_to_num(np.asarray(volumes, dtype=np.float64))
+
+    valid = ~np.isnan(prices)
+    timestamps, prices, volumes = timestamps[valid], prices[valid], \
+        volumes[valid]
+    exchange_rows = np.asarray(exchange_rows)[valid]
+
+    buckets, inverse = np.unique(timestamps - timestamps % period,
+                                 return_inverse=True)
+    flat = inverse * n_exchanges + exchange_rows
+    size = len(buckets) * n_exchanges
+
+    pv = np.bincount(flat, prices * volumes, minlength=size)
+    v = np.bincount(flat, volumes, minlength=size)
+    return (buckets, pv.reshape(-1, n_exchanges),
+            v.reshape(-1, n_exchanges))
+
+
+# --------- [ Incremental VWAP ] ---------
+class VWAPAggregator:
+    """
+    Consolidated VWAP, total volume and per-exchange volume share of
+    pairs over several exchanges, per time bucket. New candles or trades
+    are folded into the running sums of their buckets, so nothing is
+    recomputed when data arrives. Only the last 'max_buckets' buckets of
+    every pair are kept.
+    The pairs typically come from pairs.py, e.g.
+    get_pairs_by_base_at_exchanges or
+    get_all_mutual_pairs_by_quote_at_exchanges.
+    """
+
+    def __init__(self, exchange_ids, timeframe='1h', max_buckets=24 * 365):
+        check_isinstance_list(exchange_ids)
+
+        self.exchange_ids = list(exchange_ids)
+        self.exchange_index = {e: i for i, e in enumerate(self.exchange_ids)}
+        self.period = timeframe_to_ms(timeframe)
+        self.max_buckets = max_buckets
+
+        self._buckets = {}
+        self._pv = {}
+        self._v = {}
+        self._consumed = {}
+
+    @property
+    def symbols(self):
+        return list(self._buckets)
+
+    def update(self, symbol, timestamps, prices, volumes, exchange_ids):
+        """
+        Adds price/volume observations of a pair.
+
+        :param symbol: a trading-pair (as str)
+        :param timestamps: array of timestamps in ms
+        :param prices: array of prices
+        :param volumes: array of volumes
+        :param exchange_ids: an exchange-id (as str) for all values or
+                             an array of exchange rows
+        """
+        n = len(self.exchange_ids)
+        if isinstance(exchange_ids, str):
+            rows = np.full(len(timestamps), self.exchange_index[exchange_ids])
+        else:
+            rows = np.asarray(exchange_ids)
+        buckets, pv, v = bucket_volumes(timestamps, prices, volumes, rows,
+                                        n, self.period)
+        if not len(buckets):
+            return
+
+        old = self._buckets.get(symbol)
+        if old is None or not len(old):
+            merged, merged_pv, merged_v = buckets, pv, v
+        elif buckets[0] >= old[-1]:
+            # the common case: the last bucket fills up, then new buckets
+            merged_pv, merged_v = self._pv[symbol], self._v[symbol]
+            if buckets[0] == old[-1]:
+                merged_pv[-1] += pv[0]
+                merged_v[-1] += v[0]
+                buckets, pv, v = buckets[1:], pv[1:], v[1:]
+            merged = old
+            if len(buckets):
+                merged = np.concatenate((old, buckets))
+                merged_pv = np.concatenate((merged_pv, pv))
+                merged_v = np.concatenate((merged_v, v))
+        else:
+            merged = np.union1d(old, buckets)
+            merged_pv = np.zeros((len(merged), n))
+            merged_v = np.zeros((len(merged), n))
+            at_old = np.searchsorted(merged, old)
+            at_new = np.searchsorted(merged, buckets)
+            merged_pv[at_old] = self._pv[symbol]
+            merged_v[at_old] = self._v[symbol]
+            merged_pv[at_new] += pv
+            merged_v[at_new] += v
+
+        keep = slice(-self.max_buckets, None)
+        self._buckets[symbol] = merged[keep]
+        self._pv[symbol] = merged_pv[keep]
+        self._v[symbol] = merged_v[keep]
+
+    def update_from_candles(self, store, symbols, timeframe='1m'):
+        """
+        Adds the candles that arrived in an OHLCVStore since the last call.
+        The typical price (high + low + close) / 3 is weighted by volume.
+        """
+        check_isinstance_list(symbols)
+        for symbol in symbols:
+            for exchange_id in self.exchange_ids:
+                key = ('ohlcv', exchange_id, symbol, timeframe)
+                start = self._consumed.get(key)
+                candles = store.read(exchange_id, symbol, timeframe,
+                                     start=None if start is None else start + 1)
+                if not len(candles):
+                    continue
+                typical = (candles['high'] + candles['low'] +
+                           candles['close']) / 3
+                self.update(symbol, candles['timestamp'], typical,
+                            candles['volume'], exchange_id)
+                self._consumed[key] = int(candles['timestamp'][-1])
+
+    def update_from_trades(self, store, symbols):
+        """Adds the trades that arrived in a TradeStore since the last call."""
+        check_isinstance_list(symbols)
+        for symbol in symbols:
+            for exchange_id in self.exchange_ids:
+                key = ('trades', exchange_id, symbol)
+                start = self._consumed.get(key)
+                series = store.series(exchange_id, symbol) \
+                    if store.has_series(exchange_id, symbol) else None
+                if series is None:
+                    continue
+                # trades share timestamps, so continue by position
+                consumed = 0 if start is None else start
+                trades = series.tail(len(series) - consumed)
+                if not len(trades):
+                    continue
+                self.update(symbol, trades['timestamp'], trades['price'],
+                            trades['amount'], exchange_id)
+                self._consumed[key] = consumed + len(trades)
+
+    def vwap(self, symbol):
+        """
+        Returns the consolidated figures of a pair.
+
+        :param symbol: a trading-pair (as str)
+        :return: dictionary with the arrays 'timestamp', 'vwap', 'volume'
+                 and 'share' (bucket x exchange, in the order of
+                 exchange_ids)
+        """
+        check_isinstance_string(symbol)
+
+        pv, v = self._pv[symbol], self._v[symbol]
+        total = v.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vwap = pv.sum(axis=1) / total
+            share = v / total[:, None]
+        return {'timestamp': self._buckets[symbol],
+                'vwap': vwap,
+                'volume': total,
+                'share': share}
+
+    def exchange_vwap(self, symbol):
+        """Returns the VWAP per bucket and exchange (bucket x exchange)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._pv[symbol] / self._v[symbol]